@@ -11,14 +11,18 @@ import os
 from django.core.asgi import get_asgi_application
 from channels.routing import ProtocolTypeRouter, URLRouter
 from channels.auth import AuthMiddlewareStack
-import notification.routing
 
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'cyriox.settings')
+django_asgi_app = get_asgi_application()
+
+# Imported after the app registry is ready; these pull in models.
+import notification.routing  # noqa: E402
+from notification.middleware import JWTAuthMiddleware  # noqa: E402
 
 application = ProtocolTypeRouter({
-    "http": get_asgi_application(),
+    "http": django_asgi_app,
     "websocket": AuthMiddlewareStack(
-        URLRouter(notification.routing.websocket_urlpatterns)
+        JWTAuthMiddleware(URLRouter(notification.routing.websocket_urlpatterns))
     ),
 })
\ No newline at end of file
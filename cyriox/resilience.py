@@ -0,0 +1,81 @@
+"""
+Failure isolation and admission control shared by the apps.
+
+A CircuitBreaker stops calling a provider that keeps failing and lets one
+probe through after a cool-down; a Bulkhead caps how many threads of this
+process can be waiting on a provider (transaction.paystack) or a local pool
+(user.hashing) at once. Both are per process, like the pools they protect.
+"""
+import threading
+import time
+
+
+class CircuitBreaker:
+    """
+    closed -> open after `failure_threshold` consecutive failures.
+    open -> half-open once `reset_timeout` seconds have passed; up to
+    `half_open_max` probe calls are let through. A successful probe closes the
+    circuit, a failed one opens it again for another `reset_timeout`.
+    """
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0, half_open_max=1, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_max = half_open_max
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probes = 0
+
+    def allow(self):
+        """Whether a call may go out now. A True in half-open reserves a probe slot."""
+        with self.lock:
+            if self.state == self.OPEN and self.clock() - self.opened_at >= self.reset_timeout:
+                self.state, self.probes = self.HALF_OPEN, 0
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.HALF_OPEN and self.probes < self.half_open_max:
+                self.probes += 1
+                return True
+            return False
+
+    def retry_after(self):
+        """Seconds until the next probe is allowed."""
+        with self.lock:
+            if self.state == self.CLOSED:
+                return 0
+            return max(0, int(self.reset_timeout - (self.clock() - self.opened_at)) + 1)
+
+    def record_success(self):
+        with self.lock:
+            self.state, self.failures = self.CLOSED, 0
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state, self.opened_at = self.OPEN, self.clock()
+
+    def release(self):
+        """Give back the probe slot of a half-open call that ended without a success or failure to record."""
+        with self.lock:
+            if self.state == self.HALF_OPEN and self.probes:
+                self.probes -= 1
+
+
+class Bulkhead:
+    """At most `max_concurrent` calls in flight; others wait up to `max_wait` seconds, then are refused."""
+
+    def __init__(self, max_concurrent, max_wait=0.0):
+        self.max_concurrent = max_concurrent
+        self.max_wait = max_wait
+        self.semaphore = threading.BoundedSemaphore(max_concurrent)
+
+    def acquire(self):
+        return self.semaphore.acquire(timeout=self.max_wait) if self.max_wait else self.semaphore.acquire(False)
+
+    def release(self):
+        self.semaphore.release()
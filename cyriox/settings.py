@@ -6,6 +6,42 @@ from dotenv import load_dotenv
 load_dotenv()  # Load .env variables
 
 PAYSTACK_SECRET_KEY = os.getenv("PAYSTACK_SECRET_KEY")
+PAYSTACK_BASE_URL = os.getenv("PAYSTACK_BASE_URL", "https://api.paystack.co")  # point at a local stub to test
+# Every Paystack call is bounded by these; GETs are retried up to PAYSTACK_MAX_RETRIES times
+PAYSTACK_CONNECT_TIMEOUT = 3.05  # seconds
+PAYSTACK_READ_TIMEOUT = 10
+PAYSTACK_MAX_RETRIES = 2
+PAYSTACK_POOL_SIZE = 20  # keep-alive connections shared by a process's threads
+# Isolation, per process: after PAYSTACK_BREAKER_FAILURES failed calls in a row,
+# Paystack calls fail fast (503) for PAYSTACK_BREAKER_RESET_TIMEOUT seconds
+# before one probe is let through; at most PAYSTACK_MAX_CONCURRENCY threads wait
+# on Paystack at once, so a slow provider can't take every worker thread.
+# Set either to None to turn it off.
+PAYSTACK_BREAKER_FAILURES = 5
+PAYSTACK_BREAKER_RESET_TIMEOUT = 30
+PAYSTACK_MAX_CONCURRENCY = 4
+PAYSTACK_BULKHEAD_WAIT = 0.05  # seconds a call may queue for a bulkhead slot
+
+# Paystack webhooks are stored on receipt and applied by transaction.inbox: on an
+# in-process thread when PAYSTACK_WEBHOOK_INLINE_WORKER is on, or by
+# `manage.py process_webhook_events`.
+PAYSTACK_WEBHOOK_INLINE_WORKER = True
+PAYSTACK_WEBHOOK_POLL_INTERVAL = 30  # seconds between sweeps when nothing wakes the worker
+PAYSTACK_WEBHOOK_BATCH_SIZE = 200
+PAYSTACK_WEBHOOK_MAX_ATTEMPTS = 5
+# Payouts are sent by `manage.py run_payouts` as Paystack bulk transfers of up
+# to PAYOUT_BATCH_SIZE (Paystack's limit is 100), PAYOUT_CONCURRENCY at a time.
+PAYOUT_BATCH_SIZE = 100
+PAYOUT_CONCURRENCY = 4
+PAYOUT_MAX_ATTEMPTS = 5
+# Google sign-in checks ID tokens locally against Google's signing keys, kept for
+# GOOGLE_JWKS_LIFESPAN seconds and then refreshed in the background (the old set
+# stays in use while Google can't be reached). Tokens must have been issued to
+# one of GOOGLE_CLIENT_IDS (comma-separated); while it is unset, every token is refused.
+GOOGLE_CLIENT_IDS = [client_id for client_id in os.getenv("GOOGLE_CLIENT_IDS", "").split(",") if client_id]
+GOOGLE_JWKS_URL = os.getenv("GOOGLE_JWKS_URL", "https://www.googleapis.com/oauth2/v3/certs")
+GOOGLE_JWKS_LIFESPAN = 3600
+GOOGLE_JWKS_TIMEOUT = 2  # seconds
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -67,12 +103,12 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    "products.middleware.ImmutableMediaCacheMiddleware",
 ]
 
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
-     
+        "user.authentication.ClaimsJWTAuthentication",
     ),
     'DEFAULT_FILTER_BACKENDS': ['django_filters.rest_framework.DjangoFilterBackend'],
 
@@ -101,13 +137,76 @@ AUTHENTICATION_BACKENDS = [
 ]
 
 
-CHANNEL_LAYERS = {
-    "default": {
-        "BACKEND": "channels.layers.InMemoryChannelLayer",  # Use Redis in production
-    },
-}
+# Channel layer. The in-memory layer only reaches sockets on the same process,
+# so set REDIS_URL whenever more than one ASGI worker is running.
+REDIS_URL = os.getenv("REDIS_URL")
+
+if REDIS_URL:
+    CHANNEL_LAYERS = {
+        "default": {
+            "BACKEND": "channels_redis.core.RedisChannelLayer",
+            "CONFIG": {
+                # channels_redis keeps one connection pool per host and event loop;
+                # extra keys here are passed to the redis-py pool.
+                "hosts": [{
+                    "address": REDIS_URL,
+                    "health_check_interval": 30,
+                    "socket_keepalive": True,
+                }],
+                "prefix": os.getenv("CHANNEL_LAYER_PREFIX", "cyriox"),
+                "capacity": int(os.getenv("CHANNEL_LAYER_CAPACITY", 1000)),  # messages buffered per channel
+                "expiry": 10,  # seconds an undelivered message is kept
+                "group_expiry": 86400,
+                "serializer_format": "msgpack",  # events must stay msgpack-safe: str/int/float/bool/None/list/dict
+            },
+        },
+    }
+else:
+    CHANNEL_LAYERS = {
+        "default": {
+            "BACKEND": "channels.layers.InMemoryChannelLayer",
+        },
+    }
+
+# The cache has to be shared for catalog invalidation to reach every worker,
+# so it lives in the same Redis when there is one.
+if REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+            "KEY_PREFIX": os.getenv("CACHE_KEY_PREFIX", "cyriox"),
+        },
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        },
+    }
+# Whether every process sees the same cache. What relies on the cache to hear
+# about another process's writes (JWT claims, the token blacklist filter) goes
+# to the database on each request instead when it doesn't.
+CACHE_IS_SHARED = bool(REDIS_URL)
+
+CATALOG_CACHE_TIMEOUT = 300  # seconds; writes invalidate entries straight away regardless
+
+# Stock stream: deltas for the same SKU arriving within this window go out as one frame
+STOCK_STREAM_COALESCE_MS = 250
+STOCK_STREAM_RESUME_LIMIT = 1000  # max deltas replayed to a reconnecting client
+STOCK_STREAM_TOMBSTONE_RETENTION = timedelta(days=7)  # older cursors are told to refetch
+
+LOW_STOCK_THRESHOLD = 50  # Default; branches and stocks can override it
+LOW_STOCK_REARM_MARGIN = 10  # Units above the threshold a stock must reach before it can alert again
 
-LOW_STOCK_THRESHOLD = 50
+# Low-stock alerts are queued in the LowStockAlert table and delivered by a
+# worker: an in-process thread when LOW_STOCK_ALERT_INLINE_WORKER is on, or
+# `manage.py run_alert_worker`.
+LOW_STOCK_ALERT_INLINE_WORKER = True
+LOW_STOCK_ALERT_POLL_INTERVAL = 30  # seconds between sweeps when nothing wakes the worker
+LOW_STOCK_ALERT_BATCH_SIZE = 100
+LOW_STOCK_ALERT_MAX_ATTEMPTS = 5
+LOW_STOCK_ALERT_COOLDOWN = timedelta(minutes=15)  # flap guard on top of the re-arm level
 
 
 SIMPLE_JWT = {
@@ -117,8 +216,29 @@ SIMPLE_JWT = {
     "SIGNING_KEY": SECRET_KEY,
     "ROTATE_REFRESH_TOKENS": True,
     "BLACKLIST_AFTER_ROTATION": True,  # Ensure this is set to True
-    "AUTH_HEADER_TYPES": ("Bearer",)
+    "AUTH_HEADER_TYPES": ("Bearer",),
+    # Tokens carry the claims user.authentication builds request.user from
+    "TOKEN_OBTAIN_SERIALIZER": "user.tokens.ClaimsTokenObtainPairSerializer",
+    "TOKEN_REFRESH_SERIALIZER": "user.tokens.ClaimsTokenRefreshSerializer",
 }
+# With a shared cache, each process remembers when a user's role or is_active
+# last changed for this many seconds, for up to AUTH_CLAIMS_CACHE_SIZE users; a
+# change made through another process reaches it within the TTL. Without one,
+# request.user is loaded from the database as simplejwt does.
+AUTH_CLAIMS_TTL = 30
+AUTH_CLAIMS_CACHE_SIZE = 10000
+# Every refresh blacklists the token it replaces. Each process screens jtis with
+# a Bloom filter sized for this many unexpired blacklisted tokens (about 1.2MB
+# at 1%) before asking the database, when the cache is shared; `manage.py
+# prune_tokens` clears expired ones.
+TOKEN_BLACKLIST_FILTER_CAPACITY = 1_000_000
+TOKEN_BLACKLIST_FILTER_ERROR_RATE = 0.01
+TOKEN_BLACKLIST_FILTER_MAX_AGE = 5  # seconds a filter trusts itself without a version bump
+# Login, signup and password changes hash on a pool of this many threads per
+# process, leaving the other cores to every other endpoint during a login storm;
+# hashes beyond PASSWORD_HASH_MAX_PENDING queued or running get a 503.
+PASSWORD_HASH_WORKERS = max(1, (os.cpu_count() or 2) // 2)
+PASSWORD_HASH_MAX_PENDING = 16
 
 TEMPLATES = [
     {
@@ -146,6 +266,12 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # Take the write lock at BEGIN so concurrent stock reservations
+            # queue up instead of failing with "database is locked".
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
     }
 }
 
@@ -189,6 +315,17 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 MEDIA_URL = 'media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Resized copies of every product image, rendered after upload by
+# products.images: on PRODUCT_IMAGE_INLINE_WORKERS in-process threads, or by
+# `manage.py generate_image_variants` when that is 0. "crop" fills the exact
+# size; otherwise the image is scaled to fit inside it.
+PRODUCT_IMAGE_VARIANTS = {
+    "thumb": {"size": (200, 200), "crop": True, "format": "JPEG", "quality": 80},
+    "thumb_webp": {"size": (200, 200), "crop": True, "format": "WEBP", "quality": 80},
+    "medium_webp": {"size": (800, 800), "crop": False, "format": "WEBP", "quality": 82},
+}
+PRODUCT_IMAGE_INLINE_WORKERS = 2
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
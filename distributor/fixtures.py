@@ -0,0 +1,53 @@
+"""Throwaway tenants for the tests and benchmark commands."""
+import uuid
+
+from django.contrib.auth import get_user_model
+
+from distributor.models import Branch, Distributor, Order, Stock
+from products.models import Category, Product
+
+User = get_user_model()
+
+
+def create_user(prefix, **extra):
+    tag = uuid.uuid4().hex[:10]
+    return User.objects.create(
+        email=f"{prefix}-{tag}@bench.local",
+        username=f"{prefix}_{tag}",
+        **extra,
+    )
+
+
+def create_tenant(prefix="bench", name=None):
+    """Create a distributor with one branch. Returns (distributor, branch)."""
+    owner = create_user(prefix, role=User.ROLE.DISTRIBUTOR)
+    distributor = Distributor.objects.create(user=owner, name=name or f"{prefix} {uuid.uuid4().hex[:10]}")
+    if distributor.user_id != owner.pk:
+        # create_distributor_user swapped in its own account for this distributor
+        owner.delete()
+    branch = Branch.objects.create(distributor=distributor, name=f"{prefix} branch", location="bench")
+    return distributor, branch
+
+
+def create_product(distributor, name, price=10):
+    """Create a catalog product (in its own category) owned by `distributor`."""
+    category = Category.objects.create(name=f"{name} {uuid.uuid4().hex[:10]}", distributor=distributor.user)
+    return Product.objects.create(
+        name=name, price=price, stock_quantity=0, category=category, distributor=distributor.user
+    )
+
+
+def create_stock(branch, product, quantity=100):
+    """Stock `product` at `branch`, at the product's price."""
+    return Stock.objects.create(
+        branch=branch, product=product, quantity=quantity, price=product.price
+    )
+
+
+def drop_users(*users):
+    """Delete benchmark users; distributors, branches, stock and products cascade."""
+    pks = [u.pk for u in users]
+    # Orders protect their products, so they have to go first.
+    Order.objects.filter(distributor__in=pks).delete()
+    Category.objects.filter(distributor__in=pks).delete()
+    User.objects.filter(pk__in=pks).delete()
@@ -0,0 +1,111 @@
+import threading
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from distributor.fixtures import create_product, create_stock, create_tenant, create_user, drop_users
+from distributor.models import Order, Stock, StockHistory
+from distributor.reservations import InsufficientStock, place_order, place_order_batch
+from transaction.management.commands.bench_brownout import percentile
+
+
+class Command(BaseCommand):
+    help = (
+        "Hammer one hot SKU from many threads and check that stock is never oversold; then time "
+        "multi-line orders for each basket size."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=16)
+        parser.add_argument("--orders-per-thread", type=int, default=50)
+        parser.add_argument("--initial-stock", type=int, default=500)
+        parser.add_argument("--quantity", type=int, default=1, help="Units per order.")
+        parser.add_argument("--baskets", type=int, nargs="*", default=[1, 10, 40],
+                            help="Lines per order for the batch timing; none to skip it.")
+        parser.add_argument("--basket-orders", type=int, default=50, help="Orders timed per basket size.")
+        parser.add_argument("--keep", action="store_true", help="Keep the benchmark rows afterwards.")
+
+    def handle(self, *args, **options):
+        distributor, branch = create_tenant("bench_reservation")
+        customer = create_user("bench_customer")
+        product = create_product(distributor, "hot-sku")
+        stock = create_stock(branch, product, quantity=options["initial_stock"])
+
+        counts = {"placed": 0, "sold_out": 0, "errors": 0}
+        lock = threading.Lock()
+
+        def worker():
+            try:
+                for _ in range(options["orders_per_thread"]):
+                    try:
+                        place_order(branch, customer, product, options["quantity"], Decimal("10.00"))
+                        outcome = "placed"
+                    except InsufficientStock:
+                        outcome = "sold_out"
+                    except OperationalError:
+                        outcome = "errors"
+                    with lock:
+                        counts[outcome] += 1
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(options["threads"])]
+
+        # Keep low-stock emails off the network while we measure.
+        with override_settings(EMAIL_BACKEND="django.core.mail.backends.locmem.EmailBackend"):
+            started = time.perf_counter()
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            elapsed = time.perf_counter() - started
+
+        stock.refresh_from_db()
+        orders = Order.objects.filter(branch=branch).count()
+        history = StockHistory.objects.filter(stock=stock, action="Order Placed").count()
+        attempts = sum(counts.values())
+        expected = options["initial_stock"] - counts["placed"] * options["quantity"]
+
+        self.stdout.write(f"attempts:    {attempts} in {elapsed:.2f}s ({attempts / elapsed:.0f} req/s)")
+        self.stdout.write(f"placed:      {counts['placed']}")
+        self.stdout.write(f"sold out:    {counts['sold_out']}")
+        self.stdout.write(f"db errors:   {counts['errors']}")
+        self.stdout.write(f"final stock: {stock.quantity} (expected {expected})")
+
+        if options["baskets"]:
+            self.time_baskets(branch, distributor, customer, options)
+
+        if not options["keep"]:
+            drop_users(customer, distributor.user)
+
+        if stock.quantity != expected or orders != counts["placed"] or history != counts["placed"]:
+            raise CommandError(
+                f"Oversell detected: stock={stock.quantity} expected={expected} orders={orders} history={history}"
+            )
+        self.stdout.write(self.style.SUCCESS("No oversell."))
+
+    def time_baskets(self, branch, distributor, customer, options):
+        """place_order_batch latency and queries per order for each basket size, one line per SKU."""
+        stocks = [
+            create_stock(branch, create_product(distributor, f"basket-sku-{i}"), quantity=options["basket_orders"])
+            for i in range(max(options["baskets"]))
+        ]
+        self.stdout.write(f"{'lines':>5} {'queries':>7} {'p50 ms':>8} {'p95 ms':>8} {'ms/line':>8}")
+        with override_settings(EMAIL_BACKEND="django.core.mail.backends.locmem.EmailBackend"):
+            for size in options["baskets"]:
+                lines = [{"product": stock.product_id, "quantity": 1, "price": Decimal("10.00")}
+                         for stock in stocks[:size]]
+                Stock.objects.filter(pk__in=[stock.pk for stock in stocks]).update(quantity=options["basket_orders"])
+                latencies = []
+                for i in range(options["basket_orders"]):
+                    with CaptureQueriesContext(connection) as queries:
+                        started = time.perf_counter()
+                        place_order_batch(branch, customer, lines)
+                        latencies.append((time.perf_counter() - started) * 1000)
+                p50 = percentile(latencies, 50)
+                self.stdout.write(
+                    f"{size:>5} {len(queries):>7} {p50:>8.2f} {percentile(latencies, 95):>8.2f} {p50 / size:>8.3f}"
+                )
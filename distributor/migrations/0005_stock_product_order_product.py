@@ -0,0 +1,25 @@
+# Generated by Django 5.1.3 on 2026-10-18 13:13
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('distributor', '0004_alter_distributorcustomer_distributor'),
+        ('products', '0004_alter_category_distributor'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='product',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='orders', to='products.product'),
+        ),
+        migrations.AddField(
+            model_name='stock',
+            name='product',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='stocks', to='products.product'),
+        ),
+    ]
@@ -0,0 +1,75 @@
+from django.db import migrations
+from django.db.models import F
+
+
+def backfill_products(apps, schema_editor):
+    """
+    Point every Stock and Order row at a products.Product.
+
+    Rows are matched by (distributor user, product name). If a distributor has
+    stock or orders for a name with no catalog entry, a Product is created for
+    it under a shared "Uncategorized" category. Duplicate Stock rows for the
+    same product in one branch are folded into the oldest one so the
+    (branch, product) unique constraint can be added afterwards.
+    """
+    Category = apps.get_model("products", "Category")
+    Product = apps.get_model("products", "Product")
+    Stock = apps.get_model("distributor", "Stock")
+    StockHistory = apps.get_model("distributor", "StockHistory")
+    Order = apps.get_model("distributor", "Order")
+
+    products = {}
+    fallback = {}
+
+    def product_for(distributor_user_id, name, price):
+        key = (distributor_user_id, name)
+        if key not in products:
+            product = Product.objects.filter(distributor_id=distributor_user_id, name=name).order_by("id").first()
+            if product is None:
+                if "category" not in fallback:
+                    fallback["category"], _ = Category.objects.get_or_create(
+                        name="Uncategorized", defaults={"slug": "uncategorized"}
+                    )
+                product = Product.objects.create(
+                    name=name,
+                    price=price,
+                    stock_quantity=0,
+                    category=fallback["category"],
+                    distributor_id=distributor_user_id,
+                )
+            products[key] = product
+        return products[key]
+
+    kept = {}
+    for stock in Stock.objects.select_related("branch__distributor").order_by("id").iterator():
+        product = product_for(stock.branch.distributor.user_id, stock.product_name, stock.price)
+        key = (stock.branch_id, product.id)
+        if key in kept:
+            StockHistory.objects.filter(stock_id=stock.id).update(stock_id=kept[key])
+            Stock.objects.filter(id=kept[key]).update(quantity=F("quantity") + stock.quantity)
+            stock.delete()
+            continue
+        kept[key] = stock.id
+        Stock.objects.filter(id=stock.id).update(product=product)
+
+    stock_products = dict(
+        ((branch_id, name), product_id)
+        for branch_id, name, product_id in Stock.objects.values_list("branch_id", "product_name", "product_id")
+    )
+    for order in Order.objects.filter(product__isnull=True).order_by("id").iterator():
+        product_id = stock_products.get((order.branch_id, order.product_name))
+        if product_id is None:
+            product_id = product_for(order.distributor_id, order.product_name, order.price).id
+        Order.objects.filter(id=order.id).update(product_id=product_id)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('distributor', '0005_stock_product_order_product'),
+        ('products', '0004_alter_category_distributor'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_products, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,46 @@
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def restore_order_product_names(apps, schema_editor):
+    Order = apps.get_model("distributor", "Order")
+    Product = apps.get_model("products", "Product")
+    Order.objects.update(product_name=Subquery(Product.objects.filter(pk=OuterRef("product_id")).values("name")[:1]))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('distributor', '0006_backfill_stock_order_product'),
+        ('products', '0004_alter_category_distributor'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='order',
+            name='product',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='orders', to='products.product'),
+        ),
+        # Nullable first so that unapplying can re-add the column and refill it
+        # from the product before making it NOT NULL again.
+        migrations.AlterField(
+            model_name='order',
+            name='product_name',
+            field=models.CharField(max_length=255, null=True),
+        ),
+        migrations.RunPython(migrations.RunPython.noop, restore_order_product_names),
+        migrations.RemoveField(
+            model_name='order',
+            name='product_name',
+        ),
+        migrations.AlterField(
+            model_name='stock',
+            name='product',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stocks', to='products.product'),
+        ),
+        migrations.AddConstraint(
+            model_name='stock',
+            constraint=models.UniqueConstraint(fields=('branch', 'product'), name='unique_stock_branch_product'),
+        ),
+    ]
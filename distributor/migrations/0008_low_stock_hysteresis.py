@@ -0,0 +1,33 @@
+# Generated by Django 5.1.3 on 2026-10-18 13:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('distributor', '0007_stock_branch_product_unique'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='branch',
+            name='low_stock_threshold',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='stock',
+            name='low_stock_armed',
+            field=models.BooleanField(default=True),
+        ),
+        migrations.AddField(
+            model_name='stock',
+            name='low_stock_rearm_level',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='stock',
+            name='low_stock_threshold',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.3 on 2026-10-18 13:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('distributor', '0008_low_stock_hysteresis'),
+        ('products', '0004_alter_category_distributor'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stock',
+            name='version',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='stock',
+            index=models.Index(fields=['branch', 'last_updated'], name='distributor_branch__4a1aa3_idx'),
+        ),
+    ]
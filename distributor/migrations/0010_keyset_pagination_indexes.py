@@ -0,0 +1,36 @@
+# Generated by Django 5.1.3 on 2026-10-18 13:26
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('distributor', '0009_stock_version'),
+        ('products', '0004_alter_category_distributor'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(fields=['distributor', 'created_at', 'id'], name='distributor_distrib_86e794_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['distributor', 'created_at', 'id'], name='distributor_distrib_2a71d9_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['branch', 'created_at', 'id'], name='distributor_branch__3d6208_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['payment_date', 'id'], name='distributor_payment_c5101b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stockhistory',
+            index=models.Index(fields=['stock', 'timestamp', 'id'], name='distributor_stock_i_f1f75a_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.1.3 on 2026-10-18 13:27
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('distributor', '0010_keyset_pagination_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='distributorcustomer',
+            index=models.Index(fields=['distributor', 'created_at', 'id'], name='distributor_distrib_f97386_idx'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def restore_stock_product_names(apps, schema_editor):
+    Stock = apps.get_model("distributor", "Stock")
+    Product = apps.get_model("products", "Product")
+    Stock.objects.update(product_name=Subquery(Product.objects.filter(pk=OuterRef("product_id")).values("name")[:1]))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('distributor', '0011_distributorcustomer_list_index'),
+        ('products', '0004_alter_category_distributor'),
+    ]
+
+    operations = [
+        # Nullable first so that unapplying can re-add the column and refill it
+        # from the product before making it NOT NULL again.
+        migrations.AlterField(
+            model_name='stock',
+            name='product_name',
+            field=models.CharField(max_length=255, null=True),
+        ),
+        migrations.RunPython(migrations.RunPython.noop, restore_stock_product_names),
+        migrations.RemoveField(
+            model_name='stock',
+            name='product_name',
+        ),
+    ]
@@ -28,6 +28,7 @@ class DistributorCustomer(models.Model):
 
     class Meta:
         unique_together = ('distributor', 'customer')
+        indexes = [models.Index(fields=["distributor", "created_at", "id"])]
 
     def __str__(self):
         return f"{self.customer.username} -> {self.distributor.name}"
@@ -43,14 +44,21 @@ class Order(models.Model):
     distributor = models.ForeignKey(User, on_delete=models.CASCADE, related_name="orders")
     branch = models.ForeignKey("Branch", on_delete=models.CASCADE, related_name="branch_orders")
     customer = models.ForeignKey(User, on_delete=models.CASCADE, related_name="customer_orders")
-    product_name = models.CharField(max_length=255)
+    product = models.ForeignKey("products.Product", on_delete=models.PROTECT, related_name="orders")
     quantity = models.PositiveIntegerField()
     price = models.DecimalField(max_digits=10, decimal_places=2)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="Pending")
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        # Keyset pagination: newest-first pages per distributor and per branch
+        indexes = [
+            models.Index(fields=["distributor", "created_at", "id"]),
+            models.Index(fields=["branch", "created_at", "id"]),
+        ]
+
     def __str__(self):
-        return f"Order {self.id} - {self.product_name} ({self.status})"
+        return f"Order {self.id} - {self.product.name} ({self.status})"
 
 class Invoice(models.Model):
     STATUS_CHOICES = [
@@ -65,6 +73,9 @@ class Invoice(models.Model):
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="Pending")
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [models.Index(fields=["distributor", "created_at", "id"])]
+
     def __str__(self):
         return f"Invoice {self.id} - {self.status}"
     
@@ -74,6 +85,11 @@ class Payment(models.Model):
     amount_paid = models.DecimalField(max_digits=10, decimal_places=2)
     payment_date = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        # A distributor's payments span many invoices, so walk them newest-first
+        # and filter on the invoice join rather than leading with invoice.
+        indexes = [models.Index(fields=["payment_date", "id"])]
+
     def __str__(self):
         return f"Payment {self.transaction_id} - {self.amount_paid}"    
 
@@ -97,6 +113,7 @@ class Branch(models.Model):
         blank=True,
         related_name="managed_branches"
     )
+    low_stock_threshold = models.PositiveIntegerField(null=True, blank=True)  # Overrides settings.LOW_STOCK_THRESHOLD
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
@@ -105,14 +122,58 @@ class Branch(models.Model):
 
 class Stock(models.Model):
     branch = models.ForeignKey(Branch, on_delete=models.CASCADE, related_name="stocks")
-    product_name = models.CharField(max_length=255)
+    product = models.ForeignKey("products.Product", on_delete=models.CASCADE, related_name="stocks")
     quantity = models.PositiveIntegerField(default=0)
     price = models.DecimalField(max_digits=10, decimal_places=2)
     last_updated = models.DateTimeField(auto_now=True)
 
+    # Low-stock alerting. An alert fires when the quantity drops to the
+    # threshold while the stock is armed; it then stays disarmed until the
+    # quantity climbs back to the re-arm level, so a SKU hovering around the
+    # threshold alerts once instead of on every sale.
+    low_stock_threshold = models.PositiveIntegerField(null=True, blank=True)  # Overrides the branch threshold
+    low_stock_rearm_level = models.PositiveIntegerField(null=True, blank=True)
+    low_stock_armed = models.BooleanField(default=True)
+
+    # Bumped on every quantity change; lets stream clients order and dedup deltas
+    version = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["branch", "product"], name="unique_stock_branch_product"),
+        ]
+        indexes = [
+            # Stream resume: "what changed in this branch since <cursor>"
+            models.Index(fields=["branch", "last_updated"]),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.version += 1
+        if kwargs.get("update_fields") is not None:
+            kwargs["update_fields"] = {*kwargs["update_fields"], "version"}
+        super().save(*args, **kwargs)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored quantity so post_save receivers can see what changed
+        instance._loaded_quantity = instance.__dict__.get("quantity")
+        return instance
+
+    def get_low_stock_threshold(self):
+        if self.low_stock_threshold is not None:
+            return self.low_stock_threshold
+        if self.branch.low_stock_threshold is not None:
+            return self.branch.low_stock_threshold
+        return settings.LOW_STOCK_THRESHOLD
+
+    def get_low_stock_rearm_level(self, threshold):
+        if self.low_stock_rearm_level is not None:
+            return max(self.low_stock_rearm_level, threshold + 1)
+        return threshold + settings.LOW_STOCK_REARM_MARGIN
 
     def __str__(self):
-        return f"{self.product_name} - {self.branch.name}"
+        return f"{self.product.name} - {self.branch.name}"
 
 class StockHistory(models.Model):
     stock = models.ForeignKey(Stock, on_delete=models.CASCADE, related_name="history")
@@ -120,5 +181,8 @@ class StockHistory(models.Model):
     quantity_changed = models.IntegerField()
     timestamp = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [models.Index(fields=["stock", "timestamp", "id"])]
+
     def __str__(self):
-        return f"{self.stock.product_name} - {self.action} ({self.quantity_changed})"
\ No newline at end of file
+        return f"{self.stock.product.name} - {self.action} ({self.quantity_changed})"
\ No newline at end of file
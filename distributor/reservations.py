@@ -0,0 +1,150 @@
+from django.db import transaction
+from django.db.models import Case, F, PositiveIntegerField, Q, When
+from django.utils import timezone
+
+from .models import Order, Stock, StockHistory
+from .signals import stock_level_changed
+
+
+class ReservationError(Exception):
+    """Base error for stock reservations that cannot be fulfilled."""
+
+
+class StockNotFound(ReservationError):
+    pass
+
+
+class InsufficientStock(ReservationError):
+    pass
+
+
+def reserve_stock(branch, product, quantity):
+    """
+    Atomically take `quantity` units of a product out of a branch's stock.
+
+    The row is locked with SELECT ... FOR UPDATE and the decrement itself is a
+    conditional UPDATE (quantity >= requested), so two checkouts racing on the
+    same SKU can never both succeed past zero. Must run inside a transaction.
+    """
+    stock = (
+        branch.stocks.select_for_update()
+        .filter(product=product)
+        .first()
+    )
+    if stock is None:
+        raise StockNotFound("Product not found in this branch")
+
+    now = timezone.now()
+    updated = Stock.objects.filter(pk=stock.pk, quantity__gte=quantity).update(
+        quantity=F("quantity") - quantity,
+        version=F("version") + 1,
+        last_updated=now,
+    )
+    if not updated:
+        raise InsufficientStock("Not enough stock available")
+
+    # The row is locked for the rest of the transaction, so the value we read
+    # is the one the UPDATE decremented.
+    previous_quantity = stock.quantity
+    stock.quantity = previous_quantity - quantity
+    stock.version += 1
+    stock.last_updated = now
+
+    StockHistory.objects.create(stock=stock, action="Order Placed", quantity_changed=-quantity)
+    stock_level_changed.send(sender=Stock, stock=stock, previous_quantity=previous_quantity)
+    return stock
+
+
+def place_order(branch, customer, product, quantity, price):
+    """Reserve stock and record the order in a single transaction."""
+    with transaction.atomic():
+        reserve_stock(branch, product, quantity)
+        order = Order.objects.create(
+            distributor_id=branch.distributor.user_id,
+            branch=branch,
+            customer=customer,
+            product=product,
+            quantity=quantity,
+            price=price,
+        )
+    return order
+
+
+def reserve_stock_batch(branch, lines):
+    """
+    Reserve every line of a basket against one branch in a fixed number of
+    statements: one locking SELECT, one guarded UPDATE and one bulk history
+    insert, whatever the basket size. Either every line is reserved or none
+    is. Must run inside a transaction.
+    """
+    wanted = {}
+    for line in lines:
+        wanted[line["product"]] = wanted.get(line["product"], 0) + line["quantity"]
+
+    stocks = {
+        stock.product_id: stock
+        for stock in (
+            branch.stocks.select_for_update(of=("self",))
+            .select_related("product")
+            .filter(product_id__in=wanted)
+        )
+    }
+    missing = sorted(product_id for product_id in wanted if product_id not in stocks)
+    if missing:
+        raise StockNotFound(f"Products not found in this branch: {', '.join(map(str, missing))}")
+
+    short = sorted(stocks[product_id].product.name for product_id, quantity in wanted.items()
+                   if stocks[product_id].quantity < quantity)
+    if short:
+        raise InsufficientStock(f"Not enough stock available for: {', '.join(short)}")
+
+    # One UPDATE for the whole basket. The per-row guard means a row that was
+    # drained under us is simply not matched, and the count check below
+    # rolls the transaction back.
+    guard = Q()
+    decrements = []
+    for product_id, quantity in wanted.items():
+        guard |= Q(pk=stocks[product_id].pk, quantity__gte=quantity)
+        decrements.append(When(pk=stocks[product_id].pk, then=F("quantity") - quantity))
+
+    now = timezone.now()
+    updated = Stock.objects.filter(guard).update(
+        quantity=Case(*decrements, default=F("quantity"), output_field=PositiveIntegerField()),
+        version=F("version") + 1,
+        last_updated=now,
+    )
+    if updated != len(wanted):
+        raise InsufficientStock("Not enough stock available")
+
+    StockHistory.objects.bulk_create([
+        StockHistory(stock=stocks[line["product"]], action="Order Placed", quantity_changed=-line["quantity"])
+        for line in lines
+    ])
+
+    for product_id, quantity in wanted.items():
+        stock = stocks[product_id]
+        previous_quantity = stock.quantity
+        stock.quantity = previous_quantity - quantity
+        stock.version += 1
+        stock.last_updated = now
+        stock_level_changed.send(sender=Stock, stock=stock, previous_quantity=previous_quantity)
+
+    return stocks
+
+
+def place_order_batch(branch, customer, lines):
+    """Reserve stock for a whole basket and record one order per line, atomically."""
+    with transaction.atomic():
+        stocks = reserve_stock_batch(branch, lines)
+        orders = Order.objects.bulk_create([
+            Order(
+                distributor_id=branch.distributor.user_id,
+                branch=branch,
+                customer=customer,
+                product=stocks[line["product"]].product,
+                quantity=line["quantity"],
+                price=line["price"],
+            )
+            for line in lines
+        ])
+    return orders
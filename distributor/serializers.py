@@ -22,10 +22,22 @@ class InvoiceSerializer(serializers.ModelSerializer):
 
 
 class OrderSerializer(serializers.ModelSerializer):
+    product_name = serializers.CharField(source="product.name", read_only=True)
+
     class Meta:
         model = Order
         fields = "__all__"
 
+class OrderLineSerializer(serializers.Serializer):
+    product = serializers.IntegerField(min_value=1)
+    quantity = serializers.IntegerField(min_value=1)
+    price = serializers.DecimalField(max_digits=10, decimal_places=2)
+
+
+class OrderBatchSerializer(serializers.Serializer):
+    items = OrderLineSerializer(many=True, allow_empty=False, max_length=200)
+
+
 class PaymentSerializer(serializers.ModelSerializer):
     class Meta:
         model = Payment
@@ -38,9 +50,12 @@ class BranchSerializer(serializers.ModelSerializer):
 
 
 class StockSerializer(serializers.ModelSerializer):
+    product_name = serializers.CharField(source="product.name", read_only=True)
+
     class Meta:
         model = Stock
         fields = "__all__"
+        read_only_fields = ["low_stock_armed"]
 
 
 
@@ -1,10 +1,14 @@
 from django.db.models.signals import post_save
-from django.dispatch import receiver
+from django.dispatch import Signal, receiver
 from django.contrib.auth import get_user_model
 from  .models import Distributor
 
 User = get_user_model()
 
+# Sent when a stock level is changed with a queryset UPDATE (which bypasses
+# post_save). Receivers get `stock` and `previous_quantity`.
+stock_level_changed = Signal()
+
 @receiver(post_save, sender=Distributor)
 def create_distributor_user(sender, instance, created, **kwargs):
     if created:
@@ -1,3 +1,341 @@
-from django.test import TestCase
+from decimal import Decimal
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.db.models import F
+from django.test import TransactionTestCase
+from rest_framework.test import APITestCase
+
+from .fixtures import create_product, create_stock, create_tenant, create_user
+from .models import DistributorCustomer, Invoice, Order, Payment, Stock, StockHistory
+from .serializers import OrderSerializer
+from .views import DistributorListAPIView
+
+User = get_user_model()
+
+
+class DistributorFixtures(APITestCase):
+    rows = 5
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.distributor, cls.branch = create_tenant("acme", name="Acme")
+        cls.user = cls.distributor.user
+        for i in range(cls.rows):
+            customer = create_user("customer")
+            DistributorCustomer.objects.create(distributor=cls.distributor, customer=customer)
+            product = create_product(cls.distributor, f"Product {i}")
+            stock = create_stock(cls.branch, product)
+            StockHistory.objects.create(stock=stock, action="Added", quantity_changed=100)
+            Order.objects.create(
+                distributor=cls.user, branch=cls.branch, customer=customer, product=product,
+                quantity=1, price=Decimal("10"),
+            )
+            invoice = Invoice.objects.create(distributor=cls.user, customer=customer, total_amount=Decimal("10"))
+            Payment.objects.create(invoice=invoice, transaction_id=f"tx-{i}", amount_paid=Decimal("10"))
+        cls.stock = stock
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(self.user)
+
+
+class DistributorListQueryCountTests(DistributorFixtures):
+    """Each distributor list runs one query per page, however many rows it serializes."""
+
+    def assertListQueries(self, url, expected_rows, queries=1):
+        with self.assertNumQueries(queries):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data["results"]), expected_rows)
+        return response
+
+    def test_customers(self):
+        response = self.assertListQueries("/distributor/distributor-customers/", self.rows)
+        self.assertEqual(response.data["results"][0]["distributor_name"], "Acme")
+
+    def test_orders(self):
+        response = self.assertListQueries("/distributor/distributor-orders/", self.rows)
+        self.assertEqual(response.data["results"][0]["product_name"], "Product 4")
+
+    def test_invoices(self):
+        self.assertListQueries("/distributor/distributor-invoices/", self.rows)
+
+    def test_payments(self):
+        self.assertListQueries("/distributor/distributor-payments/", self.rows)
+
+    def test_branches(self):
+        self.assertListQueries("/distributor/distributor-branches/", 1)
+
+    def test_branch_stock(self):
+        # Plus the aggregate behind its ETag
+        self.assertListQueries(f"/distributor/branch-stock/{self.branch.id}/", self.rows, queries=2)
+
+    def test_branch_orders(self):
+        self.assertListQueries(f"/distributor/branch-orders/{self.branch.id}/", self.rows)
+
+    def test_stock_history(self):
+        self.assertListQueries(f"/distributor/stock-history/{self.stock.id}/", 1)
+
+    def test_next_page_is_one_query(self):
+        first = self.client.get("/distributor/distributor-orders/?page_size=2")
+        with self.assertNumQueries(1):
+            second = self.client.get(first.data["next"])
+        self.assertEqual(len(second.data["results"]), 2)
+
+    def test_empty_list_keeps_shape(self):
+        self.client.force_authenticate(User.objects.create(email="x@example.com", username="x"))
+        with self.assertNumQueries(0):
+            response = self.client.get("/distributor/distributor-orders/")
+        self.assertEqual(response.data, {"next": None, "results": []})
+
+    def test_list_without_a_queryset_hook_is_rejected_at_definition(self):
+        with self.assertRaisesMessage(TypeError, "Incomplete must define get_distributor_queryset(user)"):
+            class Incomplete(DistributorListAPIView):
+                serializer_class = OrderSerializer
+
+
+class ConditionalListTests(DistributorFixtures):
+    """Polling an unchanged list costs one aggregate query and returns no body."""
+
+    def assertNotModified(self, url, queries=1, **headers):
+        with self.assertNumQueries(queries):
+            response = self.client.get(url, headers=headers)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+        return response
+
+    def test_branch_stock_etag(self):
+        url = f"/distributor/branch-stock/{self.branch.id}/"
+        etag = self.client.get(url)["ETag"]
+        self.assertEqual(self.assertNotModified(url, if_none_match=etag)["ETag"], etag)
+
+        # Reservations bump the version without touching last_updated
+        Stock.objects.filter(pk=self.stock.pk).update(version=F("version") + 1)
+        response = self.client.get(url, headers={"if_none_match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_branch_stock_shows_a_renamed_product(self):
+        url = f"/distributor/branch-stock/{self.branch.id}/"
+        etag = self.client.get(url)["ETag"]
+        self.stock.product.name = "Renamed"
+        self.stock.product.save()
+        response = self.client.get(url, headers={"if_none_match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("Renamed", [row["product_name"] for row in response.data["results"]])
+
+    def test_branch_stock_if_modified_since(self):
+        url = f"/distributor/branch-stock/{self.branch.id}/"
+        last_modified = self.client.get(url)["Last-Modified"]
+        self.assertNotModified(url, if_modified_since=last_modified)
+
+class CreateOrderTests(DistributorFixtures):
+
+    def order(self, quantity):
+        return self.client.post(
+            f"/distributor/create-order/{self.branch.id}/",
+            {"product": self.stock.product_id, "quantity": quantity, "price": "10.00"},
+            format="json",
+        )
+
+    def test_reserves_stock_for_the_order(self):
+        version = self.stock.version
+        response = self.order(30)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data["data"]["quantity"], 30)
+        self.stock.refresh_from_db()
+        self.assertEqual(self.stock.quantity, 70)
+        self.assertEqual(self.stock.version, version + 1)
+        self.assertTrue(Order.objects.filter(pk=response.data["data"]["id"], customer=self.user).exists())
+
+    def test_refuses_more_than_is_in_stock(self):
+        orders = Order.objects.count()
+        response = self.order(101)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data, {"error": "Not enough stock available"})
+        self.stock.refresh_from_db()
+        self.assertEqual(self.stock.quantity, 100)
+        self.assertEqual(Order.objects.count(), orders)
+
+
+class BackfillStockOrderProductTests(TransactionTestCase):
+    """distributor 0006: Stock and Order rows gain a product, duplicate stock rows merge."""
+
+    before = [("distributor", "0005_stock_product_order_product"), ("products", "0004_alter_category_distributor")]
+
+    def setUp(self):
+        executor = MigrationExecutor(connection)
+        self.latest = executor.loader.graph.leaf_nodes()
+        executor.migrate(self.before)
+        self.apps = executor.loader.project_state(self.before).apps
+
+    def tearDown(self):
+        MigrationExecutor(connection).migrate(self.latest)
+
+    def migrate_forward(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.latest)
+        return executor.loader.project_state(self.latest).apps
+
+    def test_backfills_products_and_merges_duplicate_stock(self):
+        Distributor = self.apps.get_model("distributor", "Distributor")
+        Branch = self.apps.get_model("distributor", "Branch")
+        Stock = self.apps.get_model("distributor", "Stock")
+        StockHistory = self.apps.get_model("distributor", "StockHistory")
+        Order = self.apps.get_model("distributor", "Order")
+        Category = self.apps.get_model("products", "Category")
+        Product = self.apps.get_model("products", "Product")
+
+        # The user app is never rolled back, so its rows come from the current model
+        owner = create_user("acme", role=User.ROLE.DISTRIBUTOR)
+        customer = create_user("customer")
+        distributor = Distributor.objects.create(user_id=owner.pk, name="Acme")
+        branch = Branch.objects.create(distributor=distributor, name="Main", location="Lagos")
+        category = Category.objects.create(name="Drinks", slug="drinks", distributor_id=owner.pk)
+        cola = Product.objects.create(
+            name="Cola", price=10, stock_quantity=0, category=category, distributor_id=owner.pk
+        )
+
+        def stock(name, quantity):
+            return Stock.objects.create(branch=branch, product_name=name, quantity=quantity, price=Decimal("10"))
+
+        kept, duplicate, uncatalogued = stock("Cola", 30), stock("Cola", 12), stock("Fanta", 5)
+        StockHistory.objects.create(stock=duplicate, action="Added", quantity_changed=12)
+        order = Order.objects.create(
+            distributor_id=owner.pk, branch=branch, customer_id=customer.pk, product_name="Cola",
+            quantity=1, price=Decimal("10"),
+        )
+        stray_order = Order.objects.create(
+            distributor_id=owner.pk, branch=branch, customer_id=customer.pk, product_name="Sprite",
+            quantity=1, price=Decimal("10"),
+        )
+
+        apps = self.migrate_forward()
+        Stock = apps.get_model("distributor", "Stock")
+        Product = apps.get_model("products", "Product")
+        Order = apps.get_model("distributor", "Order")
+        StockHistory = apps.get_model("distributor", "StockHistory")
+
+        self.assertEqual(
+            {(s.id, s.product_id, s.quantity) for s in Stock.objects.all()},
+            {(kept.id, cola.id, 42), (uncatalogued.id, Product.objects.get(name="Fanta").id, 5)},
+        )
+        self.assertEqual(StockHistory.objects.get().stock_id, kept.id)
+        self.assertEqual(Order.objects.get(pk=order.pk).product_id, cola.id)
+        sprite = Product.objects.get(name="Sprite")
+        self.assertEqual(Order.objects.get(pk=stray_order.pk).product_id, sprite.id)
+        self.assertEqual((sprite.distributor_id, sprite.category.name), (owner.pk, "Uncategorized"))
+
+
+class BranchWriteTests(DistributorFixtures):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.product = create_product(cls.distributor, "Fanta")
+        cls.rival, cls.rival_branch = create_tenant("rival")
+
+    def test_add_stock_from_json_and_form_posts(self):
+        for data, format in ({"quantity": 20}, "json"), ({"quantity": "20"}, "multipart"):
+            Stock.objects.filter(product=self.product).delete()
+            response = self.client.post(
+                f"/distributor/add-stock/{self.branch.id}/",
+                {**data, "product": self.product.pk, "price": "10.00"},
+                format=format,
+            )
+            self.assertEqual(response.status_code, 201, response.data)
+            stock = Stock.objects.get(pk=response.data["id"])
+            self.assertEqual((stock.branch_id, stock.quantity), (self.branch.id, 20))
+            self.assertTrue(StockHistory.objects.filter(stock=stock, action="Added", quantity_changed=20).exists())
+
+    def test_add_stock_to_another_distributors_branch_is_refused(self):
+        response = self.client.post(
+            f"/distributor/add-stock/{self.rival_branch.id}/",
+            {"product": self.product.pk, "quantity": 20, "price": "10.00"},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(Stock.objects.filter(branch=self.rival_branch).exists())
+
+    def test_another_distributors_stock_cannot_be_changed(self):
+        self.client.force_authenticate(self.rival.user)
+        response = self.client.patch(f"/distributor/update-stock/{self.stock.pk}/", {"quantity": 1}, format="json")
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(self.client.delete(f"/distributor/delete-stock/{self.stock.pk}/").status_code, 403)
+        self.assertEqual(Stock.objects.get(pk=self.stock.pk).quantity, 100)
+
+    def test_update_order_status(self):
+        order = Order.objects.filter(branch=self.branch).first()
+        response = self.client.patch(f"/distributor/update-order/{order.pk}/", {"status": "Shipped"}, format="json")
+        self.assertEqual(response.status_code, 200)
+        order.refresh_from_db()
+        self.assertEqual(order.status, "Shipped")
+
+        self.client.force_authenticate(self.rival.user)
+        response = self.client.patch(f"/distributor/update-order/{order.pk}/", {"status": "Delivered"}, format="json")
+        self.assertEqual(response.status_code, 403)
+
+
+class CreateOrderBatchTests(DistributorFixtures):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.stocks = [create_stock(cls.branch, create_product(cls.distributor, f"Basket {i}")) for i in range(40)]
+
+    def order(self, *lines):
+        return self.client.post(
+            f"/distributor/create-order-batch/{self.branch.id}/",
+            {"items": [{"product": stock.product_id, "quantity": quantity, "price": "10.00"}
+                       for stock, quantity in lines]},
+            format="json",
+        )
+
+    def quantities(self):
+        return list(Stock.objects.filter(pk__in=[s.pk for s in self.stocks]).order_by("pk")
+                    .values_list("quantity", flat=True))
+
+    def test_reserves_every_line(self):
+        response = self.order((self.stocks[0], 5), (self.stocks[1], 7))
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([order["quantity"] for order in response.data["data"]], [5, 7])
+        self.assertEqual(self.quantities()[:3], [95, 93, 100])
+        self.assertEqual(StockHistory.objects.filter(stock__in=self.stocks[:2], action="Order Placed").count(), 2)
+
+    def test_one_short_line_rejects_the_whole_basket(self):
+        orders, history = Order.objects.count(), StockHistory.objects.count()
+        response = self.order((self.stocks[0], 5), (self.stocks[1], 101))
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data, {"error": "Not enough stock available for: Basket 1"})
+        self.assertEqual(self.quantities(), [100] * 40)
+        self.assertEqual((Order.objects.count(), StockHistory.objects.count()), (orders, history))
+
+    def test_duplicate_lines_are_summed(self):
+        self.assertEqual(self.order((self.stocks[0], 60), (self.stocks[0], 50)).status_code, 400)
+        self.assertEqual(self.quantities()[0], 100)
+
+        response = self.order((self.stocks[0], 30), (self.stocks[0], 20))
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.data["data"]), 2)
+        self.assertEqual(self.quantities()[0], 50)
+
+    def test_missing_product_is_not_found(self):
+        elsewhere = create_product(self.distributor, "Not stocked here")
+        response = self.client.post(
+            f"/distributor/create-order-batch/{self.branch.id}/",
+            {"items": [{"product": self.stocks[0].product_id, "quantity": 1, "price": "10.00"},
+                       {"product": elsewhere.pk, "quantity": 1, "price": "10.00"}]},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.data, {"error": f"Products not found in this branch: {elsewhere.pk}"})
+        self.assertEqual(self.quantities()[0], 100)
+
+    def test_query_count_does_not_grow_with_the_basket(self):
+        for size in (1, 10, 40):
+            with self.subTest(size=size), self.assertNumQueries(7):
+                response = self.order(*((stock, 1) for stock in self.stocks[:size]))
+            self.assertEqual(response.status_code, 201)
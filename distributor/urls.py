@@ -5,7 +5,8 @@ GetDistributorCustomersAPIView , UpdateOrderStatusAPIView,
 GetDistributorInvoicesAPIView,  GetDistributorPaymentsAPIView,
 GetDistributorBranchesAPIView, GetBranchStockAPIView,
 AddStockAPIView, UpdateStockAPIView, DeleteStockAPIView,
-CreateOrderAPIView, GetBranchOrdersAPIView , GetStockHistoryAPIView
+CreateOrderAPIView, GetBranchOrdersAPIView , GetStockHistoryAPIView,
+CreateOrderBatchAPIView
 )
     
 
@@ -21,12 +22,13 @@ urlpatterns = [
     path("distributor-invoices/", GetDistributorInvoicesAPIView.as_view(), name="distributor-invoices"),
     path("distributor-payments/", GetDistributorPaymentsAPIView.as_view(), name="distributor-payments"),
     path("distributor-branches/", GetDistributorBranchesAPIView.as_view(), name="distributor-branches"),
-    path("branch-stock/<int:branch_id>/", GetBranchStockAPIView.as_view(), name="branch-stock"),
-    path("add-stock/<int:branch_id>/", AddStockAPIView.as_view(), name="add-stock"),
+    path("branch-stock/<uuid:branch_id>/", GetBranchStockAPIView.as_view(), name="branch-stock"),
+    path("add-stock/<uuid:branch_id>/", AddStockAPIView.as_view(), name="add-stock"),
     path("update-stock/<int:stock_id>/", UpdateStockAPIView.as_view(), name="update-stock"),
     path("delete-stock/<int:stock_id>/", DeleteStockAPIView.as_view(), name="delete-stock"),
-    path("create-order/<int:branch_id>/", CreateOrderAPIView.as_view(), name="create-order"),
-    path("branch-orders/<int:branch_id>/", GetBranchOrdersAPIView.as_view(), name="branch-orders"),
+    path("create-order/<uuid:branch_id>/", CreateOrderAPIView.as_view(), name="create-order"),
+    path("create-order-batch/<uuid:branch_id>/", CreateOrderBatchAPIView.as_view(), name="create-order-batch"),
+    path("branch-orders/<uuid:branch_id>/", GetBranchOrdersAPIView.as_view(), name="branch-orders"),
     path("update-order/<int:order_id>/", UpdateOrderStatusAPIView.as_view(), name="update-order"),
     path("stock-history/<int:stock_id>/", GetStockHistoryAPIView.as_view(), name="stock-history"),
 ]
@@ -4,8 +4,11 @@ from rest_framework import status
 from .models import DistributorCustomer ,Order , Invoice , Payment , Branch , Stock , StockHistory
 from .serializers import (
 DistributorCustomerSerializer ,OrderSerializer , StockSerializer,InvoiceSerializer ,
-StockHistorySerializer, PaymentSerializer ,  BranchSerializer
+StockHistorySerializer, PaymentSerializer ,  BranchSerializer, OrderBatchSerializer
 )
+from .conditional import ConditionalListMixin
+from .pagination import KeysetPagination
+from .reservations import InsufficientStock, StockNotFound, place_order, place_order_batch
 from django.contrib.auth import get_user_model
 
 User = get_user_model()
@@ -36,45 +39,53 @@ class AssignCustomerToDistributorAPIView(generics.CreateAPIView):
 
 
 
-class GetDistributorCustomersAPIView(generics.ListAPIView):
-    serializer_class = DistributorCustomerSerializer
+class DistributorListAPIView(generics.ListAPIView):
+    """
+    Base for the distributor dashboard lists.
+
+    Rows are fetched a page at a time by KeysetPagination in one query: no
+    exists() probe, no COUNT(*), and the response is {"next", "results"}
+    whether or not anything matched. Subclasses must define
+    `get_distributor_queryset(user)` with the joins and column projection
+    their serializer needs (a subclass without it is a TypeError at import);
+    anyone who is not a distributor gets an empty list.
+    """
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetPagination
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if not callable(getattr(cls, "get_distributor_queryset", None)):
+            raise TypeError(f"{cls.__name__} must define get_distributor_queryset(user)")
 
     def get_queryset(self):
-        # Ensure only distributors can access their assigned customers
-        if self.request.user.role == "Distributor":  # Adjust role comparison to match exactly
-            distributor = getattr(self.request.user, 'distributor_profile', None)  # Access distributor profile
-            if distributor:
-                return DistributorCustomer.objects.filter(distributor=distributor)
-        return DistributorCustomer.objects.none()  # Return empty queryset if no distributor found
+        if not self.request.user.is_distributor():
+            return self.get_serializer_class().Meta.model.objects.none()
+        return self.get_distributor_queryset(self.request.user)
 
-    def list(self, request, *args, **kwargs):
-        queryset = self.get_queryset()
 
-        if not queryset.exists():
-            return Response({"message": "No customers assigned"}, status=status.HTTP_200_OK)
+# Columns OrderSerializer reads: every Order field plus the product name.
+ORDER_LIST_FIELDS = (
+    "id", "distributor", "branch", "customer", "product__name",
+    "quantity", "price", "status", "created_at",
+)
 
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
 
-class GetDistributorOrdersAPIView(generics.ListAPIView):
-    serializer_class = OrderSerializer
-    permission_classes = [permissions.IsAuthenticated]
-
-    def get_queryset(self):
-        if self.request.user.role == "distributor":
-            return Order.objects.filter(distributor=self.request.user)
-        return Order.objects.none()
+class GetDistributorCustomersAPIView(DistributorListAPIView):
+    serializer_class = DistributorCustomerSerializer
 
-    def list(self, request, *args, **kwargs):
-        queryset = self.get_queryset()
-        if not queryset.exists():
-            return Response({"message": "No orders found"}, status=200)
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data, status=200)
+    def get_distributor_queryset(self, user):
+        return (
+            DistributorCustomer.objects.filter(distributor__user=user)
+            .select_related("customer", "distributor")
+            .only("id", "created_at", "customer__email", "customer__username", "distributor__name")
+        )
 
+class GetDistributorOrdersAPIView(DistributorListAPIView):
+    serializer_class = OrderSerializer
 
-   
+    def get_distributor_queryset(self, user):
+        return Order.objects.filter(distributor=user).select_related("product").only(*ORDER_LIST_FIELDS)
 
     def patch(self, request, *args, **kwargs):
         order_id = kwargs.get("order_id")
@@ -94,114 +105,56 @@ class GetDistributorOrdersAPIView(generics.ListAPIView):
         return Response({"message": "Order status updated successfully"}, status=status.HTTP_200_OK)
 
 
-class GetDistributorInvoicesAPIView(generics.ListAPIView):
+class GetDistributorInvoicesAPIView(DistributorListAPIView):
     serializer_class = InvoiceSerializer
-    permission_classes = [permissions.IsAuthenticated]
-
-    def get_queryset(self):
-        if self.request.user.role == "distributor":
-            return Invoice.objects.filter(distributor=self.request.user)
-        return Invoice.objects.none()
 
-    def list(self, request, *args, **kwargs):
-        queryset = self.get_queryset()
-        if not queryset.exists():
-            return Response({"message": "No invoices found"}, status=200)
+    def get_distributor_queryset(self, user):
+        return Invoice.objects.filter(distributor=user)
 
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data, status=200)
 
 
-
-class GetDistributorPaymentsAPIView(generics.ListAPIView):
+class GetDistributorPaymentsAPIView(DistributorListAPIView):
     serializer_class = PaymentSerializer
-    permission_classes = [permissions.IsAuthenticated]
-
-    def get_queryset(self):
-        if self.request.user.role == "distributor":
-            distributor_invoices = Invoice.objects.filter(distributor=self.request.user)
-            return Payment.objects.filter(invoice__in=distributor_invoices)
-        return Payment.objects.none()
+    cursor_ordering = ("-payment_date", "-id")
 
-    def list(self, request, *args, **kwargs):
-        queryset = self.get_queryset()
-        if not queryset.exists():
-            return Response({"message": "No payment history found"}, status=200)
+    def get_distributor_queryset(self, user):
+        return Payment.objects.filter(invoice__distributor=user)
 
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data, status=200)
 
 
-
-class GetDistributorBranchesAPIView(generics.ListAPIView):
+class GetDistributorBranchesAPIView(DistributorListAPIView):
     serializer_class = BranchSerializer
-    permission_classes = [permissions.IsAuthenticated]
-
-    def get_queryset(self):
-        if self.request.user.role == "distributor":
-            return Branch.objects.filter(distributor=self.request.user)
-        return Branch.objects.none()
-
-    def list(self, request, *args, **kwargs):
-        queryset = self.get_queryset()
-        if not queryset.exists():
-            return Response({"message": "No branches found"}, status=200)
 
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data, status=200)
+    def get_distributor_queryset(self, user):
+        return Branch.objects.filter(distributor__user=user)
 
 
-class GetBranchStockAPIView(generics.ListAPIView):
+class GetBranchStockAPIView(ConditionalListMixin, DistributorListAPIView):
     serializer_class = StockSerializer
-    permission_classes = [permissions.IsAuthenticated]
-
-    def get_queryset(self):
-        branch_id = self.kwargs.get("branch_id")
-
-        # Ensure the branch belongs to the logged-in distributor
-        if self.request.user.role == "distributor":
-            branch = Branch.objects.filter(id=branch_id, distributor=self.request.user).first()
-            if branch:
-                return Stock.objects.filter(branch=branch)
-
-        return Stock.objects.none()
-
-    def list(self, request, *args, **kwargs):
-        queryset = self.get_queryset()
-        if not queryset.exists():
-            return Response({"message": "No stock available for this branch"}, status=200)
-
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data, status=200)
-
-
-
-
-
-
-
+    cursor_ordering = ("id",)
+    # Polled by dashboards: unchanged stock answers 304 after one aggregate query
+    last_modified_field = "last_updated"
+    version_field = "version"
+    # Rows show their product's name
+    related_modified_fields = ("product__updated_at",)
+
+    def get_distributor_queryset(self, user):
+        # Ownership is checked in the same query as the rows
+        return (
+            Stock.objects.filter(branch_id=self.kwargs.get("branch_id"), branch__distributor__user=user)
+            .select_related("product")
+        )
 
 
-class GetBranchOrdersAPIView(generics.ListAPIView):
+class GetBranchOrdersAPIView(DistributorListAPIView):
     serializer_class = OrderSerializer
-    permission_classes = [permissions.IsAuthenticated]
-
-    def get_queryset(self):
-        branch_id = self.kwargs.get("branch_id")
 
-        # Ensure the branch belongs to the distributor
-        if self.request.user.role == "distributor":
-            return Order.objects.filter(branch__id=branch_id, branch__distributor=self.request.user)
-
-        return Order.objects.none()
-
-    def list(self, request, *args, **kwargs):
-        queryset = self.get_queryset()
-        if not queryset.exists():
-            return Response({"message": "No orders found for this branch"}, status=200)
-
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data, status=200)
+    def get_distributor_queryset(self, user):
+        return (
+            Order.objects.filter(branch_id=self.kwargs.get("branch_id"), branch__distributor__user=user)
+            .select_related("product")
+            .only(*ORDER_LIST_FIELDS)
+        )
 
 
 class UpdateOrderStatusAPIView(generics.UpdateAPIView):
@@ -212,7 +165,7 @@ class UpdateOrderStatusAPIView(generics.UpdateAPIView):
         order_id = kwargs.get("order_id")
 
         try:
-            order = Order.objects.get(id=order_id, branch__distributor=request.user)
+            order = Order.objects.get(id=order_id, branch__distributor__user=request.user)
         except Order.DoesNotExist:
             return Response({"error": "Order not found or unauthorized"}, status=status.HTTP_403_FORBIDDEN)
 
@@ -233,12 +186,12 @@ class AddStockAPIView(generics.CreateAPIView):
 
         # Ensure branch belongs to distributor
         try:
-            branch = Branch.objects.get(id=branch_id, distributor=request.user)
+            branch = Branch.objects.get(id=branch_id, distributor__user=request.user)
         except Branch.DoesNotExist:
             return Response({"error": "Branch not found or unauthorized"}, status=status.HTTP_403_FORBIDDEN)
 
-        data = request.data
-        data["branch"] = branch.id  
+        data = request.data.copy()
+        data["branch"] = branch.id
         serializer = StockSerializer(data=data)
 
         if serializer.is_valid():
@@ -249,10 +202,6 @@ class AddStockAPIView(generics.CreateAPIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
-
-from channels.layers import get_channel_layer
-from asgiref.sync import async_to_sync
-
 class UpdateStockAPIView(generics.UpdateAPIView):
     serializer_class = StockSerializer
     permission_classes = [permissions.IsAuthenticated]
@@ -261,7 +210,7 @@ class UpdateStockAPIView(generics.UpdateAPIView):
         stock_id = kwargs.get("stock_id")
 
         try:
-            stock = Stock.objects.get(id=stock_id, branch__distributor=request.user)
+            stock = Stock.objects.select_related("branch").get(id=stock_id, branch__distributor__user=request.user)
         except Stock.DoesNotExist:
             return Response({"error": "Stock not found or unauthorized"}, status=status.HTTP_403_FORBIDDEN)
 
@@ -278,15 +227,7 @@ class UpdateStockAPIView(generics.UpdateAPIView):
                 quantity_changed=updated_stock.quantity - previous_quantity
             )
 
-            # Broadcast update via WebSockets
-            channel_layer = get_channel_layer()
-            async_to_sync(channel_layer.group_send)(
-                "stock_updates",
-                {
-                    "type": "stock_update",
-                    "message": f"Stock for {updated_stock.product_name} updated to {updated_stock.quantity}",
-                },
-            )
+            # Watching sockets get the new quantity as a stream delta (notification.signals)
 
             return Response({"message": "Stock updated successfully", "data": serializer.data}, status=status.HTTP_200_OK)
 
@@ -299,7 +240,7 @@ class DeleteStockAPIView(generics.DestroyAPIView):
         stock_id = kwargs.get("stock_id")
 
         try:
-            stock = Stock.objects.get(id=stock_id, branch__distributor=request.user)
+            stock = Stock.objects.get(id=stock_id, branch__distributor__user=request.user)
         except Stock.DoesNotExist:
             return Response({"error": "Stock not found or unauthorized"}, status=status.HTTP_403_FORBIDDEN)
 
@@ -317,47 +258,69 @@ class CreateOrderAPIView(generics.CreateAPIView):
 
         # Ensure branch exists
         try:
-            branch = Branch.objects.get(id=branch_id)
+            branch = Branch.objects.select_related("distributor").get(id=branch_id)
         except Branch.DoesNotExist:
             return Response({"error": "Branch not found"}, status=status.HTTP_404_NOT_FOUND)
 
-        data = request.data
-        product_name = data.get("product_name")
-        quantity_requested = int(data.get("quantity"))
+        data = request.data.copy()
+        data["branch"] = branch.id
+        data["distributor"] = branch.distributor.user_id
+        data["customer"] = request.user.id
 
-        # Ensure stock is available
+        serializer = OrderSerializer(data=data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        # Reserve stock and save the order in one transaction
         try:
-            stock = Stock.objects.get(branch=branch, product_name=product_name)
-            if stock.quantity < quantity_requested:
-                return Response({"error": "Not enough stock available"}, status=status.HTTP_400_BAD_REQUEST)
-        except Stock.DoesNotExist:
-            return Response({"error": "Product not found in this branch"}, status=status.HTTP_404_NOT_FOUND)
+            order = place_order(
+                branch,
+                request.user,
+                serializer.validated_data["product"],
+                serializer.validated_data["quantity"],
+                serializer.validated_data["price"],
+            )
+        except StockNotFound as e:
+            return Response({"error": str(e)}, status=status.HTTP_404_NOT_FOUND)
+        except InsufficientStock as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-        # Reduce stock
-        stock.quantity -= quantity_requested
-        stock.save()
+        return Response({"message": "Order created successfully", "data": OrderSerializer(order).data}, status=status.HTTP_201_CREATED)
 
-        # Log stock history
-        StockHistory.objects.create(
-            stock=stock, action="Order Placed", quantity_changed=-quantity_requested
-        )
+class CreateOrderBatchAPIView(generics.CreateAPIView):
+    """Place a multi-line order against one branch in a single request."""
+    serializer_class = OrderBatchSerializer
+    permission_classes = [permissions.IsAuthenticated]
 
-        # Save order
-        data["branch"] = branch.id
-        data["distributor"] = branch.distributor.id  
-        data["customer"] = request.user.id  
+    def post(self, request, *args, **kwargs):
+        branch_id = kwargs.get("branch_id")
 
-        serializer = OrderSerializer(data=data)
-        if serializer.is_valid():
-            serializer.save()
-            return Response({"message": "Order created successfully", "data": serializer.data}, status=status.HTTP_201_CREATED)
+        try:
+            branch = Branch.objects.select_related("distributor").get(id=branch_id)
+        except Branch.DoesNotExist:
+            return Response({"error": "Branch not found"}, status=status.HTTP_404_NOT_FOUND)
 
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        serializer = OrderBatchSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-class GetStockHistoryAPIView(generics.ListAPIView):
-    permission_classes = [permissions.IsAuthenticated]
+        try:
+            orders = place_order_batch(branch, request.user, serializer.validated_data["items"])
+        except StockNotFound as e:
+            return Response({"error": str(e)}, status=status.HTTP_404_NOT_FOUND)
+        except InsufficientStock as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(
+            {"message": "Orders created successfully", "data": OrderSerializer(orders, many=True).data},
+            status=status.HTTP_201_CREATED,
+        )
+
+class GetStockHistoryAPIView(DistributorListAPIView):
     serializer_class = StockHistorySerializer
+    cursor_ordering = ("-timestamp", "-id")
 
-    def get_queryset(self):
-        stock_id = self.kwargs.get("stock_id")
-        return StockHistory.objects.filter(stock__id=stock_id)
+    def get_distributor_queryset(self, user):
+        return StockHistory.objects.filter(
+            stock_id=self.kwargs.get("stock_id"), stock__branch__distributor__user=user
+        )
@@ -0,0 +1,222 @@
+"""
+Low-stock alert pipeline.
+
+Stock changes are checked by `evaluate_stock_level`, and only a threshold
+crossing enqueues a LowStockAlert row, once its transaction commits.
+Everything slow (the StockNotification insert, the WebSocket push and the
+email) happens here, in a background worker: either the in-process thread
+started by `wake_worker()` or `manage.py run_alert_worker`. Workers claim
+rows before delivering them, so any number can drain the queue safely.
+"""
+import logging
+import os
+import threading
+import uuid
+from datetime import timedelta
+from functools import partial
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from distributor.models import Stock
+from .groups import publish_stock_event
+from .models import AlertStatus, LowStockAlert, StockNotification
+
+logger = logging.getLogger(__name__)
+
+# A worker that dies mid-batch leaves rows in "processing"; reclaim them after this long.
+CLAIM_TIMEOUT = timedelta(minutes=5)
+
+
+def evaluate_stock_level(stock, previous_quantity):
+    """
+    Edge-triggered low-stock check with hysteresis.
+
+    Fires once when the quantity drops to the threshold while the stock is
+    armed, then disarms it until the quantity is restocked to the re-arm
+    level. Flipping the flag is a conditional UPDATE, so concurrent sales
+    crossing the threshold together still produce a single alert. Returns
+    True if an alert was queued.
+    """
+    if previous_quantity == stock.quantity:
+        return False
+
+    threshold = stock.get_low_stock_threshold()
+    if stock.quantity <= threshold:
+        if not stock.low_stock_armed:
+            return False
+        disarmed = Stock.objects.filter(pk=stock.pk, low_stock_armed=True).update(low_stock_armed=False)
+        stock.low_stock_armed = False
+        if disarmed:
+            transaction.on_commit(partial(enqueue_low_stock_alert, stock.pk))
+        return bool(disarmed)
+
+    rising = previous_quantity is None or stock.quantity > previous_quantity
+    if rising and not stock.low_stock_armed and stock.quantity >= stock.get_low_stock_rearm_level(threshold):
+        Stock.objects.filter(pk=stock.pk, low_stock_armed=False).update(low_stock_armed=True)
+        stock.low_stock_armed = True
+    return False
+
+
+def enqueue_low_stock_alert(stock_id):
+    """Queue an alert for `stock_id` unless one is already waiting. One INSERT, no reads."""
+    LowStockAlert.objects.bulk_create([LowStockAlert(stock_id=stock_id)], ignore_conflicts=True)
+    wake_worker()
+
+
+def claimable(now):
+    return Q(status__in=[AlertStatus.PENDING, AlertStatus.RETRY]) | Q(
+        status=AlertStatus.PROCESSING, claimed_at__lt=now - CLAIM_TIMEOUT
+    )
+
+
+def claim_alerts(worker_id, batch_size):
+    now = timezone.now()
+    candidates = list(
+        LowStockAlert.objects.filter(claimable(now))
+        .order_by("created_at")
+        .values_list("id", flat=True)[:batch_size]
+    )
+    if not candidates:
+        return []
+
+    # Compare-and-swap claim: a row another worker got to first is not matched.
+    LowStockAlert.objects.filter(claimable(now), id__in=candidates).update(
+        status=AlertStatus.PROCESSING, claimed_by=worker_id, claimed_at=now
+    )
+
+    return list(
+        LowStockAlert.objects.filter(status=AlertStatus.PROCESSING, claimed_by=worker_id)
+        .select_related("stock__branch__distributor__user", "stock__product")
+    )
+
+
+def alert_message(stock):
+    return f"⚠️ Low stock alert! {stock.product.name} has only {stock.quantity} items left."
+
+
+def build_email(stock, distributor):
+    body = f"Dear {distributor.username},\n\n" \
+           f"Your stock for {stock.product.name} is running low ({stock.quantity} left). " \
+           f"Please restock to avoid running out.\n\n" \
+           f"Best regards,\nCyriox Team"
+    return EmailMessage("Low Stock Alert 🚨", body, "noreply@cyriox.com", [distributor.email])
+
+
+def deliver(alerts):
+    """Send a claimed batch. Returns the alerts whose delivery raised."""
+    mail_connection = get_connection()
+    failed = []
+
+    # In-app notifications are written once per alert, keyed on it: a retry, or
+    # a batch reclaimed from a worker that died before saving its outcome, only
+    # redoes the push and email.
+    StockNotification.objects.bulk_create([
+        StockNotification(
+            distributor=alert.stock.branch.distributor.user,
+            stock=alert.stock,
+            message=alert_message(alert.stock),
+            alert=alert,
+        )
+        for alert in alerts
+    ], ignore_conflicts=True)
+
+    for alert in alerts:
+        stock = alert.stock
+        try:
+            publish_stock_event(stock, alert_message(stock))
+            mail_connection.send_messages([build_email(stock, stock.branch.distributor.user)])
+        except Exception as e:
+            logger.warning(f"Low stock alert {alert.id} failed: {e}")
+            alert.last_error = str(e)
+            failed.append(alert)
+
+    mail_connection.close()
+    return failed
+
+
+def process_pending_alerts(worker_id=None, batch_size=None):
+    """Claim and deliver one batch. Returns the number of alerts handled."""
+    worker_id = worker_id or f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+    batch_size = batch_size or settings.LOW_STOCK_ALERT_BATCH_SIZE
+    alerts = claim_alerts(worker_id, batch_size)
+    if not alerts:
+        return 0
+
+    now = timezone.now()
+    recently_sent = set(
+        LowStockAlert.objects.filter(
+            stock_id__in=[alert.stock_id for alert in alerts],
+            status=AlertStatus.SENT,
+            sent_at__gte=now - settings.LOW_STOCK_ALERT_COOLDOWN,
+        ).values_list("stock_id", flat=True)
+    )
+
+    to_send = []
+    for alert in alerts:
+        if alert.stock_id in recently_sent:
+            alert.status = AlertStatus.SUPPRESSED
+        else:
+            to_send.append(alert)
+            recently_sent.add(alert.stock_id)
+
+    failed = deliver(to_send) if to_send else []
+    for alert in to_send:
+        if alert in failed:
+            alert.attempts += 1
+            alert.status = (
+                AlertStatus.FAILED if alert.attempts >= settings.LOW_STOCK_ALERT_MAX_ATTEMPTS
+                else AlertStatus.RETRY
+            )
+        else:
+            alert.status = AlertStatus.SENT
+            alert.sent_at = now
+
+    for alert in alerts:
+        alert.claimed_by = ""
+        alert.claimed_at = None
+
+    LowStockAlert.objects.bulk_update(
+        alerts, ["status", "attempts", "last_error", "claimed_by", "claimed_at", "sent_at"]
+    )
+    return len(alerts)
+
+
+class AlertWorker(threading.Thread):
+    """In-process worker thread that drains the alert queue whenever it is woken."""
+
+    def __init__(self, poll_interval):
+        super().__init__(name="low-stock-alerts", daemon=True)
+        self.poll_interval = poll_interval
+        self.wakeup = threading.Event()
+
+    def run(self):
+        while True:
+            self.wakeup.wait(self.poll_interval)
+            self.wakeup.clear()
+            try:
+                while process_pending_alerts():
+                    pass
+            except Exception:
+                logger.exception("Low stock alert worker failed")
+            finally:
+                connection.close()
+
+
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def wake_worker():
+    """Start the in-process worker on first use and nudge it to drain the queue."""
+    global _worker
+    if not settings.LOW_STOCK_ALERT_INLINE_WORKER:
+        return
+    with _worker_lock:
+        if _worker is None:
+            _worker = AlertWorker(settings.LOW_STOCK_ALERT_POLL_INTERVAL)
+            _worker.start()
+    _worker.wakeup.set()
@@ -1,24 +1,238 @@
+import asyncio
 import json
+import uuid
+from collections import deque
+
+from channels.db import database_sync_to_async
 from channels.generic.websocket import AsyncWebsocketConsumer
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from distributor.models import Branch, Distributor, Stock
+from .groups import branch_group, distributor_group, stock_group
+from .models import DeletedStock
+from .stream import stock_delta, tombstone_delta
+
+MAX_SUBSCRIPTIONS = 100
+
+
+def clean_ids(values, cast):
+    """Cast client-supplied ids, silently dropping malformed ones."""
+    cleaned = []
+    for value in values[:MAX_SUBSCRIPTIONS]:
+        try:
+            cleaned.append(cast(value))
+        except (TypeError, ValueError, AttributeError):
+            pass
+    return cleaned
+
 
 class StockConsumer(AsyncWebsocketConsumer):
+    """
+    Stock stream for one authenticated user.
+
+    On connect the socket joins its distributor's group. Sending
+    {"action": "subscribe", "branches": [...], "stocks": [...]} narrows it to
+    those branches and SKUs (only ones the user owns or manages are
+    accepted); {"action": "unsubscribe", ...} drops them again.
+
+    Stock changes arrive as deltas and are held for STOCK_STREAM_COALESCE_MS,
+    keeping only the newest version of each SKU, then written as one
+    {"type": "stock_batch", "cursor": ..., "deltas": [...]} frame. After a
+    reconnect, {"action": "resume", "cursor": <last cursor seen>} replays
+    the current state of every watched SKU changed since then, including
+    deletions (from their DeletedStock tombstones). A cursor older than
+    STOCK_STREAM_TOMBSTONE_RETENTION could miss deletions, so it gets an
+    empty frame with "refetch": true instead and the client reloads its
+    stock over the REST API.
+    """
+
     async def connect(self):
-        self.group_name = "stock_updates"
-        await self.channel_layer.group_add(self.group_name, self.channel_name)
+        user = self.scope.get("user")
+        if user is None or not user.is_authenticated:
+            await self.close(code=4401)
+            return
+
+        self.user = user
+        self.joined = set()
+        self.branches = set()
+        self.stocks = set()
+        self.recent_events = deque(maxlen=256)
+        self.pending = {}
+        self.versions = {}
+        self.flush_task = None
+        self.distributor_id = await self.get_distributor_id()
+
         await self.accept()
+        if self.distributor_id is not None:
+            await self.join(distributor_group(self.distributor_id))
 
     async def disconnect(self, close_code):
-        await self.channel_layer.group_discard(self.group_name, self.channel_name)
+        if getattr(self, "flush_task", None):
+            self.flush_task.cancel()
+        for group in getattr(self, "joined", ()):
+            await self.channel_layer.group_discard(group, self.channel_name)
 
     async def receive(self, text_data):
-        data = json.loads(text_data)
-        await self.channel_layer.group_send(
-            self.group_name,
-            {
-                "type": "stock_update",
-                "message": data["message"],
-            },
+        try:
+            data = json.loads(text_data)
+        except ValueError:
+            await self.send_error("Invalid JSON")
+            return
+
+        action = data.get("action")
+        if action == "resume":
+            await self.resume(data.get("cursor"))
+            return
+        if action not in ("subscribe", "unsubscribe"):
+            await self.send_error("Unknown action")
+            return
+
+        branches, stocks = await self.authorized_targets(
+            clean_ids(data.get("branches") or [], lambda value: uuid.UUID(str(value))),
+            clean_ids(data.get("stocks") or [], int),
         )
+        groups = [branch_group(b) for b in branches] + [stock_group(s) for s in stocks]
+
+        if action == "subscribe":
+            # A narrower subscription replaces the distributor-wide default
+            if groups and self.distributor_id is not None:
+                await self.leave(distributor_group(self.distributor_id))
+            for group in groups:
+                await self.join(group)
+            self.branches.update(branches)
+            self.stocks.update(stocks)
+        else:
+            for group in groups:
+                await self.leave(group)
+            self.branches.difference_update(branches)
+            self.stocks.difference_update(stocks)
+            if not self.joined and self.distributor_id is not None:
+                await self.join(distributor_group(self.distributor_id))
+
+        await self.send(text_data=json.dumps({
+            "type": f"{action}d",
+            "branches": branches,
+            "stocks": stocks,
+        }))
 
     async def stock_update(self, event):
-        await self.send(text_data=json.dumps({"message": event["message"]}))
+        if event["event_id"] in self.recent_events:
+            return
+        self.recent_events.append(event["event_id"])
+        await self.send(text_data=json.dumps({
+            "type": "alert",
+            "message": event["message"],
+            "stock_id": event["stock_id"],
+            "branch_id": event["branch_id"],
+        }))
+
+    async def stock_delta(self, event):
+        self.queue(event["deltas"])
+        if self.pending and self.flush_task is None:
+            self.flush_task = asyncio.create_task(self.flush_later())
+
+    def queue(self, deltas):
+        # Versions only go up, so anything not newer than what the client
+        # already has (or is about to get) is a duplicate from an
+        # overlapping group or a stale replay.
+        for delta in deltas:
+            stock_id = delta["stock"]
+            newest = self.pending.get(stock_id, {}).get("version", self.versions.get(stock_id, 0))
+            if delta["version"] > newest:
+                self.pending[stock_id] = delta
+
+    async def flush_later(self):
+        await asyncio.sleep(settings.STOCK_STREAM_COALESCE_MS / 1000)
+        self.flush_task = None
+        await self.flush()
+
+    async def flush(self, **extra):
+        deltas = list(self.pending.values())
+        self.pending = {}
+        for delta in deltas:
+            self.versions[delta["stock"]] = delta["version"]
+        if not deltas and not extra:
+            return
+        cursors = [delta["updated_at"] for delta in deltas if delta["updated_at"]]
+        await self.send(text_data=json.dumps({
+            "type": "stock_batch",
+            "cursor": max(cursors) if cursors else None,
+            "deltas": deltas,
+            **extra,
+        }))
+
+    async def resume(self, cursor):
+        since = parse_datetime(cursor) if isinstance(cursor, str) else None
+        if since is None:
+            await self.send_error("Invalid cursor")
+            return
+        if timezone.is_naive(since):
+            since = timezone.make_aware(since)
+
+        if since < timezone.now() - settings.STOCK_STREAM_TOMBSTONE_RETENTION:
+            await self.flush(refetch=True)
+            return
+
+        deltas = await self.changed_since(since)
+        self.queue(deltas)
+        await self.flush(more=len(deltas) >= settings.STOCK_STREAM_RESUME_LIMIT)
+
+    async def join(self, group):
+        if group not in self.joined:
+            await self.channel_layer.group_add(group, self.channel_name)
+            self.joined.add(group)
+
+    async def leave(self, group):
+        if group in self.joined:
+            await self.channel_layer.group_discard(group, self.channel_name)
+            self.joined.discard(group)
+
+    async def send_error(self, message):
+        await self.send(text_data=json.dumps({"type": "error", "message": message}))
+
+    @database_sync_to_async
+    def get_distributor_id(self):
+        return Distributor.objects.filter(user=self.user).values_list("id", flat=True).first()
+
+    @database_sync_to_async
+    def changed_since(self, since):
+        """Deltas for every watched SKU changed or deleted at or after `since`, oldest first."""
+        limit = settings.STOCK_STREAM_RESUME_LIMIT
+        scope = Q(branch_id__in=self.branches) | Q(id__in=self.stocks)
+        deleted_scope = Q(branch_id__in=self.branches) | Q(stock_id__in=self.stocks)
+        if self.distributor_id is not None and distributor_group(self.distributor_id) in self.joined:
+            scope |= Q(branch__distributor_id=self.distributor_id)
+            deleted_scope |= Q(distributor_id=self.distributor_id)
+        # Inclusive: rows touched by one statement share a timestamp, and the
+        # client drops whatever it already has by version.
+        stocks = (
+            Stock.objects.filter(scope, last_updated__gte=since)
+            .only("id", "branch_id", "quantity", "version", "last_updated")
+            .order_by("last_updated", "id")[:limit]
+        )
+        tombstones = (
+            DeletedStock.objects.filter(deleted_scope, deleted_at__gte=since)
+            .order_by("deleted_at", "id")[:limit]
+        )
+        deltas = [stock_delta(stock) for stock in stocks] + [tombstone_delta(t) for t in tombstones]
+        return sorted(deltas, key=lambda delta: delta["updated_at"])[:limit]
+
+    @database_sync_to_async
+    def authorized_targets(self, branch_ids, stock_ids):
+        """Keep only the branches and SKUs this user owns or manages."""
+        visible_branches = Branch.objects.filter(manager=self.user)
+        if self.distributor_id is not None:
+            visible_branches = visible_branches | Branch.objects.filter(distributor_id=self.distributor_id)
+
+        branches = []
+        if branch_ids:
+            branches = [str(b) for b in visible_branches.filter(id__in=branch_ids).values_list("id", flat=True)]
+        stocks = []
+        if stock_ids:
+            stocks = list(
+                Stock.objects.filter(id__in=stock_ids, branch__in=visible_branches).values_list("id", flat=True)
+            )
+        return branches, stocks
@@ -0,0 +1,49 @@
+"""
+Channel-layer groups for the stock stream.
+
+Every socket sits either in its distributor's group (the default on connect)
+or in the branch / SKU groups it subscribed to. A stock change is published
+to exactly the distributor, branch and SKU groups it belongs to, so the
+number of frames per update depends on who is watching that stock, not on
+how many tenants are connected.
+"""
+import uuid
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+
+
+def distributor_group(distributor_id):
+    return f"stock.distributor.{distributor_id}"
+
+
+def branch_group(branch_id):
+    return f"stock.branch.{branch_id}"
+
+
+def stock_group(stock_id):
+    return f"stock.item.{stock_id}"
+
+
+def stock_groups(distributor_id, branch_id, stock_id):
+    return [distributor_group(distributor_id), branch_group(branch_id), stock_group(stock_id)]
+
+
+def publish_stock_event(stock, message):
+    """Send a stock_update event for `stock` to the groups watching it."""
+    event = {
+        "type": "stock_update",
+        # A socket watching both a branch and one of its SKUs gets two copies;
+        # the consumer drops the second by id.
+        "event_id": uuid.uuid4().hex,
+        "stock_id": stock.pk,
+        "branch_id": str(stock.branch_id),
+        "message": message,
+    }
+    groups = stock_groups(stock.branch.distributor_id, stock.branch_id, stock.pk)
+    async_to_sync(group_send_many)(get_channel_layer(), groups, event)
+
+
+async def group_send_many(channel_layer, groups, event):
+    for group in groups:
+        await channel_layer.group_send(group, event)
@@ -0,0 +1,176 @@
+import asyncio
+import copy
+import multiprocessing
+import statistics
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.module_loading import import_string
+
+REDIS_BACKEND = "channels_redis.core.RedisChannelLayer"
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def stock_deltas(count):
+    """A stock_delta payload shaped like the ones notification.stream publishes."""
+    branch = str(uuid.uuid4())
+    return [
+        {"stock": i, "branch": branch, "quantity": 100 - i, "version": 1, "updated_at": "2024-01-01T00:00:00+00:00"}
+        for i in range(count)
+    ]
+
+
+def receive_worker(backend, config, groups, expected, ready, results, timeout):
+    """One "ASGI worker": a process holding a channel per socket. Runs in a child process."""
+    asyncio.run(receive(backend, config, groups, expected, ready, results, timeout))
+
+
+async def receive(backend, config, groups, expected, ready, results, timeout):
+    layer = import_string(backend)(**config)
+    channels = []
+    for group in groups:
+        channel = await layer.new_channel()
+        await layer.group_add(group, channel)
+        channels.append(channel)
+    ready.put(True)
+
+    latencies = []
+    last_received = 0.0
+
+    async def drain(channel, count):
+        nonlocal last_received
+        for _ in range(count):
+            message = await layer.receive(channel)
+            last_received = time.time()
+            latencies.append(last_received - message["sent_at"])
+
+    try:
+        await asyncio.wait_for(asyncio.gather(*(drain(c, n) for c, n in zip(channels, expected))), timeout)
+    except asyncio.TimeoutError:
+        pass
+
+    await layer.flush()
+    results.put((latencies, last_received))
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure group_send latency and fan-out throughput of the Redis channel layer "
+        "with sockets spread over several worker processes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--redis-url", default=settings.REDIS_URL, help="Defaults to settings.REDIS_URL.")
+        parser.add_argument("--fake", action="store_true", help="Start a local fakeredis server instead of using --redis-url.")
+        parser.add_argument("--workers", type=int, default=4, help="Receiving processes.")
+        parser.add_argument("--sockets-per-worker", type=int, default=50)
+        parser.add_argument("--groups", type=int, default=10, help="Groups the sockets are spread over.")
+        parser.add_argument("--messages", type=int, default=500, help="group_send calls to make.")
+        parser.add_argument("--deltas", type=int, default=10, help="Stock deltas per message.")
+        parser.add_argument("--timeout", type=float, default=60.0)
+
+    def handle(self, *args, **options):
+        url = options["redis_url"]
+        if options["fake"]:
+            url = self.start_fake_server()
+        if not url:
+            raise CommandError("Cross-process fan-out needs Redis: set REDIS_URL, pass --redis-url or use --fake.")
+
+        config = self.layer_config(url, options["messages"])
+        workers, per_worker, group_count = options["workers"], options["sockets_per_worker"], options["groups"]
+
+        # Socket n joins group n % groups; message k goes to group k % groups.
+        sends_per_group = [len(range(g, options["messages"], group_count)) for g in range(group_count)]
+        assignments = []
+        for worker in range(workers):
+            sockets = range(worker * per_worker, (worker + 1) * per_worker)
+            assignments.append((
+                [f"bench.{n % group_count}" for n in sockets],
+                [sends_per_group[n % group_count] for n in sockets],
+            ))
+        expected_frames = sum(sum(counts) for _, counts in assignments)
+
+        ctx = multiprocessing.get_context("spawn")
+        ready, results = ctx.Queue(), ctx.Queue()
+        processes = [
+            ctx.Process(
+                target=receive_worker,
+                args=(REDIS_BACKEND, config, groups, counts, ready, results, options["timeout"]),
+            )
+            for groups, counts in assignments
+        ]
+        for process in processes:
+            process.start()
+        for _ in processes:
+            ready.get(timeout=options["timeout"])
+
+        published_at = time.time()
+        send_times, elapsed = asyncio.run(self.publish(config, options["messages"], group_count, options["deltas"]))
+
+        latencies, finished_at = [], published_at
+        for _ in processes:
+            worker_latencies, last_received = results.get(timeout=options["timeout"] + 10)
+            latencies.extend(worker_latencies)
+            finished_at = max(finished_at, last_received)
+        for process in processes:
+            process.join()
+        fan_out_time = max(finished_at - published_at, 1e-6)
+
+        self.stdout.write(f"layer:            {REDIS_BACKEND} ({'fakeredis' if options['fake'] else url})")
+        self.stdout.write(f"sockets:          {workers * per_worker} over {workers} processes, {group_count} groups")
+        self.stdout.write(f"group_send:       {options['messages']} in {elapsed:.2f}s "
+                          f"({options['messages'] / elapsed:.0f}/s), "
+                          f"p50 {percentile(send_times, 50) * 1000:.2f}ms, p99 {percentile(send_times, 99) * 1000:.2f}ms")
+        self.stdout.write(f"delivered:        {len(latencies)}/{expected_frames} frames "
+                          f"in {fan_out_time:.2f}s ({len(latencies) / fan_out_time:.0f}/s)")
+        if latencies:
+            self.stdout.write(f"delivery latency: p50 {percentile(latencies, 50) * 1000:.2f}ms, "
+                              f"p99 {percentile(latencies, 99) * 1000:.2f}ms, "
+                              f"mean {statistics.mean(latencies) * 1000:.2f}ms")
+        if len(latencies) < expected_frames:
+            self.stderr.write(self.style.WARNING("Some frames were not delivered before the timeout."))
+
+    def layer_config(self, url, messages):
+        """The configured Redis layer settings, pointed at `url` under a throwaway prefix."""
+        layer = settings.CHANNEL_LAYERS["default"]
+        config = copy.deepcopy(layer.get("CONFIG", {})) if layer["BACKEND"] == REDIS_BACKEND else {}
+        hosts = config.get("hosts") or [{}]
+        host = hosts[0] if isinstance(hosts[0], dict) else {}
+        config["hosts"] = [{**host, "address": url}]
+        config["prefix"] = f"bench-{uuid.uuid4().hex[:8]}"
+        config["capacity"] = max(config.get("capacity", 100), messages)
+        return config
+
+    async def publish(self, config, messages, group_count, deltas):
+        layer = import_string(REDIS_BACKEND)(**config)
+        payload = stock_deltas(deltas)
+        send_times = []
+        started = time.perf_counter()
+        for k in range(messages):
+            sent = time.perf_counter()
+            await layer.group_send(
+                f"bench.{k % group_count}",
+                {"type": "stock_delta", "deltas": payload, "sent_at": time.time()},
+            )
+            send_times.append(time.perf_counter() - sent)
+        elapsed = time.perf_counter() - started
+        await layer.close_pools()
+        return send_times, elapsed
+
+    def start_fake_server(self):
+        try:
+            from fakeredis import TcpFakeServer
+        except ImportError:
+            raise CommandError("--fake needs fakeredis with Lua support: pip install 'fakeredis[lua]'")
+        server = TcpFakeServer(("127.0.0.1", 0), server_type="redis")
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return f"redis://127.0.0.1:{server.server_address[1]}/0"
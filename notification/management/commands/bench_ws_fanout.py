@@ -0,0 +1,54 @@
+import asyncio
+
+from channels.layers import InMemoryChannelLayer
+from django.core.management.base import BaseCommand
+
+from notification.groups import branch_group, distributor_group, group_send_many, stock_group, stock_groups
+
+
+class CountingChannelLayer(InMemoryChannelLayer):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.sent = 0
+
+    async def send(self, channel, message):
+        self.sent += 1
+        await super().send(channel, message)
+
+
+class Command(BaseCommand):
+    help = "Count WebSocket frames produced by one stock update as the number of connected tenants grows."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--tenants", type=int, nargs="+", default=[1, 10, 100, 500])
+        parser.add_argument("--clients-per-tenant", type=int, default=20)
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'tenants':>8} {'sockets':>8} {'targeted':>9} {'global':>8}")
+        for tenants in options["tenants"]:
+            targeted, sockets = asyncio.run(self.measure(tenants, options["clients_per_tenant"], targeted=True))
+            broadcast, _ = asyncio.run(self.measure(tenants, options["clients_per_tenant"], targeted=False))
+            self.stdout.write(f"{tenants:>8} {sockets:>8} {targeted:>9} {broadcast:>8}")
+        self.stdout.write("targeted = frames per update with per-tenant groups; global = the old single group")
+
+    async def measure(self, tenants, clients_per_tenant, targeted):
+        layer = CountingChannelLayer(capacity=clients_per_tenant * tenants + 10)
+        sockets = 0
+        for tenant in range(tenants):
+            # Half the tenant's sockets watch everything, a quarter a branch, a quarter one SKU.
+            for client in range(clients_per_tenant):
+                channel = await layer.new_channel()
+                sockets += 1
+                if not targeted:
+                    await layer.group_add("stock_updates", channel)
+                elif client % 4 in (0, 1):
+                    await layer.group_add(distributor_group(tenant), channel)
+                elif client % 4 == 2:
+                    await layer.group_add(branch_group(f"{tenant}-0"), channel)
+                else:
+                    await layer.group_add(stock_group(tenant * 1000), channel)
+
+        event = {"type": "stock_update", "message": "bench"}
+        groups = stock_groups(0, "0-0", 0) if targeted else ["stock_updates"]
+        await group_send_many(layer, groups, event)
+        return layer.sent, sockets
@@ -0,0 +1,25 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from notification.alerts import process_pending_alerts
+
+
+class Command(BaseCommand):
+    help = "Deliver queued low-stock alerts (in-app notification, WebSocket push and email)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Drain the queue once and exit.")
+        parser.add_argument("--batch-size", type=int, default=settings.LOW_STOCK_ALERT_BATCH_SIZE)
+        parser.add_argument("--interval", type=float, default=2.0, help="Seconds to sleep when the queue is empty.")
+
+    def handle(self, *args, **options):
+        while True:
+            handled = process_pending_alerts(batch_size=options["batch_size"])
+            if handled:
+                self.stdout.write(f"Processed {handled} alerts")
+                continue
+            if options["once"]:
+                return
+            time.sleep(options["interval"])
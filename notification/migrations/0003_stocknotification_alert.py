@@ -0,0 +1,19 @@
+# Generated by Django 5.1.3 on 2026-10-18 14:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notification', '0002_lowstockalert'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stocknotification',
+            name='alert',
+            field=models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='notification', to='notification.lowstockalert'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.1.3 on 2026-10-18 15:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notification', '0003_stocknotification_alert'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeletedStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('stock_id', models.BigIntegerField()),
+                ('branch_id', models.UUIDField()),
+                ('distributor_id', models.BigIntegerField()),
+                ('version', models.PositiveIntegerField()),
+                ('deleted_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['distributor_id', 'deleted_at'], name='notificatio_distrib_a67e34_idx'), models.Index(fields=['branch_id', 'deleted_at'], name='notificatio_branch__1bd15b_idx')],
+            },
+        ),
+    ]
@@ -8,6 +8,72 @@ class StockNotification(models.Model):
     message = models.TextField()
     is_read = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
+    # The queued alert this was written for; unique, so a redelivered alert can't write it twice
+    alert = models.OneToOneField(
+        "LowStockAlert", on_delete=models.SET_NULL, null=True, blank=True, related_name="notification"
+    )
 
     def __str__(self):
-        return f"Low stock: {self.stock.product_name} ({self.stock.quantity} left)"
+        return f"Low stock: {self.stock.product.name} ({self.stock.quantity} left)"
+
+
+class AlertStatus(models.TextChoices):
+    PENDING = "pending", "Pending"
+    PROCESSING = "processing", "Processing"
+    RETRY = "retry", "Retry"
+    SENT = "sent", "Sent"
+    SUPPRESSED = "suppressed", "Suppressed"
+    FAILED = "failed", "Failed"
+
+
+class LowStockAlert(models.Model):
+    """Queued low-stock alert, delivered off the request path by notification.alerts"""
+    stock = models.ForeignKey(Stock, on_delete=models.CASCADE, related_name="low_stock_alerts")
+    status = models.CharField(max_length=20, choices=AlertStatus.choices, default=AlertStatus.PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    claimed_by = models.CharField(max_length=64, blank=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            # At most one queued alert per stock; repeat sales on a low SKU collapse into it
+            models.UniqueConstraint(
+                fields=["stock"],
+                condition=models.Q(status="pending"),
+                name="unique_pending_low_stock_alert",
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["status", "created_at"]),
+            models.Index(fields=["stock", "status", "sent_at"]),
+        ]
+
+    def __str__(self):
+        return f"Low stock alert for stock {self.stock_id} ({self.status})"
+
+
+class DeletedStock(models.Model):
+    """
+    Tombstone for a deleted SKU, so a resuming stream client learns it is gone.
+
+    Plain ids rather than foreign keys: the rows they point at no longer
+    exist, and a branch delete must not take its stocks' tombstones with it.
+    Kept for STOCK_STREAM_TOMBSTONE_RETENTION.
+    """
+    stock_id = models.BigIntegerField()
+    branch_id = models.UUIDField()
+    distributor_id = models.BigIntegerField()
+    version = models.PositiveIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["distributor_id", "deleted_at"]),
+            models.Index(fields=["branch_id", "deleted_at"]),
+        ]
+
+    def __str__(self):
+        return f"Deleted stock {self.stock_id}"
@@ -1,44 +1,34 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
-from django.conf import settings
-from django.core.mail import send_mail
-from channels.layers import get_channel_layer
-from asgiref.sync import async_to_sync
 
 from distributor.models import Stock
-from .models import StockNotification
+from distributor.signals import stock_level_changed
+from .alerts import evaluate_stock_level
+from .stream import queue_stock_delta, record_stock_deletion
 
 @receiver(post_save, sender=Stock)
-def check_low_stock(sender, instance, **kwargs):
-    if instance.quantity <= settings.LOW_STOCK_THRESHOLD:
-        # Save notification in the database
-        StockNotification.objects.create(
-            distributor=instance.branch.distributor,
-            stock=instance,
-            message=f"⚠️ Low stock alert! {instance.product_name} has only {instance.quantity} items left."
-        )
-
-        # Send WebSocket alert
-        channel_layer = get_channel_layer()
-        async_to_sync(channel_layer.group_send)(
-            "stock_updates",
-            {
-                "type": "stock_update",
-                "message": f"⚠️ Low stock alert! {instance.product_name} has only {instance.quantity} items left.",
-            },
-        )
-
-        # Send Email Alert
-        subject = "Low Stock Alert 🚨"
-        message = f"Dear {instance.branch.distributor.username},\n\n" \
-                  f"Your stock for {instance.product_name} is running low ({instance.quantity} left). " \
-                  f"Please restock to avoid running out.\n\n" \
-                  f"Best regards,\nCyriox Team"
-
-        send_mail(
-            subject,
-            message,
-            "noreply@cyriox.com",
-            [instance.branch.distributor.email],
-            fail_silently=False,
-        )
+def check_low_stock(sender, instance, created, **kwargs):
+    previous_quantity = None if created else getattr(instance, "_loaded_quantity", None)
+    evaluate_stock_level(instance, previous_quantity)
+    instance._loaded_quantity = instance.quantity
+
+
+@receiver(stock_level_changed, sender=Stock)
+def check_low_stock_after_reservation(sender, stock, previous_quantity, **kwargs):
+    evaluate_stock_level(stock, previous_quantity)
+
+
+@receiver(post_save, sender=Stock)
+def stream_stock_change(sender, instance, **kwargs):
+    queue_stock_delta(instance)
+
+
+@receiver(stock_level_changed, sender=Stock)
+def stream_stock_reservation(sender, stock, **kwargs):
+    queue_stock_delta(stock)
+
+
+@receiver(post_delete, sender=Stock)
+def stream_stock_delete(sender, instance, **kwargs):
+    record_stock_deletion(instance)
+    queue_stock_delta(instance, deleted=True)
@@ -0,0 +1,133 @@
+"""
+Structured stock deltas for the WebSocket stream.
+
+Every quantity change becomes a delta ({stock, branch, quantity, version,
+updated_at}). Deltas raised inside one transaction are collected per SKU and
+published once, on commit, as a single `stock_delta` event per group, so a
+bulk restock or a batch order costs one channel-layer message per group
+rather than one per row. The consumer coalesces again on its side before
+writing a frame.
+
+Deleting a SKU also leaves a DeletedStock tombstone, which is how a client
+resuming after a disconnect hears about deletions it missed.
+"""
+import logging
+import threading
+import weakref
+from functools import partial
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .groups import branch_group, distributor_group, stock_group
+from .models import DeletedStock
+
+logger = logging.getLogger(__name__)
+
+
+def stock_delta(stock, deleted=False):
+    delta = {
+        "stock": stock.pk,
+        "branch": str(stock.branch_id),
+        "quantity": 0 if deleted else stock.quantity,
+        "version": stock.version + 1 if deleted else stock.version,
+        "updated_at": stock.last_updated.isoformat() if stock.last_updated else None,
+    }
+    if deleted:
+        delta["deleted"] = True
+    return delta
+
+
+def tombstone_delta(tombstone):
+    return {
+        "stock": tombstone.stock_id,
+        "branch": str(tombstone.branch_id),
+        "quantity": 0,
+        "version": tombstone.version,
+        "updated_at": tombstone.deleted_at.isoformat(),
+        "deleted": True,
+    }
+
+
+def record_stock_deletion(stock):
+    """Leave a tombstone for `stock` and prune those past the retention window."""
+    DeletedStock.objects.filter(deleted_at__lt=timezone.now() - settings.STOCK_STREAM_TOMBSTONE_RETENTION).delete()
+    DeletedStock.objects.create(
+        stock_id=stock.pk,
+        branch_id=stock.branch_id,
+        distributor_id=stock.branch.distributor_id,
+        version=stock.version + 1,
+    )
+
+
+class DeltaBatch:
+    """Deltas waiting for the current transaction to commit, latest per SKU."""
+
+    def __init__(self):
+        self.deltas = {}
+        self.distributors = {}
+        self.flushed = False
+
+    def add(self, stock, deleted=False):
+        self.deltas[stock.pk] = stock_delta(stock, deleted)
+        self.distributors[stock.pk] = stock.branch.distributor_id
+
+    def flush(self):
+        # Every delta registers this; the first call after commit sends them all
+        if self.flushed:
+            return
+        self.flushed = True
+        try:
+            publish_stock_deltas(list(self.deltas.values()), self.distributors)
+        except Exception:
+            # The write is committed either way; a client that missed this resumes from its cursor
+            logger.exception("Publishing %d stock deltas failed", len(self.deltas))
+
+
+# The open batch of each thread's transaction, by connection alias. Only the
+# on_commit callbacks hold a batch strongly, so when the transaction rolls
+# back and Django drops them, the batch goes too and the next transaction
+# starts a new one.
+_open_batches = threading.local()
+
+
+def queue_stock_delta(stock, deleted=False):
+    """Publish a delta for `stock` once the surrounding transaction commits."""
+    connection = transaction.get_connection()
+    if not connection.in_atomic_block:
+        batch = DeltaBatch()
+        batch.add(stock, deleted)
+        batch.flush()
+        return
+
+    batches = _open_batches.__dict__.setdefault("by_alias", {})
+    ref = batches.get(connection.alias)
+    batch = ref() if ref else None
+    if batch is None or batch.flushed:
+        batch = DeltaBatch()
+        batches[connection.alias] = weakref.ref(batch)
+    batch.add(stock, deleted)
+    transaction.on_commit(partial(DeltaBatch.flush, batch))
+
+
+def publish_stock_deltas(deltas, distributors):
+    """Send each group watching these stocks one event carrying its deltas."""
+    if not deltas:
+        return
+    by_group = {}
+    for delta in deltas:
+        for group in (
+            distributor_group(distributors[delta["stock"]]),
+            branch_group(delta["branch"]),
+            stock_group(delta["stock"]),
+        ):
+            by_group.setdefault(group, []).append(delta)
+    async_to_sync(send_deltas)(get_channel_layer(), by_group)
+
+
+async def send_deltas(channel_layer, by_group):
+    for group, deltas in by_group.items():
+        await channel_layer.group_send(group, {"type": "stock_delta", "deltas": deltas})
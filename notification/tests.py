@@ -1,3 +1,357 @@
-from django.test import TestCase
+import asyncio
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from channels.testing import WebsocketCommunicator
+from django.conf import settings
+from django.core import mail
+from django.db import transaction
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APITransactionTestCase
+
+from distributor.fixtures import create_product, create_stock, create_tenant
+from distributor.models import Stock
+from .alerts import CLAIM_TIMEOUT, claim_alerts, deliver, enqueue_low_stock_alert, process_pending_alerts
+from .consumers import StockConsumer
+from .groups import branch_group, distributor_group, stock_group
+from .models import AlertStatus, DeletedStock, LowStockAlert, StockNotification
+from .stream import queue_stock_delta, send_deltas, stock_delta
+
+@override_settings(LOW_STOCK_ALERT_INLINE_WORKER=False)
+class StockFixtures(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.distributor, cls.branch = create_tenant("acme")
+        cls.user = cls.distributor.user
+        cls.product = create_product(cls.distributor, "Cola")
+        cls.stock = create_stock(cls.branch, cls.product)
+
+    def set_quantity(self, quantity):
+        stock = Stock.objects.get(pk=self.stock.pk)
+        stock.quantity = quantity
+        with self.captureOnCommitCallbacks(execute=True):
+            stock.save()
+        return stock
+
+
+class AlertQueueTests(StockFixtures):
+
+    def test_crossing_enqueues_one_pending_alert(self):
+        self.set_quantity(40)
+        self.assertEqual(list(LowStockAlert.objects.values_list("status", flat=True)), [AlertStatus.PENDING])
+        # Another alert for the same stock collapses into the waiting one
+        enqueue_low_stock_alert(self.stock.pk)
+        self.assertEqual(LowStockAlert.objects.count(), 1)
+
+    def test_claim_is_exclusive_until_it_times_out(self):
+        enqueue_low_stock_alert(self.stock.pk)
+        self.assertEqual(len(claim_alerts("worker-a", 10)), 1)
+        self.assertEqual(claim_alerts("worker-b", 10), [])
+        LowStockAlert.objects.update(claimed_at=timezone.now() - CLAIM_TIMEOUT - timedelta(seconds=1))
+        self.assertEqual([alert.claimed_by for alert in claim_alerts("worker-b", 10)], ["worker-b"])
+
+    def test_delivers_notification_and_email(self):
+        enqueue_low_stock_alert(self.stock.pk)
+        self.assertEqual(process_pending_alerts(), 1)
+        alert = LowStockAlert.objects.get()
+        self.assertEqual((alert.status, alert.claimed_by), (AlertStatus.SENT, ""))
+        self.assertEqual(StockNotification.objects.get().alert, alert)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, [self.user.email])
+        self.assertEqual(process_pending_alerts(), 0)
+
+    def test_cooldown_suppresses_a_repeat(self):
+        enqueue_low_stock_alert(self.stock.pk)
+        process_pending_alerts()
+        enqueue_low_stock_alert(self.stock.pk)
+        self.assertEqual(process_pending_alerts(), 1)
+        self.assertEqual(
+            sorted(LowStockAlert.objects.values_list("status", flat=True)), [AlertStatus.SENT, AlertStatus.SUPPRESSED]
+        )
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_reclaimed_alert_writes_its_notification_once(self):
+        enqueue_low_stock_alert(self.stock.pk)
+        # A worker delivers, then dies before saving the outcome
+        deliver(claim_alerts("worker-a", 10))
+        LowStockAlert.objects.update(claimed_at=timezone.now() - CLAIM_TIMEOUT - timedelta(seconds=1))
+        self.assertEqual(process_pending_alerts(), 1)
+        self.assertEqual(LowStockAlert.objects.get().status, AlertStatus.SENT)
+        self.assertEqual(StockNotification.objects.count(), 1)
+
+
+class LowStockHysteresisTests(StockFixtures):
+    """Threshold 50 and re-arm level 60 (the default margin of 10)."""
+
+    def alerts(self):
+        return LowStockAlert.objects.count()
+
+    def test_crossing_below_the_threshold_alerts_and_disarms(self):
+        self.set_quantity(60)
+        self.assertEqual(self.alerts(), 0)
+        stock = self.set_quantity(50)
+        self.assertEqual(self.alerts(), 1)
+        self.assertFalse(stock.low_stock_armed)
+        self.assertFalse(Stock.objects.get(pk=self.stock.pk).low_stock_armed)
+
+    def test_staying_below_does_not_alert_again(self):
+        self.set_quantity(40)
+        process_pending_alerts()
+        for quantity in (30, 45, 20, 55):
+            self.set_quantity(quantity)
+        self.assertEqual(self.alerts(), 1)
+        self.assertFalse(Stock.objects.get(pk=self.stock.pk).low_stock_armed)
+
+    def test_recovering_to_the_rearm_level_alerts_on_the_next_crossing(self):
+        self.set_quantity(40)
+        process_pending_alerts()
+        # Above the threshold but short of the re-arm level: still disarmed
+        self.set_quantity(59)
+        self.assertFalse(Stock.objects.get(pk=self.stock.pk).low_stock_armed)
+        self.set_quantity(60)
+        self.assertTrue(Stock.objects.get(pk=self.stock.pk).low_stock_armed)
+        self.set_quantity(45)
+        self.assertEqual(self.alerts(), 2)
+
+    def test_stock_override_of_the_rearm_level(self):
+        Stock.objects.filter(pk=self.stock.pk).update(low_stock_threshold=10, low_stock_rearm_level=30)
+        self.set_quantity(10)
+        process_pending_alerts()
+        self.set_quantity(29)
+        self.assertFalse(Stock.objects.get(pk=self.stock.pk).low_stock_armed)
+        self.set_quantity(30)
+        self.assertTrue(Stock.objects.get(pk=self.stock.pk).low_stock_armed)
+
+
+def tenant_with_stock(prefix):
+    distributor, branch = create_tenant(prefix)
+    return distributor, branch, [create_stock(branch, create_product(distributor, f"{prefix} {i}")) for i in range(2)]
+
+
+@override_settings(STOCK_STREAM_COALESCE_MS=20)
+class StockConsumerTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.distributor, cls.branch, cls.stocks = tenant_with_stock("acme")
+        cls.other, cls.other_branch, cls.other_stocks = tenant_with_stock("rival")
+
+    async def asyncTearDown(self):
+        await get_channel_layer().flush()
+
+    async def connect(self, distributor=None):
+        communicator = WebsocketCommunicator(StockConsumer.as_asgi(), "/ws/stock/")
+        communicator.scope["user"] = (distributor or self.distributor).user
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        return communicator
+
+    async def publish(self, stocks, group=None, **changes):
+        """Send deltas for `stocks` to `group` (by default their distributor's), as publish_stock_deltas does."""
+        deltas = [dict(stock_delta(stock), **changes) for stock in stocks]
+        group = group or distributor_group(stocks[0].branch.distributor_id)
+        await send_deltas(get_channel_layer(), {group: deltas})
+
+    def set_quantity(self, stock, quantity):
+        stock = Stock.objects.get(pk=stock.pk)
+        stock.quantity = quantity
+        stock.save()
+        return stock
+
+    async def test_subscribing_to_another_distributors_stock_is_refused(self):
+        communicator = await self.connect()
+        await communicator.send_json_to({
+            "action": "subscribe",
+            "branches": [str(self.other_branch.pk)],
+            "stocks": [stock.pk for stock in self.other_stocks],
+        })
+        self.assertEqual(
+            await communicator.receive_json_from(), {"type": "subscribed", "branches": [], "stocks": []}
+        )
+        await communicator.disconnect()
+
+    async def test_does_not_receive_another_distributors_deltas(self):
+        communicator = await self.connect()
+        for group in (
+            distributor_group(self.other.pk), branch_group(self.other_branch.pk), stock_group(self.other_stocks[0].pk)
+        ):
+            await self.publish(self.other_stocks, group)
+        self.assertTrue(await communicator.receive_nothing(timeout=0.1))
+
+        await self.publish(self.stocks[:1])
+        frame = await communicator.receive_json_from()
+        self.assertEqual([delta["stock"] for delta in frame["deltas"]], [self.stocks[0].pk])
+        await communicator.disconnect()
+
+    async def test_subscription_narrows_to_own_branch(self):
+        communicator = await self.connect()
+        await communicator.send_json_to({"action": "subscribe", "stocks": [self.stocks[0].pk]})
+        self.assertEqual((await communicator.receive_json_from())["stocks"], [self.stocks[0].pk])
+        # No longer in the distributor group, only the SKU's
+        await self.publish(self.stocks)
+        self.assertTrue(await communicator.receive_nothing(timeout=0.1))
+        await self.publish(self.stocks[:1], stock_group(self.stocks[0].pk))
+        self.assertEqual(len((await communicator.receive_json_from())["deltas"]), 1)
+        await communicator.disconnect()
+
+    async def test_deltas_within_the_window_coalesce_to_one_frame(self):
+        communicator = await self.connect()
+        first, second = self.stocks
+        for version in (first.version + 1, first.version + 2):
+            await self.publish([first], version=version, quantity=100 - version)
+        await self.publish([second], version=second.version + 1)
+        # Older than what is already pending: dropped
+        await self.publish([first], version=first.version + 1)
+
+        frame = await communicator.receive_json_from()
+        self.assertEqual(frame["type"], "stock_batch")
+        self.assertEqual(
+            {delta["stock"]: delta["version"] for delta in frame["deltas"]},
+            {first.pk: first.version + 2, second.pk: second.version + 1},
+        )
+        self.assertTrue(await communicator.receive_nothing(timeout=0.1))
+
+        # Versions the client already has are not sent again
+        await self.publish([first], version=first.version + 2)
+        self.assertTrue(await communicator.receive_nothing(timeout=0.1))
+        await communicator.disconnect()
+
+    async def test_resume_replays_changes_since_the_cursor(self):
+        communicator = await self.connect()
+        await self.publish(self.stocks[:1])
+        cursor = (await communicator.receive_json_from())["cursor"]
+        await communicator.disconnect()
+
+        # Missed while disconnected
+        changed = await database_sync_to_async(self.set_quantity)(self.stocks[1], 10)
+        await database_sync_to_async(self.set_quantity)(self.other_stocks[0], 10)
+
+        communicator = await self.connect()
+        await communicator.send_json_to({"action": "resume", "cursor": cursor})
+        frame = await communicator.receive_json_from()
+        self.assertEqual(frame["type"], "stock_batch")
+        self.assertFalse(frame["more"])
+        self.assertEqual(frame["cursor"], changed.last_updated.isoformat())
+        # The stock at the cursor itself is replayed too; the client drops it by version
+        self.assertEqual(
+            {delta["stock"]: (delta["quantity"], delta["version"]) for delta in frame["deltas"]},
+            {self.stocks[0].pk: (100, self.stocks[0].version), changed.pk: (10, changed.version)},
+        )
+        await communicator.disconnect()
+
+    async def test_resume_replays_deletions_since_the_cursor(self):
+        communicator = await self.connect()
+        await self.publish(self.stocks[:1])
+        cursor = (await communicator.receive_json_from())["cursor"]
+        await communicator.disconnect()
+
+        # Deleted while disconnected, here and at another distributor
+        deleted = self.stocks[1]
+        await database_sync_to_async(Stock.objects.filter(pk__in=[deleted.pk, self.other_stocks[0].pk]).delete)()
+
+        communicator = await self.connect()
+        await communicator.send_json_to({"action": "resume", "cursor": cursor})
+        frame = await communicator.receive_json_from()
+        tombstone = await DeletedStock.objects.aget(stock_id=deleted.pk)
+        self.assertEqual(frame["cursor"], tombstone.deleted_at.isoformat())
+        self.assertEqual(
+            {delta["stock"]: (delta["quantity"], delta.get("deleted", False)) for delta in frame["deltas"]},
+            {self.stocks[0].pk: (100, False), deleted.pk: (0, True)},
+        )
+        await communicator.disconnect()
+
+    async def test_resume_past_the_tombstone_retention_asks_for_a_refetch(self):
+        communicator = await self.connect()
+        cursor = (timezone.now() - settings.STOCK_STREAM_TOMBSTONE_RETENTION - timedelta(minutes=1)).isoformat()
+        await communicator.send_json_to({"action": "resume", "cursor": cursor})
+        self.assertEqual(
+            await communicator.receive_json_from(),
+            {"type": "stock_batch", "cursor": None, "deltas": [], "refetch": True},
+        )
+        await communicator.disconnect()
+
+    def test_deleting_stock_prunes_expired_tombstones(self):
+        Stock.objects.get(pk=self.stocks[0].pk).delete()
+        DeletedStock.objects.update(deleted_at=timezone.now() - settings.STOCK_STREAM_TOMBSTONE_RETENTION)
+        Stock.objects.get(pk=self.stocks[1].pk).delete()
+        self.assertEqual(list(DeletedStock.objects.values_list("stock_id", flat=True)), [self.stocks[1].pk])
+
+    async def test_resume_rejects_a_malformed_cursor(self):
+        communicator = await self.connect()
+        await communicator.send_json_to({"action": "resume", "cursor": "yesterday"})
+        self.assertEqual(await communicator.receive_json_from(), {"type": "error", "message": "Invalid cursor"})
+        await communicator.disconnect()
+
+
+@override_settings(LOW_STOCK_ALERT_INLINE_WORKER=False)
+class StockStreamPublishTests(APITransactionTestCase):
+    """Deltas go out through the channel layer only once the write commits."""
+
+    def setUp(self):
+        self.distributor, self.branch, self.stocks = tenant_with_stock("acme")
+        self.client.force_authenticate(self.distributor.user)
+        self.receive = self.listen(distributor_group(self.distributor.pk))
+
+    def listen(self, group):
+        layer = get_channel_layer()
+        channel = async_to_sync(layer.new_channel)()
+        async_to_sync(layer.group_add)(group, channel)
+        self.addCleanup(async_to_sync(layer.flush))
+
+        async def receive():
+            return await asyncio.wait_for(layer.receive(channel), timeout=1)
+        return async_to_sync(receive)
+
+    def assertNothingPublished(self):
+        with self.assertRaises(asyncio.TimeoutError):
+            self.receive()
+
+    def test_one_event_per_transaction_with_the_latest_delta_per_stock(self):
+        with transaction.atomic():
+            for quantity in (90, 80):
+                for stock in self.stocks:
+                    stock.quantity = quantity
+                    stock.save()
+        event = self.receive()
+        self.assertEqual(
+            {delta["stock"]: delta["quantity"] for delta in event["deltas"]},
+            {stock.pk: 80 for stock in self.stocks},
+        )
+        self.assertNothingPublished()
+
+    def test_rolled_back_writes_publish_nothing(self):
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            self.stocks[0].quantity = 1
+            self.stocks[0].save()
+            raise RuntimeError
+        self.assertNothingPublished()
+
+        # The next transaction starts a new batch rather than reusing the dropped one
+        with transaction.atomic():
+            self.stocks[1].quantity = 2
+            self.stocks[1].save()
+        self.assertEqual([(d["stock"], d["quantity"]) for d in self.receive()["deltas"]], [(self.stocks[1].pk, 2)])
+
+    def test_channel_layer_failure_is_logged_not_raised(self):
+        with mock.patch("notification.stream.send_deltas", side_effect=ConnectionError), \
+                self.assertLogs("notification.stream", "ERROR"):
+            with transaction.atomic():
+                queue_stock_delta(self.stocks[0])
+        self.assertNothingPublished()
+
+    def test_stock_update_through_the_api_publishes_a_delta(self):
+        stock = self.stocks[0]
+        response = self.client.patch(f"/distributor/update-stock/{stock.pk}/", {"quantity": 80}, format="json")
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual([(d["stock"], d["quantity"]) for d in self.receive()["deltas"]], [(stock.pk, 80)])
+
+    def test_stock_delete_through_the_api_publishes_a_tombstone(self):
+        stock = self.stocks[0]
+        self.assertEqual(self.client.delete(f"/distributor/delete-stock/{stock.pk}/").status_code, 204)
+        [delta] = self.receive()["deltas"]
+        self.assertEqual((delta["stock"], delta["quantity"], delta.get("deleted")), (stock.pk, 0, True))
@@ -0,0 +1,159 @@
+"""
+Catalog response cache.
+
+Product and category list responses are cached per distributor under a
+versioned key: every key embeds the current catalog version of each
+distributor the response covers, and the Product/Category signals bump that
+version once a write commits. Nothing is ever deleted; stale entries just stop
+being looked up and expire.
+
+A miss is rebuilt by one request at a time (single flight): the first takes a
+short lock in the cache and the rest wait for its result instead of all
+running the same queries. Hits, misses and coalesced waits are counted in the
+cache too, so `catalog_cache_stats()` covers every worker sharing it.
+"""
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import parse_http_date_safe
+from rest_framework.response import Response
+
+VERSION_KEY = "catalog:version:%s"
+STATS_KEY = "catalog:stats:%s"
+STATS = ("hits", "misses", "coalesced")
+
+# How long a rebuilding request holds the lock, and how long others wait for it
+LOCK_TIMEOUT = 10
+WAIT_TIMEOUT = 2.0
+WAIT_INTERVAL = 0.02
+
+
+def catalog_versions(distributor_ids):
+    keys = [VERSION_KEY % distributor_id for distributor_id in distributor_ids]
+    versions = cache.get_many(keys)
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        # A fresh, never-used value, so an evicted version can't resurrect old entries
+        for key in missing:
+            cache.add(key, time.time_ns(), timeout=None)
+        versions.update(cache.get_many(missing))
+    return [versions.get(key, 0) for key in keys]
+
+
+def bump_catalog_version(distributor_id):
+    key = VERSION_KEY % distributor_id
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), timeout=None)
+
+
+def catalog_cache_key(kind, distributor_ids, request):
+    distributor_ids = sorted(str(distributor_id) for distributor_id in distributor_ids)
+    # The absolute URI covers filters, pagination and the host used in pagination links
+    parts = [request.build_absolute_uri(), distributor_ids, catalog_versions(distributor_ids)]
+    return f"catalog:{kind}:{hashlib.sha256(json.dumps(parts).encode()).hexdigest()}"
+
+
+def record(event):
+    key = STATS_KEY % event
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, timeout=None):
+            cache.incr(key)
+
+
+def catalog_cache_stats():
+    counts = cache.get_many([STATS_KEY % event for event in STATS])
+    stats = {event: counts.get(STATS_KEY % event, 0) for event in STATS}
+    lookups = sum(stats.values())
+    stats["hit_ratio"] = round((stats["hits"] + stats["coalesced"]) / lookups, 4) if lookups else None
+    return stats
+
+
+def get_or_build(key, build):
+    """
+    The cached value for `key`, or `build()`'s result, cached unless it is None.
+
+    Returns (value, hit). Concurrent misses on the same key run `build` once;
+    a request that waits longer than WAIT_TIMEOUT builds for itself rather
+    than fail.
+    """
+    value = cache.get(key)
+    if value is not None:
+        record("hits")
+        return value, True
+
+    lock = f"{key}:lock"
+    if not cache.add(lock, 1, timeout=LOCK_TIMEOUT):
+        deadline = time.monotonic() + WAIT_TIMEOUT
+        while time.monotonic() < deadline:
+            time.sleep(WAIT_INTERVAL)
+            value = cache.get(key)
+            if value is not None:
+                record("coalesced")
+                return value, True
+        lock = None
+
+    record("misses")
+    try:
+        value = build()
+        if value is not None:
+            cache.set(key, value, timeout=settings.CATALOG_CACHE_TIMEOUT)
+        return value, False
+    finally:
+        if lock:
+            cache.delete(lock)
+
+
+class CachedListMixin:
+    """
+    Serve `list` from the catalog cache.
+
+    Subclasses set `cache_kind` and name the distributors a response covers
+    in `get_cache_scope()`, or return None to skip the cache; leaving either
+    out is a TypeError when the class is defined. The serialized page is
+    stored with its ETag/Last-Modified, so hits (and their 304s) need no
+    database query. Responses carry X-Cache: HIT or MISS.
+    """
+    cache_kind = None
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if not cls.cache_kind or not callable(getattr(cls, "get_cache_scope", None)):
+            raise TypeError(f"{cls.__name__} must set cache_kind and define get_cache_scope()")
+
+    def list(self, request, *args, **kwargs):
+        scope = self.get_cache_scope()
+        if scope is None:
+            return super().list(request, *args, **kwargs)
+
+        built = None
+
+        def build():
+            nonlocal built
+            built = super(CachedListMixin, self).list(request, *args, **kwargs)
+            if built.status_code != 200:
+                return None
+            return {"data": built.data, "etag": built.get("ETag"), "last_modified": built.get("Last-Modified")}
+
+        entry, _ = get_or_build(catalog_cache_key(self.cache_kind, scope, request), build)
+        if built is not None:
+            built["X-Cache"] = "MISS"
+            return built
+
+        response = get_conditional_response(
+            request, etag=entry["etag"], last_modified=parse_http_date_safe(entry["last_modified"] or ""),
+        ) or Response(entry["data"])
+        for header, value in (("ETag", entry["etag"]), ("Last-Modified", entry["last_modified"])):
+            if value:
+                response[header] = value
+        if entry["etag"]:
+            patch_cache_control(response, private=True, no_cache=True)
+        response["X-Cache"] = "HIT"
+        return response
@@ -0,0 +1,140 @@
+"""
+Product image variants.
+
+Uploads are kept as the original, and the sizes catalog screens actually
+download (settings.PRODUCT_IMAGE_VARIANTS) are rendered with Pillow after the
+upload commits, off the request thread: either on the in-process pool started
+by `queue_image_variants()` or by `manage.py generate_image_variants`.
+
+Variants are addressed by the sha256 of the original's bytes, so identical
+uploads share one set of files and a variant URL never changes content, which
+is what lets ImmutableMediaCacheMiddleware mark them cacheable forever.
+"""
+import hashlib
+import io
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from .cache import bump_catalog_version
+from .models import Product
+
+logger = logging.getLogger(__name__)
+
+VARIANT_PREFIX = "product_images/variants/"
+EXTENSIONS = {"JPEG": "jpg", "WEBP": "webp", "PNG": "png"}
+
+
+def variant_path(image_hash, name):
+    spec = settings.PRODUCT_IMAGE_VARIANTS[name]
+    return f"{VARIANT_PREFIX}{image_hash[:2]}/{image_hash}/{name}.{EXTENSIONS[spec['format']]}"
+
+
+def variant_urls(product):
+    """Storage URLs of `product`'s variants by name; empty until they have been generated."""
+    if not product.image_hash:
+        return {}
+    return {
+        name: default_storage.url(variant_path(product.image_hash, name))
+        for name in settings.PRODUCT_IMAGE_VARIANTS
+    }
+
+
+def render_variant(data, spec):
+    image = Image.open(io.BytesIO(data))
+    # Let the JPEG decoder downscale while decoding instead of inflating the full image first
+    image.draft("RGB", spec["size"])
+    image = ImageOps.exif_transpose(image)
+    mode = "RGBA" if image.has_transparency_data and spec["format"] != "JPEG" else "RGB"
+    if image.mode != mode:
+        image = image.convert(mode)
+
+    if spec.get("crop"):
+        image = ImageOps.fit(image, spec["size"], Image.Resampling.LANCZOS)
+    else:
+        image.thumbnail(spec["size"], Image.Resampling.LANCZOS, reducing_gap=3.0)
+
+    output = io.BytesIO()
+    image.save(output, spec["format"], quality=spec.get("quality", 80), optimize=True)
+    return output.getvalue()
+
+
+def write_variants(data, image_hash, force=False):
+    """Render every variant of `data` that is not already stored. Returns the number written."""
+    written = 0
+    for name, spec in settings.PRODUCT_IMAGE_VARIANTS.items():
+        path = variant_path(image_hash, name)
+        if default_storage.exists(path):
+            if not force:
+                continue
+            default_storage.delete(path)
+        default_storage.save(path, ContentFile(render_variant(data, spec)))
+        written += 1
+    return written
+
+
+def generate_image_variants(product_id, force=False):
+    """
+    Render the variants of a product's current image and record its hash.
+
+    The hash is stored with a conditional UPDATE on the image name, so a
+    replacement uploaded while this ran is not marked as done with the old
+    image's variants. Returns True if the product now has variants.
+    """
+    product = Product.objects.filter(pk=product_id).only("id", "distributor_id", "image", "image_hash").first()
+    if product is None or not product.image or (product.image_hash and not force):
+        return False
+
+    name = product.image.name
+    try:
+        with product.image.open("rb") as f:
+            data = f.read()
+        image_hash = hashlib.sha256(data).hexdigest()
+        write_variants(data, image_hash, force=force)
+    except (OSError, SyntaxError, ValueError, Image.DecompressionBombError) as e:
+        # Unreadable or hostile upload: leave the hash empty and keep serving the original
+        logger.warning(f"Could not generate image variants for product {product_id}: {e}")
+        return False
+
+    # update() skips auto_now and signals; bump updated_at and the catalog cache by hand
+    updated = Product.objects.filter(pk=product_id, image=name).update(image_hash=image_hash, updated_at=timezone.now())
+    if updated:
+        bump_catalog_version(product.distributor_id)
+    return bool(updated)
+
+
+def _run(product_id):
+    try:
+        generate_image_variants(product_id)
+    except Exception:
+        logger.exception(f"Image variant generation failed for product {product_id}")
+    finally:
+        connection.close()
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def queue_image_variants(product_id):
+    """Generate variants on the in-process pool once the current transaction commits."""
+    if settings.PRODUCT_IMAGE_INLINE_WORKERS:
+        transaction.on_commit(partial(_submit, product_id))
+
+
+def _submit(product_id):
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.PRODUCT_IMAGE_INLINE_WORKERS, thread_name_prefix="product-images"
+            )
+    _executor.submit(_run, product_id)
@@ -0,0 +1,125 @@
+import statistics
+import time
+import uuid
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.test import APIClient
+
+from products.cache import bump_catalog_version, catalog_cache_stats
+from products.models import Category, Product
+from products.search import search_backend
+from products.serializers import ProductSerializer
+
+User = get_user_model()
+
+ADJECTIVES = ["fresh", "organic", "frozen", "spicy", "sweet", "smoked", "roasted", "premium", "classic", "wild"]
+NOUNS = ["rice", "beans", "yam", "plantain", "tomatoes", "pepper", "chicken", "fish", "bread", "juice",
+         "noodles", "garri", "oil", "sugar", "milk", "tea", "coffee", "cocoa", "biscuits", "water"]
+
+
+class Command(BaseCommand):
+    help = "Seed a synthetic catalog and measure queries and latency of the product list and search endpoints."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--products", type=int, default=1_000_000)
+        parser.add_argument("--distributors", type=int, default=1000)
+        parser.add_argument("--categories", type=int, default=20, help="Categories per distributor.")
+        parser.add_argument("--batch-size", type=int, default=10_000)
+        parser.add_argument("--repeat", type=int, default=20, help="Requests per scenario.")
+        parser.add_argument("--keep", action="store_true", help="Keep the synthetic catalog afterwards.")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        users, categories = self.seed(options)
+        self.stdout.write(f"seeded {options['products']} products for {len(users)} distributors "
+                          f"in {time.perf_counter() - started:.1f}s")
+        started = time.perf_counter()
+        # bulk_create skips the post_save indexing, so build the search index in one go
+        search_backend().rebuild()
+        self.stdout.write(f"search index built in {time.perf_counter() - started:.1f}s")
+
+        tenant = users[0]
+        category = categories[0]
+        per_tenant = Product.objects.filter(distributor=tenant).count()
+        last_page = max(1, -(-per_tenant // 20))
+
+        client = APIClient()
+        client.force_authenticate(tenant)
+        scenarios = [
+            ("legacy: all products, per-row category", lambda: self.legacy_page()),
+            ("list, cache miss", lambda: (bump_catalog_version(tenant.pk), client.get("/product/products/"))),
+            ("list (tenant default)", lambda: client.get("/product/products/")),
+            ("list ?category_id", lambda: client.get(f"/product/products/?category_id={category.id}")),
+            (f"list ?page={last_page}", lambda: client.get(f"/product/products/?page={last_page}")),
+            ("search ?q=rice", lambda: client.get("/product/products/search/?q=rice")),
+            ("search ?q=fre ric (prefixes)", lambda: client.get("/product/products/search/?q=fre%20ric")),
+            ("search ?q=rice&category_id", lambda: client.get(
+                f"/product/products/search/?q=rice&category_id={category.id}")),
+        ]
+
+        self.stdout.write(f"{'scenario':<42} {'queries':>7} {'p50 ms':>8} {'p95 ms':>8}")
+        with override_settings(ALLOWED_HOSTS=["*"]):
+            for name, run in scenarios:
+                queries, timings = self.measure(run, options["repeat"])
+                self.stdout.write(
+                    f"{name:<42} {queries:>7} {statistics.median(timings):>8.2f} "
+                    f"{self.p95(timings):>8.2f}"
+                )
+
+        self.stdout.write(f"catalog cache: {catalog_cache_stats()}")
+
+        if not options["keep"]:
+            started = time.perf_counter()
+            Product.objects.filter(distributor__in=users).delete()
+            Category.objects.filter(distributor__in=users).delete()
+            User.objects.filter(pk__in=[u.pk for u in users]).delete()
+            self.stdout.write(f"cleaned up in {time.perf_counter() - started:.1f}s")
+
+    def seed(self, options):
+        tag = uuid.uuid4().hex[:8]
+        users = User.objects.bulk_create([
+            User(email=f"catalog-{tag}-{i}@bench.local", username=f"catalog_{tag}_{i}", role=User.ROLE.DISTRIBUTOR)
+            for i in range(options["distributors"])
+        ])
+        categories = Category.objects.bulk_create([
+            Category(name=f"catalog {tag} {i} {c}", slug=f"catalog-{tag}-{i}-{c}", distributor=user)
+            for i, user in enumerate(users)
+            for c in range(options["categories"])
+        ])
+
+        batch = []
+        for n in range(options["products"]):
+            category = categories[n % len(categories)]
+            adjective, noun = ADJECTIVES[n % len(ADJECTIVES)], NOUNS[(n // len(ADJECTIVES)) % len(NOUNS)]
+            batch.append(Product(
+                name=f"{adjective} {noun} {n}", description=f"{noun} from batch {n // 1000}",
+                price=10, stock_quantity=100,
+                category=category, distributor_id=category.distributor_id,
+            ))
+            if len(batch) >= options["batch_size"]:
+                Product.objects.bulk_create(batch)
+                batch = []
+        Product.objects.bulk_create(batch)
+        return users, categories
+
+    def legacy_page(self):
+        # What the list endpoint did before: every distributor's products,
+        # sorted by name, and a category lookup per serialized row.
+        page = Product.objects.all().order_by("name")[:20]
+        return ProductSerializer(page, many=True).data
+
+    def measure(self, run, repeat):
+        timings = []
+        for _ in range(repeat):
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                run()
+                timings.append((time.perf_counter() - started) * 1000)
+        return len(captured), timings
+
+    def p95(self, timings):
+        timings = sorted(timings)
+        return timings[min(len(timings) - 1, int(len(timings) * 0.95))]
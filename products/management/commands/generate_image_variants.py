@@ -0,0 +1,51 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from products.images import generate_image_variants
+from products.models import Product
+
+
+def generate(product_id, force):
+    try:
+        return generate_image_variants(product_id, force=force)
+    finally:
+        connection.close()
+
+
+class Command(BaseCommand):
+    help = (
+        "Render thumbnail/WebP variants for product images that do not have them yet: "
+        "a backfill for existing uploads, or the worker when PRODUCT_IMAGE_INLINE_WORKERS is 0."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=4, help="Images rendered in parallel.")
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument("--force", action="store_true",
+                            help="Re-render every image, e.g. after changing PRODUCT_IMAGE_VARIANTS.")
+
+    def handle(self, *args, **options):
+        products = Product.objects.exclude(image="").exclude(image__isnull=True)
+        if not options["force"]:
+            products = products.filter(image_hash="")
+
+        started = time.perf_counter()
+        done = failed = 0
+        last_id = 0
+        with ThreadPoolExecutor(max_workers=options["workers"]) as pool:
+            while True:
+                ids = list(
+                    products.filter(id__gt=last_id).order_by("id").values_list("id", flat=True)[:options["batch_size"]]
+                )
+                if not ids:
+                    break
+                last_id = ids[-1]
+                for ok in pool.map(generate, ids, [options["force"]] * len(ids)):
+                    done += ok
+                    failed += not ok
+
+        self.stdout.write(f"generated variants for {done} products in {time.perf_counter() - started:.1f}s"
+                          + (f", {failed} skipped (see warnings)" if failed else ""))
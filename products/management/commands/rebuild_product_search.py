@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from products.search import search_backend
+
+
+class Command(BaseCommand):
+    help = "Rebuild the product search index, e.g. after bulk imports that bypass Product.save()."
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            search_backend().rebuild()
+        self.stdout.write(self.style.SUCCESS("Product search index rebuilt."))
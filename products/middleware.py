@@ -0,0 +1,24 @@
+from django.conf import settings
+
+from .images import VARIANT_PREFIX
+
+
+class ImmutableMediaCacheMiddleware:
+    """
+    Long-lived cache headers for product image variants.
+
+    A variant's path contains the hash of its source image, so its content
+    never changes and browsers and CDNs may keep it for a year without
+    revalidating. Applies when Django serves media itself; a web server or
+    bucket in front of MEDIA_URL should send the same header for that prefix.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.prefix = "/" + (settings.MEDIA_URL + VARIANT_PREFIX).lstrip("/")
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if response.status_code == 200 and request.path.startswith(self.prefix):
+            response["Cache-Control"] = "public, max-age=31536000, immutable"
+        return response
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.3 on 2026-10-18 13:29
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0004_alter_category_distributor'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['distributor', 'category', 'name'], name='products_pr_distrib_e6f923_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['distributor', 'name'], name='products_pr_distrib_e3a6ac_idx'),
+        ),
+    ]
@@ -0,0 +1,57 @@
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+
+FTS_TABLE = "products_product_fts"
+
+
+def postgres_indexes():
+    # Must stay identical to PostgresSearchBackend.vector() for the planner to use it
+    return [
+        GinIndex(
+            SearchVector("name", weight="A", config="simple")
+            + SearchVector("description", weight="B", config="simple"),
+            name="product_search_vector_idx",
+        ),
+        GinIndex(fields=["name"], opclasses=["gin_trgm_ops"], name="product_name_trgm_idx"),
+    ]
+
+
+def create_search_index(apps, schema_editor):
+    Product = apps.get_model("products", "Product")
+    vendor = schema_editor.connection.vendor
+    if vendor == "sqlite":
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+            f"name, description, tenant, tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+        )
+        # `tenant` is the distributor's UUID (32 hex chars on SQLite) as one token
+        schema_editor.execute(
+            f"INSERT INTO {FTS_TABLE} (rowid, name, description, tenant) "
+            f"SELECT id, name, COALESCE(description, ''), 't' || distributor_id FROM products_product"
+        )
+    elif vendor == "postgresql":
+        schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        for index in postgres_indexes():
+            schema_editor.add_index(Product, index)
+
+
+def drop_search_index(apps, schema_editor):
+    Product = apps.get_model("products", "Product")
+    vendor = schema_editor.connection.vendor
+    if vendor == "sqlite":
+        schema_editor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+    elif vendor == "postgresql":
+        for index in postgres_indexes():
+            schema_editor.remove_index(Product, index)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0005_catalog_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
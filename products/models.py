@@ -26,6 +26,8 @@ class Category(models.Model):
     )
     
     created_at = models.DateTimeField(auto_now_add=True)
+    # Part of the product list's ETag, which shows category names
+    updated_at = models.DateTimeField(auto_now=True)
     
     def save(self, *args, **kwargs):
         if not self.slug:
@@ -46,8 +48,33 @@ class Product(models.Model):
     category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name="products")
     distributor = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     image = models.ImageField(upload_to='product_images/', blank=True, null=True)
+    # sha256 of the current image; set once its variants exist (see products.images)
+    image_hash = models.CharField(max_length=64, blank=True, default="", editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
-    
+
+    class Meta:
+        # Catalog reads are always scoped to one distributor and ordered by name
+        indexes = [
+            models.Index(fields=["distributor", "category", "name"]),
+            models.Index(fields=["distributor", "name"]),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored image so save() can tell when it was replaced
+        instance._loaded_image = instance.__dict__.get("image")
+        return instance
+
+    def save(self, *args, **kwargs):
+        # A new upload invalidates the variants of the old one
+        if self.image_hash and self.image.name != getattr(self, "_loaded_image", self.image.name):
+            self.image_hash = ""
+            if kwargs.get("update_fields") is not None:
+                kwargs["update_fields"] = {*kwargs["update_fields"], "image_hash"}
+        super().save(*args, **kwargs)
+        self._loaded_image = self.image.name
+
     def __str__(self):
         return self.name
@@ -0,0 +1,182 @@
+"""
+Full-text product search.
+
+The text index depends on the database: an FTS5 table on SQLite, a tsvector
+GIN index plus pg_trgm on PostgreSQL (both created by migration
+0006_product_search). `search_backend()` picks the right one for the default
+connection. Every backend takes an already-scoped Product queryset, so tenant
+and category filtering stay in ProductViewSet.
+"""
+import re
+import uuid
+
+from django.contrib.postgres.lookups import TrigramSimilar
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector, TrigramSimilarity
+from django.db import connection
+from django.db.models import Count, F, Q, Value
+from django.db.models.expressions import RawSQL
+
+MAX_TERMS = 8
+
+
+def tenant_token(distributor_id):
+    return f"t{uuid.UUID(str(distributor_id)).hex}"
+
+
+def search_terms(query):
+    """Words in `query`, lowercased. Anything else is dropped, so terms are safe to splice into MATCH/tsquery syntax."""
+    return re.findall(r"\w+", query.lower())[:MAX_TERMS]
+
+
+class SQLiteSearchBackend:
+    """
+    FTS5 with bm25 ranking; names weigh ten times more than descriptions.
+
+    Each row also carries its distributor as a `tenant` token, so a search
+    scoped to known distributors is intersected inside the FTS index and
+    only that tenant's matches are ever scored.
+    """
+
+    table = "products_product_fts"
+
+    def index(self, product):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table} WHERE rowid = %s", [product.pk])
+            cursor.execute(
+                f"INSERT INTO {self.table} (rowid, name, description, tenant) VALUES (%s, %s, %s, %s)",
+                [product.pk, product.name, product.description or "", tenant_token(product.distributor_id)],
+            )
+
+    def remove(self, product_id):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table} WHERE rowid = %s", [product_id])
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table}")
+            # UUIDs are stored as 32 hex characters on SQLite, the same form tenant_token() uses
+            cursor.execute(
+                f"INSERT INTO {self.table} (rowid, name, description, tenant) "
+                f"SELECT id, name, COALESCE(description, ''), 't' || distributor_id FROM products_product"
+            )
+
+    def match_expression(self, terms, tenant_ids):
+        # Every term must match; each one also matches as a prefix ("choc" finds "chocolate")
+        expression = "{name description} : (%s)" % " ".join(f'"{term}"*' for term in terms)
+        if tenant_ids is not None:
+            tenants = " OR ".join(tenant_token(tenant_id) for tenant_id in tenant_ids)
+            expression = f"tenant : ({tenants}) AND {expression}"
+        return expression
+
+    def filter(self, queryset, terms, tenant_ids=None):
+        return queryset.filter(id__in=RawSQL(
+            f"SELECT rowid FROM {self.table} WHERE {self.table} MATCH %s", [self.match_expression(terms, tenant_ids)]
+        ))
+
+    def ranked_ids(self, queryset, terms, limit, offset, tenant_ids=None):
+        scope_sql, scope_params = queryset.order_by().values("id").query.sql_with_params()
+        with connection.cursor() as cursor:
+            # Score the FTS matches first; probing the FTS table per scoped row is far slower.
+            cursor.execute(
+                f"WITH matches AS MATERIALIZED ("
+                f"SELECT rowid AS id, -bm25({self.table}, 10.0, 1.0, 0.0) AS rank "
+                f"FROM {self.table} WHERE {self.table} MATCH %s) "
+                f"SELECT id, rank FROM matches WHERE id IN ({scope_sql}) "
+                f"ORDER BY rank DESC, id LIMIT %s OFFSET %s",
+                [self.match_expression(terms, tenant_ids), *scope_params, limit, offset],
+            )
+            return cursor.fetchall()
+
+
+class PostgresSearchBackend:
+    """
+    tsvector match with ts_rank, plus trigram similarity on the name so near
+    misses ("chocolat") still rank. Both are served by expression indexes, so
+    there is nothing to maintain on save.
+    """
+
+    def vector(self):
+        return (
+            SearchVector("name", weight="A", config="simple")
+            + SearchVector("description", weight="B", config="simple")
+        )
+
+    def query(self, terms):
+        return SearchQuery(" & ".join(f"{term}:*" for term in terms), search_type="raw", config="simple")
+
+    def index(self, product):
+        pass
+
+    def remove(self, product_id):
+        pass
+
+    def rebuild(self):
+        pass
+
+    def filter(self, queryset, terms, tenant_ids=None):
+        # Tenant scoping is already in `queryset`; the distributor index and the
+        # GIN index are combined by the planner.
+        return queryset.annotate(search=self.vector()).filter(
+            Q(search=self.query(terms)) | Q(TrigramSimilar(F("name"), Value(" ".join(terms))))
+        )
+
+    def ranked_ids(self, queryset, terms, limit, offset, tenant_ids=None):
+        return list(
+            self.filter(queryset, terms)
+            .annotate(rank=SearchRank(self.vector(), self.query(terms)) + TrigramSimilarity("name", " ".join(terms)))
+            .order_by("-rank", "id")
+            .values_list("id", "rank")[offset:offset + limit]
+        )
+
+
+BACKENDS = {
+    "sqlite": SQLiteSearchBackend,
+    "postgresql": PostgresSearchBackend,
+}
+
+
+def search_backend():
+    try:
+        return BACKENDS[connection.vendor]()
+    except KeyError:
+        raise NotImplementedError(f"Product search is not available on {connection.vendor}")
+
+
+def search_products(queryset, query, tenant_ids=None, category_id=None, limit=20, offset=0):
+    """
+    Rank the products in `queryset` matching `query`.
+
+    `tenant_ids` lists the distributors `queryset` is scoped to (None for
+    all); backends that can push that scope into the text index do.
+
+    Returns (products, facets, total): one page of matches (optionally within
+    `category_id`), each with a `rank` attribute; per-category match counts
+    over all of `queryset`, so clients can show the other categories too; and
+    the number of matches the page was taken from.
+    """
+    terms = search_terms(query)
+    if not terms or tenant_ids == []:
+        return [], [], 0
+
+    backend = search_backend()
+    facets = list(
+        backend.filter(queryset, terms, tenant_ids)
+        .order_by()
+        .values("category_id", "category__name")
+        .annotate(count=Count("id"))
+        .order_by("-count", "category__name")
+    )
+    if category_id is not None:
+        queryset = queryset.filter(category_id=category_id)
+        total = sum(facet["count"] for facet in facets if facet["category_id"] == category_id)
+    else:
+        total = sum(facet["count"] for facet in facets)
+
+    ranked = backend.ranked_ids(queryset, terms, limit, offset, tenant_ids) if total else []
+    products = queryset.in_bulk([product_id for product_id, _ in ranked])
+    page = []
+    for product_id, rank in ranked:
+        product = products[product_id]
+        product.rank = rank
+        page.append(product)
+    return page, facets, total
@@ -1,4 +1,5 @@
 from rest_framework import serializers
+from .images import variant_urls
 from .models import Category, Product
 
 
@@ -37,8 +38,16 @@ class ProductSerializer(serializers.ModelSerializer):
     # Flatten the category data and return only the category name
     category_name = serializers.CharField(source='category.name', read_only=True)
     category_id = serializers.PrimaryKeyRelatedField(queryset=Category.objects.all(), source='category', write_only=True)
-
+    # Resized copies of `image`; empty until they have been rendered
+    image_variants = serializers.SerializerMethodField()
 
     class Meta:
         model = Product
-        fields = ['id', 'name', 'description', 'price', 'stock_quantity', 'distributor', 'category_id', 'category_name', 'image', 'created_at', 'updated_at']
\ No newline at end of file
+        fields = ['id', 'name', 'description', 'price', 'stock_quantity', 'distributor', 'category_id', 'category_name', 'image', 'image_variants', 'created_at', 'updated_at']
+
+    def get_image_variants(self, obj):
+        urls = variant_urls(obj)
+        request = self.context.get('request')
+        if request is not None:
+            urls = {name: request.build_absolute_uri(url) for name, url in urls.items()}
+        return urls
\ No newline at end of file
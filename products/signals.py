@@ -0,0 +1,51 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cache import bump_catalog_version
+from .images import queue_image_variants
+from .models import Category, Product
+from .search import search_backend
+
+
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, **kwargs):
+    search_backend().index(instance)
+
+
+@receiver(post_save, sender=Product)
+def render_image_variants(sender, instance, **kwargs):
+    if instance.image and not instance.image_hash:
+        queue_image_variants(instance.pk)
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender, instance, **kwargs):
+    search_backend().remove(instance.pk)
+
+
+def bump_after_commit(distributor_ids):
+    # After commit, so a concurrent miss can't cache the old rows under the new version
+    for distributor_id in distributor_ids:
+        transaction.on_commit(partial(bump_catalog_version, distributor_id))
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=Category)
+def invalidate_catalog_cache(sender, instance, **kwargs):
+    if instance.distributor_id:
+        bump_after_commit([instance.distributor_id])
+
+
+@receiver(post_save, sender=Category)
+def invalidate_category_catalogs(sender, instance, **kwargs):
+    # Every catalog with a product in the category shows its name, not just its owner's
+    distributor_ids = set(
+        Product.objects.filter(category=instance).order_by().values_list("distributor_id", flat=True).distinct()
+    )
+    if instance.distributor_id:
+        distributor_ids.add(instance.distributor_id)
+    bump_after_commit(distributor_ids)
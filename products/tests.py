@@ -1,3 +1,258 @@
-from django.test import TestCase
+import hashlib
+import io
+import shutil
+import tempfile
+import threading
+import time
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection
+from django.test import TestCase, override_settings
+from PIL import Image
+from rest_framework.test import APITestCase
+
+from distributor.fixtures import create_user
+from . import images
+from .cache import CachedListMixin, catalog_cache_stats, get_or_build
+from .models import Category, Product
+from .search import SQLiteSearchBackend, search_products
+
+User = get_user_model()
+
+
+class CatalogCacheTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user("d", role=User.ROLE.DISTRIBUTOR)
+        cls.category = Category.objects.create(name="Drinks", distributor=cls.user)
+        for i in range(3):
+            Product.objects.create(name=f"Product {i}", price=10, stock_quantity=1, category=cls.category,
+                                   distributor=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(self.user)
+
+    def test_hit_needs_no_queries(self):
+        for url in ("/product/products/", "/product/categories/"):
+            self.assertEqual(self.client.get(url)["X-Cache"], "MISS")
+            with self.assertNumQueries(0):
+                response = self.client.get(url)
+            self.assertEqual(response["X-Cache"], "HIT")
+        self.assertEqual(catalog_cache_stats()["hits"], 2)
+
+    def test_writes_invalidate(self):
+        self.client.get("/product/products/")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category.name = "Soft drinks"
+            self.category.save()
+        response = self.client.get("/product/products/")
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(response.data["results"][0]["category_name"], "Soft drinks")
+
+    def test_category_rename_invalidates_every_catalog_using_it(self):
+        other = create_user("o", role=User.ROLE.DISTRIBUTOR)
+        Product.objects.create(name="Borrowed", price=10, stock_quantity=1, category=self.category, distributor=other)
+        self.client.force_authenticate(other)
+        self.client.get("/product/products/")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category.name = "Soft drinks"
+            self.category.save()
+        response = self.client.get("/product/products/")
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(response.data["results"][0]["category_name"], "Soft drinks")
+
+    def assertEtagChanged(self, etag):
+        response = self.client.get("/product/products/", headers={"if_none_match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        return response
+
+    def test_products_etag_changes_on_delete(self):
+        etag = self.client.get("/product/products/")["ETag"]
+        # Served from the catalog cache
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get("/product/products/", headers={"if_none_match": etag}).status_code, 304)
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.filter(name="Product 0").delete()
+        self.assertEtagChanged(etag)
+
+    def test_products_etag_changes_on_category_rename(self):
+        etag = self.client.get("/product/products/")["ETag"]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category.name = "Soft drinks"
+            self.category.save()
+        response = self.assertEtagChanged(etag)
+        self.assertEqual(response.data["results"][0]["category_name"], "Soft drinks")
+
+    def test_concurrent_misses_build_once(self):
+        builds = []
+
+        def build():
+            builds.append(1)
+            time.sleep(0.2)
+            return {"data": 1}
+
+        threads = [threading.Thread(target=get_or_build, args=("catalog:test", build)) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(builds), 1)
+        self.assertEqual(catalog_cache_stats()["coalesced"], 4)
+
+    def test_cached_list_without_a_scope_is_rejected_at_definition(self):
+        with self.assertRaisesMessage(TypeError, "Unscoped must set cache_kind and define get_cache_scope()"):
+            class Unscoped(CachedListMixin):
+                cache_kind = "products"
+
+
+class ProductSearchTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user("d", role=User.ROLE.DISTRIBUTOR)
+        cls.other = create_user("o", role=User.ROLE.DISTRIBUTOR)
+        cls.snacks = Category.objects.create(name="Snacks", distributor=cls.user)
+        cls.drinks = Category.objects.create(name="Drinks", distributor=cls.user)
+
+        def product(name, category, description="", distributor=cls.user):
+            return Product.objects.create(name=name, description=description, price=10, stock_quantity=1,
+                                          category=category, distributor=distributor)
+
+        cls.bar = product("Chocolate bar", cls.snacks)
+        cls.cookies = product("Cookies", cls.snacks, "Oat cookies with chocolate chips")
+        cls.milk = product("Chocolate milk", cls.drinks)
+        cls.water = product("Still water", cls.drinks)
+        cls.rival_bar = product("Chocolate bar", cls.snacks, distributor=cls.other)
+
+    def search(self, query, **kwargs):
+        kwargs.setdefault("tenant_ids", [self.user.pk])
+        return search_products(Product.objects.filter(distributor=self.user), query, **kwargs)
+
+    def names(self, query, **kwargs):
+        return [product.name for product in self.search(query, **kwargs)[0]]
+
+    def test_name_matches_outrank_description_matches(self):
+        page, _, total = self.search("chocolate")
+        self.assertEqual(total, 3)
+        self.assertEqual(page[-1], self.cookies)
+        self.assertGreater(page[0].rank, page[-1].rank)
+
+    def test_terms_match_as_prefixes_and_all_must_match(self):
+        self.assertEqual(sorted(self.names("choc")), ["Chocolate bar", "Chocolate milk", "Cookies"])
+        self.assertEqual(self.names("choc mil"), ["Chocolate milk"])
+        self.assertEqual(self.names("hocolate"), [])
+        self.assertEqual(self.search("  ?! ")[2], 0)
+
+    def test_facets_count_every_category_while_paging_one(self):
+        page, facets, total = self.search("chocolate", category_id=self.drinks.pk)
+        self.assertEqual(page, [self.milk])
+        self.assertEqual(total, 1)
+        self.assertEqual(
+            [(facet["category__name"], facet["count"]) for facet in facets], [("Snacks", 2), ("Drinks", 1)]
+        )
+
+    def test_is_scoped_to_the_tenant(self):
+        self.assertNotIn(self.rival_bar, self.search("chocolate bar")[0])
+        self.assertEqual(self.search("chocolate", tenant_ids=[])[2], 0)
+
+    def test_index_follows_saves_and_deletes(self):
+        self.water.name = "Sparkling water"
+        self.water.save()
+        self.assertEqual(self.names("sparkling"), ["Sparkling water"])
+        self.assertEqual(self.names("still"), [])
+
+        milk_id = self.milk.pk
+        self.milk.delete()
+        self.assertEqual(self.names("milk"), [])
+        # The scoped queryset would hide a stale row; check the index itself
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT COUNT(*) FROM {SQLiteSearchBackend.table} WHERE rowid = %s", [milk_id])
+            self.assertEqual(cursor.fetchone()[0], 0)
+
+
+def png(size=(1200, 900), color=(200, 30, 30)):
+    output = io.BytesIO()
+    Image.new("RGB", size, color).save(output, "PNG")
+    return output.getvalue()
+
+
+@override_settings(PRODUCT_IMAGE_INLINE_WORKERS=0)
+class ImageVariantTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user("d", role=User.ROLE.DISTRIBUTOR)
+        cls.category = Category.objects.create(name="Drinks", distributor=cls.user)
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        media = override_settings(MEDIA_ROOT=media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+
+    def product(self, data):
+        product = Product(name="Cola", price=10, stock_quantity=1, category=self.category, distributor=self.user)
+        product.image.save("cola.png", ContentFile(data))
+        return product
+
+    def test_renders_every_variant_and_records_the_hash(self):
+        data = png()
+        product = self.product(data)
+        self.assertTrue(images.generate_image_variants(product.pk))
+
+        product.refresh_from_db()
+        self.assertEqual(product.image_hash, hashlib.sha256(data).hexdigest())
+        sizes = {}
+        for name, url in images.variant_urls(product).items():
+            with default_storage.open(images.variant_path(product.image_hash, name)) as f:
+                variant = Image.open(f)
+                sizes[name] = (variant.format, variant.size)
+            self.assertTrue(url.endswith(images.variant_path(product.image_hash, name)))
+        self.assertEqual(sizes, {
+            "thumb": ("JPEG", (200, 200)),
+            "thumb_webp": ("WEBP", (200, 200)),
+            "medium_webp": ("WEBP", (800, 600)),
+        })
+
+    def test_hashed_image_is_not_rendered_again(self):
+        product = self.product(png())
+        images.generate_image_variants(product.pk)
+        with mock.patch.object(images, "render_variant") as render:
+            self.assertFalse(images.generate_image_variants(product.pk))
+            # Identical bytes on another product reuse the stored files
+            self.assertTrue(images.generate_image_variants(self.product(png()).pk))
+        render.assert_not_called()
+
+    def test_replacing_the_image_clears_the_hash(self):
+        product = self.product(png())
+        images.generate_image_variants(product.pk)
+        product.refresh_from_db()
+        product.image.save("cola-new.png", ContentFile(png(color=(0, 0, 255))))
+        product.refresh_from_db()
+        self.assertEqual(product.image_hash, "")
+        self.assertTrue(images.generate_image_variants(product.pk))
+
+    def test_replacement_during_rendering_is_not_marked_done(self):
+        product = self.product(png())
+
+        def replace_meanwhile(*args, **kwargs):
+            Product.objects.filter(pk=product.pk).update(image="product_images/other.png")
+
+        with mock.patch.object(images, "write_variants", replace_meanwhile):
+            self.assertFalse(images.generate_image_variants(product.pk))
+        product.refresh_from_db()
+        self.assertEqual(product.image_hash, "")
+
+    def test_unreadable_upload_keeps_serving_the_original(self):
+        product = self.product(b"not an image")
+        with self.assertLogs("products.images", "WARNING"):
+            self.assertFalse(images.generate_image_variants(product.pk))
+        self.assertEqual(images.variant_urls(Product.objects.get(pk=product.pk)), {})
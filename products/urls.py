@@ -1,5 +1,5 @@
 from django.urls import path
-from .views import CategoryViewSet, ProductViewSet
+from .views import CategoryViewSet, ProductViewSet, catalog_cache_stats_view
 
 category_list = CategoryViewSet.as_view({
     'get': 'list',
@@ -25,9 +25,15 @@ product_detail = ProductViewSet.as_view({
     'delete': 'destroy'
 })
 
+product_search = ProductViewSet.as_view({
+    'get': 'search'
+})
+
 urlpatterns = [
     path('categories/', category_list, name='category-list'),
     path('categories/<int:pk>/', category_detail, name='category-detail'),
     path('products/', product_list, name='product-list'),
+    path('products/search/', product_search, name='product-search'),
     path('products/<int:pk>/', product_detail, name='product-detail'),
+    path('cache-stats/', catalog_cache_stats_view, name='catalog-cache-stats'),
 ]
@@ -3,10 +3,15 @@ from django.shortcuts import get_object_or_404
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from django.db import IntegrityError
+from django.db.models import ProtectedError
 from django_filters import rest_framework as filters
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import action, api_view, permission_classes
 
+from distributor.conditional import ConditionalListMixin
+from distributor.models import DistributorCustomer
+from .cache import CachedListMixin, catalog_cache_stats
 from .models import Category, Product
+from .search import search_products
 from .serializers import CategorySerializer, ProductSerializer
 
 
@@ -20,13 +25,17 @@ class CategoryFilter(filters.FilterSet):
 
 
 # ✅ ViewSet for Category (Only shows categories for the logged-in distributor)
-class CategoryViewSet(viewsets.ModelViewSet):
+class CategoryViewSet(CachedListMixin, viewsets.ModelViewSet):
     serializer_class = CategorySerializer
     permission_classes = [IsAuthenticated]
     filterset_class = CategoryFilter  # ✅ Corrected
+    cache_kind = 'categories'
+
+    def get_cache_scope(self):
+        return [self.request.user.pk]
 
     def get_queryset(self):
-        return Category.objects.filter(distributor=self.request.user).order_by('created_at')
+        return Category.objects.filter(distributor=self.request.user).select_related('distributor').order_by('created_at')
 
     def perform_create(self, serializer):
         try:
@@ -41,23 +50,117 @@ from rest_framework import viewsets
 from .models import Product
 from .serializers import ProductSerializer
 import logging
+import uuid
+
+from django.utils.functional import cached_property
 
 # Set up logger
 logger = logging.getLogger(__name__)
 
-class ProductViewSet(viewsets.ModelViewSet):
+class ProductViewSet(CachedListMixin, ConditionalListMixin, viewsets.ModelViewSet):
     serializer_class = ProductSerializer
     permission_classes = [IsAuthenticated]
+    cache_kind = 'products'
+    # Rows show their category's name
+    related_modified_fields = ('category__updated_at',)
 
-    def get_queryset(self):
-        queryset = Product.objects.all()
+    def get_cache_scope(self):
+        # The unscoped staff listing spans every distributor; don't cache it
+        return self.tenant_ids
 
-        distributor_id = self.request.query_params.get('distributor_id', None)
-        if distributor_id:
-            queryset = queryset.filter(distributor__id=distributor_id)
+    def get_queryset(self):
+        queryset = self.get_catalog_queryset()
 
         category_id = self.request.query_params.get('category_id', None)
         if category_id:
             queryset = queryset.filter(category__id=category_id)
 
-        return queryset.order_by('name')
+        # Served by the (distributor, name) and (distributor, category, name) indexes
+        return queryset.order_by('name', 'id')
+
+    def get_catalog_queryset(self):
+        """The products this request may see, before any category filter."""
+        # category_name is read for every row, so join it in the same query
+        queryset = Product.objects.select_related('category')
+        if self.tenant_scope is not None:
+            queryset = queryset.filter(distributor__in=self.tenant_scope)
+        return queryset
+
+    @cached_property
+    def tenant_ids(self):
+        """Distributor user ids whose catalog this request sees; None means all."""
+        scope = self.tenant_scope
+        return scope if scope is None or isinstance(scope, list) else list(scope)
+
+    @cached_property
+    def tenant_scope(self):
+        """
+        The distributors whose catalog this request sees: a list of user ids,
+        a subquery for customers (so list requests stay a single query), or
+        None for all.
+
+        An explicit ?distributor_id= wins. Otherwise distributors see their own
+        catalog and customers the catalog of the distributor they are assigned
+        to. Only staff get the unscoped list.
+        """
+        distributor_id = self.request.query_params.get('distributor_id', None)
+        if distributor_id:
+            try:
+                return [uuid.UUID(distributor_id)]
+            except ValueError:
+                return []
+
+        user = self.request.user
+        if user.is_staff:
+            return None
+        if user.is_distributor():
+            return [user.pk]
+        return DistributorCustomer.objects.filter(customer=user).values_list('distributor__user_id', flat=True)
+
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        """
+        Ranked full-text search: ?q= (words match as prefixes), optional
+        ?category_id=, ?limit= and ?offset=. Facets count matches per category
+        across the whole catalog.
+        """
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response({"error": "q is required"}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            category_id = request.query_params.get('category_id')
+            category_id = int(category_id) if category_id else None
+            limit = min(max(int(request.query_params.get('limit', 20)), 1), 100)
+            offset = max(int(request.query_params.get('offset', 0)), 0)
+        except ValueError:
+            return Response({"error": "category_id, limit and offset must be integers"}, status=status.HTTP_400_BAD_REQUEST)
+
+        products, facets, total = search_products(
+            self.get_catalog_queryset(), query,
+            tenant_ids=self.tenant_ids, category_id=category_id, limit=limit, offset=offset,
+        )
+        results = self.get_serializer(products, many=True).data
+        for product, row in zip(products, results):
+            row['rank'] = product.rank
+        return Response({
+            "count": total,
+            "results": results,
+            "facets": [
+                {"category_id": f["category_id"], "category_name": f["category__name"], "count": f["count"]}
+                for f in facets
+            ],
+        })
+
+    def destroy(self, request, *args, **kwargs):
+        try:
+            return super().destroy(request, *args, **kwargs)
+        except ProtectedError:
+            return Response({"error": "Product has orders and cannot be deleted"}, status=status.HTTP_409_CONFLICT)
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAdminUser])
+def catalog_cache_stats_view(request):
+    """Hit/miss counters of the catalog response cache, across all workers."""
+    return Response(catalog_cache_stats())
@@ -0,0 +1,209 @@
+"""
+Paystack webhook inbox.
+
+The webhook only verifies the signature and stores the raw event: one INSERT
+keyed by the event, so a redelivery is dropped by the unique constraint
+without a read. Applying events to Transactions, and transfer events to
+Payouts, happens here in batches, either on the in-process thread started by
+`wake_worker()` or in `manage.py process_webhook_events`. Workers claim rows before applying them,
+and applying is idempotent (a transaction only moves forward from pending),
+so an event that is processed twice changes nothing the second time.
+"""
+import hashlib
+import logging
+import os
+import threading
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import (
+    Payout, PayoutStatus, PaystackWebhookEvent, Transaction, TransactionStatus, WebhookEventStatus,
+)
+
+logger = logging.getLogger(__name__)
+
+# A worker that dies mid-batch leaves rows in "processing"; reclaim them after this long.
+CLAIM_TIMEOUT = timedelta(minutes=5)
+
+# Final outcomes of transfers made by transaction.payouts
+TRANSFER_EVENTS = {
+    "transfer.success": PayoutStatus.SUCCESSFUL,
+    "transfer.failed": PayoutStatus.FAILED,
+    "transfer.reversed": PayoutStatus.FAILED,
+}
+
+
+def event_key(payload, body):
+    """Paystack's own id for the event's object when it has one, else a digest of the raw body."""
+    data = payload.get("data") or {}
+    if data.get("id") is not None:
+        return f"{payload.get('event')}:{data['id']}"
+    return hashlib.sha256(body).hexdigest()
+
+
+def store_event(payload, body):
+    data = payload.get("data") or {}
+    PaystackWebhookEvent.objects.bulk_create([
+        PaystackWebhookEvent(
+            event_key=event_key(payload, body),
+            event=str(payload.get("event", ""))[:64],
+            reference=str(data.get("reference") or "")[:100],
+            payload=payload,
+        )
+    ], ignore_conflicts=True)
+    wake_worker()
+
+
+def claimable(now):
+    return Q(status__in=[WebhookEventStatus.PENDING, WebhookEventStatus.RETRY]) | Q(
+        status=WebhookEventStatus.PROCESSING, claimed_at__lt=now - CLAIM_TIMEOUT
+    )
+
+
+def claim_events(worker_id, batch_size):
+    now = timezone.now()
+    candidates = list(
+        PaystackWebhookEvent.objects.filter(claimable(now))
+        .order_by("received_at")
+        .values_list("id", flat=True)[:batch_size]
+    )
+    if not candidates:
+        return []
+
+    # Compare-and-swap claim: a row another worker got to first is not matched.
+    PaystackWebhookEvent.objects.filter(claimable(now), id__in=candidates).update(
+        status=WebhookEventStatus.PROCESSING, claimed_by=worker_id, claimed_at=now
+    )
+    return list(
+        PaystackWebhookEvent.objects.filter(status=WebhookEventStatus.PROCESSING, claimed_by=worker_id)
+        .order_by("received_at")
+    )
+
+
+def apply_events(events, now):
+    """Apply a claimed batch in order: one read of the Transactions and Payouts involved and one bulk write each."""
+    transactions = Transaction.objects.in_bulk(
+        {event.reference for event in events if event.reference and event.event not in TRANSFER_EVENTS},
+        field_name="reference",
+    )
+    payouts = Payout.objects.in_bulk(
+        {event.reference for event in events if event.reference and event.event in TRANSFER_EVENTS},
+        field_name="reference",
+    )
+    changed, changed_payouts = {}, {}
+    for event in events:
+        if event.event in TRANSFER_EVENTS:
+            payout = payouts.get(event.reference)
+            if payout is None:
+                logger.warning(f"Transfer webhook received for unknown reference: {event.reference}")
+                event.status = WebhookEventStatus.IGNORED
+                continue
+            # A success is final; a reversal can still undo one
+            if payout.status != PayoutStatus.SUCCESSFUL or event.event == "transfer.reversed":
+                payout.status = TRANSFER_EVENTS[event.event]
+                payout.transfer_code = (event.payload.get("data") or {}).get("transfer_code") or payout.transfer_code
+                payout.completed_at = now
+                changed_payouts[payout.pk] = payout
+            event.status = WebhookEventStatus.PROCESSED
+            event.processed_at = now
+            continue
+
+        record = transactions.get(event.reference)
+        if record is None or event.event not in ("charge.success", "charge.failed"):
+            if record is None:
+                logger.warning(f"Webhook received for unknown reference: {event.reference}")
+            event.status = WebhookEventStatus.IGNORED
+            continue
+
+        if event.event == "charge.success" and record.status != TransactionStatus.SUCCESS:
+            paid_at = (event.payload.get("data") or {}).get("paid_at")
+            record.status = TransactionStatus.SUCCESS
+            record.paid_at = (parse_datetime(paid_at) if paid_at else None) or now
+            record.has_made_payment = True
+            changed[record.pk] = record
+        elif event.event == "charge.failed" and record.status == TransactionStatus.PENDING:
+            # A late failure never overrides a success
+            record.status = TransactionStatus.FAILED
+            changed[record.pk] = record
+        event.status = WebhookEventStatus.PROCESSED
+        event.processed_at = now
+
+    for record in changed.values():
+        record.updated_at = now  # bulk_update skips auto_now
+    Transaction.objects.bulk_update(changed.values(), ["status", "paid_at", "has_made_payment", "updated_at"])
+    Payout.objects.bulk_update(changed_payouts.values(), ["status", "transfer_code", "completed_at"])
+    return len(changed) + len(changed_payouts)
+
+
+def process_pending_events(worker_id=None, batch_size=None):
+    """Claim and apply one batch. Returns the number of events handled."""
+    worker_id = worker_id or f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+    batch_size = batch_size or settings.PAYSTACK_WEBHOOK_BATCH_SIZE
+    events = claim_events(worker_id, batch_size)
+    if not events:
+        return 0
+
+    now = timezone.now()
+    try:
+        with transaction.atomic():
+            apply_events(events, now)
+            for event in events:
+                event.claimed_by, event.claimed_at = "", None
+            PaystackWebhookEvent.objects.bulk_update(
+                events, ["status", "processed_at", "claimed_by", "claimed_at"]
+            )
+    except Exception as e:
+        logger.exception("Applying Paystack webhook events failed")
+        for event in events:
+            event.attempts += 1
+            event.status = (
+                WebhookEventStatus.FAILED if event.attempts >= settings.PAYSTACK_WEBHOOK_MAX_ATTEMPTS
+                else WebhookEventStatus.RETRY
+            )
+            event.last_error = str(e)
+            event.claimed_by, event.claimed_at = "", None
+        PaystackWebhookEvent.objects.bulk_update(events, ["status", "attempts", "last_error", "claimed_by", "claimed_at"])
+    return len(events)
+
+
+class InboxWorker(threading.Thread):
+    """In-process worker thread that drains the webhook inbox whenever it is woken."""
+
+    def __init__(self, poll_interval):
+        super().__init__(name="paystack-webhooks", daemon=True)
+        self.poll_interval = poll_interval
+        self.wakeup = threading.Event()
+
+    def run(self):
+        while True:
+            self.wakeup.wait(self.poll_interval)
+            self.wakeup.clear()
+            try:
+                while process_pending_events():
+                    pass
+            except Exception:
+                logger.exception("Paystack webhook worker failed")
+            finally:
+                connection.close()
+
+
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def wake_worker():
+    """Start the in-process worker on first use and nudge it to drain the inbox."""
+    global _worker
+    if not settings.PAYSTACK_WEBHOOK_INLINE_WORKER:
+        return
+    with _worker_lock:
+        if _worker is None:
+            _worker = InboxWorker(settings.PAYSTACK_WEBHOOK_POLL_INTERVAL)
+            _worker.start()
+    _worker.wakeup.set()
@@ -0,0 +1,134 @@
+import random
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import override_settings
+from rest_framework.test import APIClient
+
+from distributor.fixtures import create_product, create_tenant, create_user, drop_users
+from distributor.models import Order, Stock
+from transaction.paystack import get_client, reset_client
+from transaction.simulator import PaystackSimulator
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+class Command(BaseCommand):
+    help = (
+        "Drive a mix of stock, order and payment-verify requests through a fixed pool of worker "
+        "threads while a local Paystack simulator browns out, with and without the circuit "
+        "breaker and bulkhead, and compare the latency of the non-payment endpoints."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=8, help="Request threads, like a WSGI server's.")
+        parser.add_argument("--rate", type=float, default=60.0, help="Requests started per second.")
+        parser.add_argument("--duration", type=float, default=10.0, help="Seconds of brownout per scenario.")
+        parser.add_argument("--payment-share", type=float, default=0.25, help="Share of requests that call Paystack.")
+        parser.add_argument("--healthy-ms", type=float, default=30.0, help="Paystack latency before the brownout.")
+        parser.add_argument("--brownout-ms", type=float, default=5000.0, help="Paystack latency during it.")
+        parser.add_argument("--brownout-error-rate", type=float, default=0.3)
+        parser.add_argument("--read-timeout", type=float, default=2.0)
+
+    def handle(self, *args, **options):
+        distributor, branch = create_tenant("brownout")
+        customer = create_user("brownout-customer")
+        for i in range(20):
+            product = create_product(distributor, f"brownout product {i}")
+            Stock.objects.create(branch=branch, product=product, quantity=100, price=10)
+            Order.objects.create(
+                distributor=distributor.user, branch=branch, customer=customer, product=product, quantity=1, price=10
+            )
+
+        simulator = PaystackSimulator(latency=options["healthy_ms"] / 1000)
+        base_url = simulator.start()
+        endpoints = {
+            "stock": (distributor.user, f"/distributor/branch-stock/{branch.id}/"),
+            "orders": (distributor.user, "/distributor/distributor-orders/"),
+            "payment": (customer, "/transaction/verify-payment/{ref}/"),
+        }
+
+        scenarios = [
+            ("healthy provider", {}, False),
+            ("brownout, unprotected", {"PAYSTACK_BREAKER_FAILURES": None, "PAYSTACK_MAX_CONCURRENCY": None}, True),
+            ("brownout, breaker+bulkhead", {}, True),
+        ]
+        self.stdout.write(f"{options['workers']} workers, {options['rate']:.0f} req/s, "
+                          f"{options['payment_share']:.0%} payment verifies; brownout = "
+                          f"{options['brownout_ms']:.0f}ms latency, {options['brownout_error_rate']:.0%} errors, "
+                          f"{options['read_timeout']}s read timeout")
+        self.stdout.write(f"{'scenario':<28} {'endpoint':<8} {'n':>5} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}  statuses")
+        try:
+            for name, overrides, brownout in scenarios:
+                simulator.latency = (options["brownout_ms"] if brownout else options["healthy_ms"]) / 1000
+                simulator.error_rate = options["brownout_error_rate"] if brownout else 0
+                with override_settings(
+                    PAYSTACK_BASE_URL=base_url, PAYSTACK_READ_TIMEOUT=options["read_timeout"],
+                    ALLOWED_HOSTS=["*"], **overrides,
+                ):
+                    reset_client()
+                    results = self.run(endpoints, options)
+                    breaker = get_client().breaker
+                    for endpoint, rows in sorted(results.items()):
+                        latencies = [latency for latency, _ in rows]
+                        statuses = defaultdict(int)
+                        for _, code in rows:
+                            statuses[code] += 1
+                        self.stdout.write(
+                            f"{name:<28} {endpoint:<8} {len(rows):>5} {percentile(latencies, 50):>9.1f} "
+                            f"{percentile(latencies, 95):>9.1f} {percentile(latencies, 99):>9.1f}  {dict(statuses)}"
+                        )
+                    if breaker:
+                        self.stdout.write(f"{'':<28} breaker ended {breaker.state}; "
+                                          f"client {get_client().metrics.snapshot()}")
+                    reset_client()
+        finally:
+            simulator.stop()
+            drop_users(distributor.user, customer)
+
+    def run(self, endpoints, options):
+        """Start requests at a fixed rate for the duration and time each from arrival to response."""
+        results = defaultdict(list)
+        lock = threading.Lock()
+        local = threading.local()
+
+        def call(endpoint, arrived):
+            user, url = endpoints[endpoint]
+            clients = getattr(local, "clients", None)
+            if clients is None:
+                clients = local.clients = {}
+            if user.pk not in clients:
+                clients[user.pk] = APIClient()
+                clients[user.pk].force_authenticate(user)
+            try:
+                response = clients[user.pk].get(url.format(ref=f"ref{random.randrange(10 ** 6)}"))
+                code = response.status_code
+            except Exception as e:
+                code = type(e).__name__
+            finally:
+                connection.close()
+            with lock:
+                results[endpoint].append(((time.perf_counter() - arrived) * 1000, code))
+
+        interval = 1 / options["rate"]
+        with ThreadPoolExecutor(max_workers=options["workers"]) as pool:
+            started = time.perf_counter()
+            n = 0
+            while time.perf_counter() - started < options["duration"]:
+                if random.random() < options["payment_share"]:
+                    endpoint = "payment"
+                else:
+                    endpoint = "stock" if n % 2 else "orders"
+                pool.submit(call, endpoint, time.perf_counter())
+                n += 1
+                time.sleep(max(0, started + n * interval - time.perf_counter()))
+        return results
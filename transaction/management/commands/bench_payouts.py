@@ -0,0 +1,99 @@
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from distributor.fixtures import create_user, drop_users
+from transaction.models import Payout, PayoutStatus
+from transaction.paystack import PaystackClient
+from transaction.payouts import process_pending_payouts, transfer_item
+from transaction.simulator import PaystackSimulator
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed pending payouts and pay them through a local Paystack simulator: one transfer at a "
+        "time, then as bulk transfers at several concurrency levels, then with several workers "
+        "draining the same queue, counting any reference sent twice."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--payouts", type=int, default=1000)
+        parser.add_argument("--latency-ms", type=float, default=100.0, help="Simulated Paystack latency per call.")
+        parser.add_argument("--batch-size", type=int, default=100)
+        parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4])
+        parser.add_argument("--workers", type=int, default=3, help="Engines draining the queue together.")
+
+    def handle(self, *args, **options):
+        users = [create_user(f"payouts-{i}") for i in range(10)]
+        simulator = PaystackSimulator(latency=options["latency_ms"] / 1000)
+        client = PaystackClient(simulator.start(), "sk_test", pool_size=max(options["concurrency"] + [options["workers"]]))
+        self.stdout.write(f"{options['payouts']} payouts, {options['latency_ms']:.0f}ms per Paystack call, "
+                          f"bulk batches of {options['batch_size']}")
+        self.stdout.write(f"{'scenario':<26} {'seconds':>8} {'payouts/s':>10} {'calls':>6} {'sent':>6} {'dupes':>6}")
+        try:
+            self.seed(users, options["payouts"])
+            self.measure("one transfer at a time", simulator, lambda: self.one_at_a_time(client))
+
+            for concurrency in options["concurrency"]:
+                self.seed(users, options["payouts"])
+                self.measure(f"bulk, concurrency {concurrency}", simulator, lambda: self.drain(
+                    client, options["batch_size"], concurrency
+                ))
+
+            self.seed(users, options["payouts"])
+            self.measure(f"bulk, {options['workers']} workers", simulator, lambda: self.workers(
+                client, options["batch_size"], options["workers"]
+            ))
+        finally:
+            client.close()
+            simulator.stop()
+            Payout.objects.filter(user__in=users).delete()
+            drop_users(*users)
+
+    def seed(self, users, n):
+        Payout.objects.filter(user__in=users).delete()
+        payouts = [Payout(user=users[i % len(users)], amount=2500, recipient_code=f"RCP_{i}") for i in range(n)]
+        for payout in payouts:
+            payout.reference = f"PYT-BENCH-{time.time_ns()}-{payout.recipient_code}"
+        Payout.objects.bulk_create(payouts)
+
+    def measure(self, name, simulator, run):
+        simulator.reset_counters()
+        started = time.perf_counter()
+        handled = run()
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f"{name:<26} {elapsed:>8.2f} {handled / elapsed:>10.0f} {simulator.counters['requests']:>6} "
+                          f"{simulator.counters['transfers']:>6} {simulator.counters['duplicates']:>6}")
+
+    def one_at_a_time(self, client):
+        """How payouts would go without the engine: a single-transfer call and a save per payout."""
+        payouts = list(Payout.objects.filter(status=PayoutStatus.PENDING))
+        for payout in payouts:
+            result = client.request("POST", "/transfer", transfer_item(payout))
+            payout.status = PayoutStatus.SUCCESSFUL if result.get("status") else PayoutStatus.FAILED
+            payout.save(update_fields=["status"])
+        return len(payouts)
+
+    def drain(self, client, batch_size, concurrency):
+        handled = 0
+        while n := process_pending_payouts(client, batch_size=batch_size, concurrency=concurrency):
+            handled += n
+        return handled
+
+    def workers(self, client, batch_size, count):
+        totals = []
+
+        def work():
+            try:
+                totals.append(self.drain(client, batch_size, 1))
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=work) for _ in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return sum(totals)
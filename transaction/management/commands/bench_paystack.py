@@ -0,0 +1,86 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.core.management.base import BaseCommand
+
+from transaction.paystack import PaystackClient
+from transaction.simulator import PaystackSimulator
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare per-call requests.get against the pooled PaystackClient on a local Paystack "
+        "simulator, and show that a hanging provider only holds a caller for the read timeout."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--calls", type=int, default=500)
+        parser.add_argument("--concurrency", type=int, default=16, help="Caller threads, like request workers.")
+        parser.add_argument("--latency-ms", type=float, default=20.0, help="Simulated Paystack latency.")
+        parser.add_argument("--jitter-ms", type=float, default=10.0)
+        parser.add_argument("--error-rate", type=float, default=0.0, help="Share of calls answered with a 503.")
+        parser.add_argument("--hang-ms", type=float, default=5000.0, help="Latency of the slow-provider scenario.")
+        parser.add_argument("--read-timeout", type=float, default=0.5, help="Client read timeout for that scenario.")
+
+    def handle(self, *args, **options):
+        simulator = PaystackSimulator(
+            latency=options["latency_ms"] / 1000, jitter=options["jitter_ms"] / 1000, error_rate=options["error_rate"],
+        )
+        base_url = simulator.start()
+        headers = {"Authorization": "Bearer sk_test_bench", "Content-Type": "application/json"}
+
+        def legacy(i):
+            # What make_request did before: a new connection per call, no timeout
+            response = requests.get(f"{base_url}/transaction/verify/ref{i}", headers=headers)
+            return response.status_code == 200 and response.json().get("status")
+
+        client = PaystackClient(base_url, "sk_test_bench", pool_size=options["concurrency"])
+
+        def pooled(i):
+            return client.request("GET", f"/transaction/verify/ref{i}", operation="verify").get("status")
+
+        self.stdout.write(f"simulator: {options['latency_ms']:.0f}ms +{options['jitter_ms']:.0f}ms jitter, "
+                          f"{options['error_rate']:.0%} errors; {options['calls']} calls "
+                          f"from {options['concurrency']} threads")
+        self.stdout.write(f"{'client':<26} {'calls/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+                          f"{'ok':>6} {'connections':>12}")
+        for name, call in (("per-call requests.get", legacy), ("pooled PaystackClient", pooled)):
+            simulator.reset_counters()
+            elapsed, latencies, ok = self.run(call, options["calls"], options["concurrency"])
+            self.stdout.write(
+                f"{name:<26} {options['calls'] / elapsed:>8.0f} {percentile(latencies, 50):>8.2f} "
+                f"{percentile(latencies, 95):>8.2f} {percentile(latencies, 99):>8.2f} "
+                f"{ok:>6} {simulator.counters['connections']:>12}"
+            )
+        self.stdout.write(f"client metrics: {client.metrics.snapshot()}")
+
+        # A hanging provider: every call is cut off at the read timeout (plus retries)
+        simulator.latency, simulator.jitter, simulator.error_rate = options["hang_ms"] / 1000, 0, 0
+        slow = PaystackClient(base_url, "sk_test_bench", timeout=(1, options["read_timeout"]), max_retries=1)
+        started = time.perf_counter()
+        result = slow.request("GET", "/transaction/verify/hang")
+        self.stdout.write(f"hanging provider ({options['hang_ms']:.0f}ms): caller released after "
+                          f"{(time.perf_counter() - started) * 1000:.0f}ms with {result['message']!r}")
+
+        client.close()
+        slow.close()
+        simulator.stop()
+
+    def run(self, call, calls, concurrency):
+        def timed(i):
+            started = time.perf_counter()
+            ok = call(i)
+            return (time.perf_counter() - started) * 1000, bool(ok)
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(timed, range(calls)))
+        elapsed = time.perf_counter() - started
+        latencies = [latency for latency, _ in results]
+        return elapsed, latencies, sum(ok for _, ok in results)
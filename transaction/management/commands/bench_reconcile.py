@@ -0,0 +1,65 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from distributor.fixtures import create_user, drop_users
+from transaction.models import ReconciliationCheckpoint, Transaction, TransactionStatus
+from transaction.paystack import PaystackClient
+from transaction.reconcile import Reconciler
+from transaction.simulator import PaystackSimulator
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed pending transactions, reconcile them against a local Paystack simulator at several "
+        "concurrency levels, and report throughput and database queries per transaction."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--transactions", type=int, default=1000)
+        parser.add_argument("--latency-ms", type=float, default=40.0, help="Simulated Paystack latency.")
+        parser.add_argument("--batch-size", type=int, default=200)
+        parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+
+    def handle(self, *args, **options):
+        user = create_user("reconcile")
+        prefix = f"REC-{user.pk.hex[:8]}"
+        Transaction.objects.bulk_create([
+            Transaction(user=user, reference=f"{prefix}-{i}", amount=1000) for i in range(options["transactions"])
+        ])
+        mine = Transaction.objects.filter(user=user)
+        mine.update(created_at=timezone.now() - timedelta(hours=2))
+
+        simulator = PaystackSimulator(latency=options["latency_ms"] / 1000)
+        outcomes = ["success", "success", "success", "failed", "abandoned"]
+        simulator.outcomes = {f"{prefix}-{i}": outcomes[i % len(outcomes)] for i in range(options["transactions"])}
+        base_url = simulator.start()
+        self.stdout.write(f"{options['transactions']} pending transactions, {options['latency_ms']:.0f}ms Paystack latency, "
+                          f"batch size {options['batch_size']}")
+        self.stdout.write(f"{'concurrency':>11} {'seconds':>8} {'txn/s':>8} {'queries':>8} {'paid':>6} {'failed':>6} {'pending':>7}")
+        try:
+            for concurrency in options["concurrency"]:
+                mine.update(status=TransactionStatus.PENDING, paid_at=None, has_made_payment=False)
+                client = PaystackClient(base_url, "sk_test", pool_size=concurrency)
+                reconciler = Reconciler(client, batch_size=options["batch_size"], concurrency=concurrency,
+                                        min_age=timedelta(hours=1), checkpoint=prefix)
+                try:
+                    with CaptureQueriesContext(connection) as queries:
+                        started = time.perf_counter()
+                        stats = reconciler.run(restart=True)
+                        elapsed = time.perf_counter() - started
+                finally:
+                    client.close()
+                self.stdout.write(
+                    f"{concurrency:>11} {elapsed:>8.2f} {stats['checked'] / elapsed:>8.0f} {len(queries):>8} "
+                    f"{stats['success']:>6} {stats['failed']:>6} {stats['unchanged']:>7}"
+                )
+        finally:
+            simulator.stop()
+            ReconciliationCheckpoint.objects.filter(name=prefix).delete()
+            mine.delete()
+            drop_users(user)
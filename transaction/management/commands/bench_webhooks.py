@@ -0,0 +1,107 @@
+import hashlib
+import hmac
+import json
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from distributor.fixtures import create_user, drop_users
+from transaction.inbox import process_pending_events
+from transaction.models import PaystackWebhookEvent, Transaction, TransactionStatus
+
+SECRET = "sk_test_bench_webhooks"
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def legacy_apply(reference):
+    """What the webhook used to do before acknowledging: a lookup and two saves per delivery."""
+    transaction = Transaction.objects.filter(reference=reference).first()
+    transaction.status = "success"
+    transaction.paid_at = timezone.now()
+    transaction.save()
+    user = transaction.user
+    user.save()
+
+
+class Command(BaseCommand):
+    help = (
+        "Send signed charge.success webhooks, each delivered several times, and measure the "
+        "acknowledgement latency, how many rows the duplicates cost, and how fast the inbox drains."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--transactions", type=int, default=500)
+        parser.add_argument("--duplicates", type=int, default=3, help="Deliveries of every event.")
+        parser.add_argument("--concurrency", type=int, default=8)
+
+    def handle(self, *args, **options):
+        user = create_user("webhooks")
+        Transaction.objects.bulk_create([
+            Transaction(user=user, reference=f"WHB-{user.pk.hex[:8]}-{i}", amount=1000)
+            for i in range(options["transactions"])
+        ])
+        references = list(Transaction.objects.filter(user=user).values_list("reference", flat=True))
+        bodies = [
+            json.dumps({"event": "charge.success", "data": {
+                "id": f"{user.pk.hex[:8]}{i}", "reference": reference, "status": "success",
+                "paid_at": "2024-01-01T00:00:00Z",
+            }}).encode()
+            for i, reference in enumerate(references)
+        ]
+        deliveries = bodies * options["duplicates"]
+        random.shuffle(deliveries)
+
+        try:
+            with override_settings(PAYSTACK_SECRET_KEY=SECRET, PAYSTACK_WEBHOOK_INLINE_WORKER=False, ALLOWED_HOSTS=["*"]):
+                legacy = self.timed(lambda body: legacy_apply(json.loads(body)["data"]["reference"]),
+                                    deliveries, options["concurrency"])
+                Transaction.objects.filter(user=user).update(status=TransactionStatus.PENDING, paid_at=None)
+
+                stored_before = PaystackWebhookEvent.objects.count()
+                inbox = self.timed(self.deliver, deliveries, options["concurrency"])
+                stored = PaystackWebhookEvent.objects.count() - stored_before
+
+                started = time.perf_counter()
+                while process_pending_events():
+                    pass
+                drained = time.perf_counter() - started
+        finally:
+            PaystackWebhookEvent.objects.filter(reference__in=references).delete()
+            Transaction.objects.filter(user=user).delete()
+            drop_users(user)
+
+        self.stdout.write(f"{len(deliveries)} deliveries of {len(bodies)} events from "
+                          f"{options['concurrency']} threads")
+        for name, latencies in (("inline apply (before)", legacy), ("inbox ack", inbox)):
+            self.stdout.write(f"{name:<22} p50 {percentile(latencies, 50):7.2f}ms  p99 {percentile(latencies, 99):7.2f}ms  "
+                              f"max {max(latencies):7.2f}ms")
+        self.stdout.write(f"inbox rows stored:     {stored} ({len(deliveries) - stored} duplicates dropped on insert)")
+        self.stdout.write(f"inbox drained in       {drained * 1000:.0f}ms ({stored / drained:.0f} events/s)")
+
+    def deliver(self, body):
+        signature = hmac.new(SECRET.encode(), body, hashlib.sha512).hexdigest()
+        response = Client().post("/transaction/paystack-webhook/", body, content_type="application/json",
+                                 headers={"X-Paystack-Signature": signature})
+        assert response.status_code == 200, response.content
+
+    def timed(self, call, items, concurrency):
+        def run(item):
+            started = time.perf_counter()
+            try:
+                call(item)
+            finally:
+                connection.close()
+            return (time.perf_counter() - started) * 1000
+
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            return list(pool.map(run, items))
@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from transaction.simulator import PaystackSimulator
+
+
+class Command(BaseCommand):
+    help = "Serve the local Paystack simulator until interrupted; point PAYSTACK_BASE_URL or --base-url at it."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--port", type=int, default=8099)
+        parser.add_argument("--latency-ms", type=float, default=50.0)
+        parser.add_argument("--jitter-ms", type=float, default=25.0)
+        parser.add_argument("--error-rate", type=float, default=0.0, help="Share of calls answered with a 503.")
+
+    def handle(self, *args, **options):
+        simulator = PaystackSimulator(
+            latency=options["latency_ms"] / 1000, jitter=options["jitter_ms"] / 1000,
+            error_rate=options["error_rate"], port=options["port"],
+        )
+        self.stdout.write(f"Paystack simulator listening on {simulator.start()}")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            simulator.stop()
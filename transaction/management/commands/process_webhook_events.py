@@ -0,0 +1,25 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from transaction.inbox import process_pending_events
+
+
+class Command(BaseCommand):
+    help = "Apply Paystack webhook events stored in the inbox to their transactions."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Drain the inbox once and exit.")
+        parser.add_argument("--batch-size", type=int, default=settings.PAYSTACK_WEBHOOK_BATCH_SIZE)
+        parser.add_argument("--interval", type=float, default=2.0, help="Seconds to sleep when the inbox is empty.")
+
+    def handle(self, *args, **options):
+        while True:
+            handled = process_pending_events(batch_size=options["batch_size"])
+            if handled:
+                self.stdout.write(f"Processed {handled} webhook events")
+                continue
+            if options["once"]:
+                return
+            time.sleep(options["interval"])
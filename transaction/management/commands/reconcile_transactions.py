@@ -0,0 +1,66 @@
+import random
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from transaction.paystack import client_from_settings
+from transaction.reconcile import Reconciler
+from cyriox.resilience import CircuitBreaker
+from transaction.simulator import PaystackSimulator
+
+
+class Command(BaseCommand):
+    help = (
+        "Verify pending transactions against Paystack, oldest first, and settle the ones Paystack "
+        "reports as paid or failed. Resumes from the last checkpoint unless --restart is given."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=200, help="Transactions per page and bulk update.")
+        parser.add_argument("--concurrency", type=int, default=8, help="Paystack calls in flight.")
+        parser.add_argument("--min-age", type=int, default=30,
+                            help="Minutes a transaction must have been pending; younger ones may still get a webhook.")
+        parser.add_argument("--limit", type=int, help="Stop after checking this many transactions.")
+        parser.add_argument("--checkpoint", default="default", help="Name of the checkpoint to resume from.")
+        parser.add_argument("--restart", action="store_true", help="Ignore the checkpoint and start from the oldest.")
+        parser.add_argument("--base-url", default=settings.PAYSTACK_BASE_URL,
+                            help="Paystack API root, e.g. a `manage.py paystack_simulator` instance.")
+        parser.add_argument("--simulate", action="store_true",
+                            help="Verify against an in-process simulator that settles ~70%% success, 20%% failed, "
+                                 "10%% abandoned.")
+        parser.add_argument("--latency-ms", type=float, default=50.0, help="Simulator latency with --simulate.")
+
+    def handle(self, *args, **options):
+        base_url, simulator = options["base_url"], None
+        if options["simulate"]:
+            simulator = PaystackSimulator(
+                latency=options["latency_ms"] / 1000, jitter=options["latency_ms"] / 2000,
+                default_outcome=lambda reference: random.choices(["success", "failed", "abandoned"], [7, 2, 1])[0],
+            )
+            base_url = simulator.start()
+
+        # Its own client: a batch job gets its own connection pool and concurrency, but still a breaker
+        client = client_from_settings(base_url, pool_size=options["concurrency"], bulkhead=False)
+        reconciler = Reconciler(
+            client, batch_size=options["batch_size"], concurrency=options["concurrency"],
+            min_age=timedelta(minutes=options["min_age"]), checkpoint=options["checkpoint"],
+        )
+
+        started = time.perf_counter()
+        try:
+            stats = reconciler.run(restart=options["restart"], limit=options["limit"])
+        finally:
+            client.close()
+            if simulator:
+                simulator.stop()
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(
+            f"checked {stats['checked']} in {elapsed:.1f}s ({stats['checked'] / max(elapsed, 1e-6):.0f}/s): "
+            f"{stats['success']} paid, {stats['failed']} failed, {stats['unchanged']} still pending, "
+            f"{stats['errors']} errors"
+        )
+        if client.breaker and client.breaker.state != CircuitBreaker.CLOSED:
+            self.stderr.write(self.style.WARNING("Stopped early: Paystack is unavailable. Rerun to resume."))
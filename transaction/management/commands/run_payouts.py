@@ -0,0 +1,35 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from transaction.paystack import client_from_settings
+from transaction.payouts import process_pending_payouts
+
+
+class Command(BaseCommand):
+    help = "Send pending payouts to Paystack as bulk transfers. Several workers can run at once."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Drain the queue once and exit.")
+        parser.add_argument("--batch-size", type=int, default=settings.PAYOUT_BATCH_SIZE,
+                            help="Payouts per bulk transfer.")
+        parser.add_argument("--concurrency", type=int, default=settings.PAYOUT_CONCURRENCY,
+                            help="Bulk transfers in flight.")
+        parser.add_argument("--interval", type=float, default=5.0, help="Seconds to sleep when the queue is empty.")
+
+    def handle(self, *args, **options):
+        client = client_from_settings(pool_size=options["concurrency"], bulkhead=False)
+        try:
+            while True:
+                handled = process_pending_payouts(
+                    client, batch_size=options["batch_size"], concurrency=options["concurrency"]
+                )
+                if handled:
+                    self.stdout.write(f"Handled {handled} payouts")
+                    continue
+                if options["once"]:
+                    return
+                time.sleep(options["interval"])
+        finally:
+            client.close()
@@ -6,6 +6,8 @@ User = get_user_model()
 
 class PayoutStatus(models.TextChoices):
     PENDING = "pending", "Pending"
+    PROCESSING = "processing", "Processing"
+    SUBMITTED = "submitted", "Submitted"
     SUCCESSFUL = "successful", "Successful"
     FAILED = "failed", "Failed"
 
@@ -18,8 +20,21 @@ class Payout(models.Model):
     recipient_code = models.CharField(max_length=50)
     status = models.CharField(max_length=20, choices=PayoutStatus.choices, default=PayoutStatus.PENDING)
     reference = models.CharField(max_length=100, unique=True, editable=False)
+    transfer_code = models.CharField(max_length=50, blank=True)
+    # Claims taken by transaction.payouts; a payout with attempts > 1 may already have reached Paystack
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    claimed_by = models.CharField(max_length=64, blank=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    submitted_at = models.DateTimeField(null=True, blank=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "created_at"]),
+        ]
+
     def __str__(self):
         return f"Payout {self.reference} - {self.status}"
 
@@ -48,6 +63,12 @@ class Transaction(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # Reconciliation pages through pending transactions oldest first
+            models.Index(fields=["status", "created_at", "id"]),
+        ]
+
     def __str__(self):
         return f"Transaction {self.reference}: {self.user.email} - {self.amount} - {self.status}"
 
@@ -57,3 +78,46 @@ class Transaction(models.Model):
             self.reference = f"TRX-{uuid.uuid4().hex[:12].upper()}"
         super().save(*args, **kwargs)
 
+
+class WebhookEventStatus(models.TextChoices):
+    PENDING = "pending", "Pending"
+    PROCESSING = "processing", "Processing"
+    RETRY = "retry", "Retry"
+    PROCESSED = "processed", "Processed"
+    IGNORED = "ignored", "Ignored"
+    FAILED = "failed", "Failed"
+
+
+class PaystackWebhookEvent(models.Model):
+    """Raw Paystack webhook delivery, stored on receipt and applied later by transaction.inbox"""
+    # Paystack redelivers the same event until it gets a 2xx; the key makes repeats a no-op insert
+    event_key = models.CharField(max_length=128, unique=True)
+    event = models.CharField(max_length=64)
+    reference = models.CharField(max_length=100, blank=True)
+    payload = models.JSONField()
+    status = models.CharField(max_length=20, choices=WebhookEventStatus.choices, default=WebhookEventStatus.PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    claimed_by = models.CharField(max_length=64, blank=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    received_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "received_at"]),
+        ]
+
+    def __str__(self):
+        return f"{self.event} {self.reference} ({self.status})"
+
+
+class ReconciliationCheckpoint(models.Model):
+    """How far a reconciliation run got, so the next one resumes after it"""
+    name = models.CharField(max_length=64, unique=True)
+    last_created_at = models.DateTimeField(null=True, blank=True)
+    last_id = models.UUIDField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Reconciliation {self.name} at {self.last_created_at}"
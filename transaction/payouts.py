@@ -0,0 +1,171 @@
+"""
+Payout engine.
+
+Pending Payouts are claimed by compare-and-swap, like the webhook inbox, so
+any number of `manage.py run_payouts` workers can drain the queue together.
+A claim is split into Paystack bulk transfers of up to PAYOUT_BATCH_SIZE,
+sent PAYOUT_CONCURRENCY at a time, and each batch's per-item outcome is
+written with one bulk UPDATE as soon as its response arrives. The threads
+only make HTTP calls; all database work stays on the calling thread. That
+UPDATE only matches payouts still PROCESSING under this worker's claim, so
+a transfer webhook that settled one in the meantime, or a worker that took
+over an expired claim, is not overwritten.
+
+Every claim counts as an attempt. A payout claimed before (its worker died,
+or the call timed out) may already be at Paystack, so it is looked up by its
+reference first and only sent again if Paystack has never seen it. Paystack
+also rejects a reused transfer reference, which backs this up.
+"""
+import logging
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Payout, PayoutStatus
+from .paystack import PaystackUnavailable
+
+logger = logging.getLogger(__name__)
+
+# Longer than any Paystack call can take with its retries, so a live worker never loses its claim
+CLAIM_TIMEOUT = timedelta(minutes=10)
+# A payout handed back after a failed attempt keeps its claimed_at and waits this long before the next
+RETRY_DELAY = timedelta(minutes=1)
+
+# Paystack transfer statuses that are final; anything else (pending, received, otp) awaits a webhook
+TRANSFER_STATUSES = {
+    "success": PayoutStatus.SUCCESSFUL,
+    "failed": PayoutStatus.FAILED,
+    "reversed": PayoutStatus.FAILED,
+}
+
+UPDATE_FIELDS = [
+    "status", "transfer_code", "last_error", "claimed_by", "claimed_at", "submitted_at", "completed_at", "attempts",
+]
+
+
+def claimable(now):
+    return (
+        Q(status=PayoutStatus.PENDING) & (Q(claimed_at__isnull=True) | Q(claimed_at__lt=now - RETRY_DELAY))
+    ) | Q(status=PayoutStatus.PROCESSING, claimed_at__lt=now - CLAIM_TIMEOUT)
+
+
+def claim_payouts(worker_id, limit):
+    now = timezone.now()
+    candidates = list(
+        Payout.objects.filter(claimable(now)).order_by("created_at").values_list("id", flat=True)[:limit]
+    )
+    if not candidates:
+        return []
+
+    # Compare-and-swap claim: a row another worker got to first is not matched.
+    Payout.objects.filter(claimable(now), id__in=candidates).update(
+        status=PayoutStatus.PROCESSING, claimed_by=worker_id, claimed_at=now, attempts=F("attempts") + 1
+    )
+    return list(
+        Payout.objects.filter(status=PayoutStatus.PROCESSING, claimed_by=worker_id).order_by("created_at")
+    )
+
+
+def transfer_item(payout):
+    return {
+        "amount": int(payout.amount * 100),  # kobo
+        "recipient": payout.recipient_code,
+        "reference": payout.reference,
+        "reason": f"Payout {payout.reference}",
+    }
+
+
+def record_transfer(payout, transfer, now):
+    payout.transfer_code = transfer.get("transfer_code") or payout.transfer_code
+    payout.status = TRANSFER_STATUSES.get(transfer.get("status"), PayoutStatus.SUBMITTED)
+    payout.submitted_at = payout.submitted_at or now
+    if payout.status != PayoutStatus.SUBMITTED:
+        payout.completed_at = now
+    payout.last_error = ""
+
+
+def release(payout, error):
+    """Hand a payout back to the queue, or give up on it after PAYOUT_MAX_ATTEMPTS."""
+    if payout.attempts >= settings.PAYOUT_MAX_ATTEMPTS:
+        payout.status = PayoutStatus.FAILED
+        payout.completed_at = timezone.now()
+    else:
+        payout.status = PayoutStatus.PENDING
+    payout.last_error = error
+
+
+def submit_batch(client, payouts):
+    """Send one bulk transfer for the payouts and set each one's outcome on it; saving is the caller's."""
+    now = timezone.now()
+    to_send = []
+    try:
+        for payout in payouts:
+            if payout.attempts > 1:
+                found = client.request("GET", f"/transfer/verify/{payout.reference}", operation="transfer.verify")
+                if found.get("status"):
+                    record_transfer(payout, found["data"], now)
+                    continue
+                if found.get("status_code") != 404:
+                    release(payout, found.get("message", "Transfer lookup failed"))
+                    continue
+            to_send.append(payout)
+
+        if to_send:
+            result = client.request(
+                "POST", "/transfer/bulk",
+                {"currency": "NGN", "source": "balance", "transfers": [transfer_item(p) for p in to_send]},
+                operation="transfer.bulk",
+            )
+            if result.get("status"):
+                transfers = {item.get("reference"): item for item in result.get("data") or []}
+                for payout in to_send:
+                    if payout.reference in transfers:
+                        record_transfer(payout, transfers[payout.reference], now)
+                    else:
+                        release(payout, "Missing from Paystack's bulk transfer response")
+            else:
+                for payout in to_send:
+                    release(payout, result.get("message", "Bulk transfer failed"))
+    except PaystackUnavailable as e:
+        # Nothing left for Paystack; these don't count as attempts
+        for payout in payouts:
+            if payout.status == PayoutStatus.PROCESSING:
+                payout.attempts -= 1
+                release(payout, str(e))
+
+    for payout in payouts:
+        payout.claimed_by = ""
+        if payout.status != PayoutStatus.PENDING:
+            payout.claimed_at = None
+    return payouts
+
+
+def process_pending_payouts(client, worker_id=None, batch_size=None, concurrency=None):
+    """Claim up to batch_size * concurrency payouts and submit them. Returns the number handled."""
+    worker_id = worker_id or f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+    batch_size = batch_size or settings.PAYOUT_BATCH_SIZE
+    concurrency = concurrency or settings.PAYOUT_CONCURRENCY
+    payouts = claim_payouts(worker_id, batch_size * concurrency)
+    if not payouts:
+        return 0
+
+    batches = [payouts[i:i + batch_size] for i in range(0, len(payouts), batch_size)]
+    accepted = 0
+    # Threads only talk to Paystack; each batch is saved from here as soon as it is back
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="payouts") as pool:
+        for future in as_completed([pool.submit(submit_batch, client, batch) for batch in batches]):
+            batch = future.result()
+            # Compare-and-swap write-back, on the claim made above
+            written = Payout.objects.filter(status=PayoutStatus.PROCESSING, claimed_by=worker_id).bulk_update(
+                batch, UPDATE_FIELDS
+            )
+            if written < len(batch):
+                logger.info(f"{len(batch) - written} payouts were settled elsewhere while their transfer was in flight")
+            accepted += sum(p.status in (PayoutStatus.SUBMITTED, PayoutStatus.SUCCESSFUL) for p in batch)
+    logger.info(f"Submitted {accepted} of {len(payouts)} payouts in {len(batches)} bulk transfers")
+    return len(payouts)
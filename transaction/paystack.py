@@ -1,46 +1,247 @@
-import requests
-import os
 import logging
+import random
+import threading
+import time
+from collections import deque
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+from cyriox.resilience import Bulkhead, CircuitBreaker
 
 # Initialize logger
 logger = logging.getLogger(__name__)
 
-# Load Paystack Secret Key from environment variables
-PAYSTACK_SECRET_KEY = os.getenv("PAYSTACK_SECRET_KEY")
-PAYSTACK_BASE_URL = "https://api.paystack.co"
-
-if not PAYSTACK_SECRET_KEY:
+if not settings.PAYSTACK_SECRET_KEY:
     logger.error("PAYSTACK_SECRET_KEY is not set. Ensure it is properly configured in the environment.")
 
-# General function to make API requests
-def make_request(method, endpoint, payload=None):
-    """Helper function to make requests to Paystack API."""
-    url = f"{PAYSTACK_BASE_URL}{endpoint}"
-    headers = {
-        "Authorization": f"Bearer {PAYSTACK_SECRET_KEY}",
-        "Content-Type": "application/json"
-    }
+# Failures worth retrying: the request may not have reached Paystack, or Paystack asked us to back off
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class PaystackMetrics:
+    """Call counts and a sliding window of latencies per operation, for logs and benchmarks."""
+
+    def __init__(self, window=1000):
+        self.window = window
+        self.lock = threading.Lock()
+        self.operations = {}
+
+    def record(self, operation, elapsed, ok, retries):
+        with self.lock:
+            stats = self.stats(operation)
+            stats["calls"] += 1
+            stats["errors"] += not ok
+            stats["retries"] += retries
+            stats["latencies"].append(elapsed)
+
+    def stats(self, operation):
+        return self.operations.setdefault(
+            operation, {"calls": 0, "errors": 0, "retries": 0, "rejected": 0, "latencies": deque(maxlen=self.window)}
+        )
+
+    def reject(self, operation):
+        with self.lock:
+            self.stats(operation)["rejected"] += 1
+
+    def snapshot(self):
+        with self.lock:
+            result = {}
+            for operation, stats in self.operations.items():
+                latencies = sorted(stats["latencies"]) or [0.0]
+                result[operation] = {
+                    "calls": stats["calls"],
+                    "errors": stats["errors"],
+                    "retries": stats["retries"],
+                    "rejected": stats["rejected"],
+                    "p50_ms": round(latencies[len(latencies) // 2] * 1000, 2),
+                    "p95_ms": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000, 2),
+                }
+            return result
+
+
+class PaystackUnavailable(Exception):
+    """Raised without calling Paystack: its circuit is open or the bulkhead is full."""
+
+    def __init__(self, message, retry_after=1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class RetryableResponse(Exception):
+    """A 429/5xx on an idempotent call, raised so it is retried like a network error."""
+
+    def __init__(self, response):
+        super().__init__(f"HTTP {response.status_code}")
+        self.response = response
 
-    try:
-        if method == "GET":
-            response = requests.get(url, headers=headers)
-        elif method == "POST":
-            response = requests.post(url, json=payload, headers=headers)
-        else:
-            logger.error(f"Unsupported request method: {method}")
-            return {"status": False, "message": "Invalid request method"}
 
-        response_data = response.json()
+class PaystackClient:
+    """
+    Paystack API client on one pooled keep-alive session.
+
+    Every call has connect and read timeouts, so a slow Paystack can hold a
+    worker for a bounded time only. Idempotent calls (GETs) are retried on
+    timeouts, connection errors and 429/5xx with exponential backoff and full
+    jitter; other calls are retried only when the connection could not be
+    opened, since then Paystack never saw the request. Responses keep the
+    shape views already expect: Paystack's JSON on success, otherwise
+    {"status": False, "message": ...}.
+
+    With a `breaker` and `bulkhead` (see cyriox.resilience), calls made
+    while Paystack is known to be down, or while too many are already in
+    flight, raise PaystackUnavailable at once instead of tying up a worker.
+    """
+
+    def __init__(self, base_url, secret_key, timeout=(3.05, 10), max_retries=2, backoff=0.25,
+                 pool_size=20, metrics=None, breaker=None, bulkhead=None):
+        self.base_url = base_url.rstrip("/")
+        self.breaker = breaker
+        self.bulkhead = bulkhead
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.metrics = metrics or PaystackMetrics()
+
+        self.session = requests.Session()
+        self.session.headers.update({
+            "Authorization": f"Bearer {secret_key}",
+            "Content-Type": "application/json",
+        })
+        # Retries are ours (below), so urllib3 never retries behind our back
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def request(self, method, endpoint, payload=None, idempotent=None, operation=None):
+        operation = operation or f"{method} {endpoint}"
+        # Bulkhead first: a refused call must not take one of the breaker's half-open probe slots
+        if self.bulkhead and not self.bulkhead.acquire():
+            self.metrics.reject(operation)
+            raise PaystackUnavailable("Too many Paystack calls in flight", retry_after=1)
+        try:
+            if self.breaker and not self.breaker.allow():
+                self.metrics.reject(operation)
+                raise PaystackUnavailable("Paystack is unavailable", retry_after=self.breaker.retry_after())
+
+            recorded = False
+            try:
+                started = time.perf_counter()
+                result, attempts, provider_failed = self.send(method, endpoint, payload, idempotent)
+                elapsed = time.perf_counter() - started
+
+                if self.breaker:
+                    # 4xx answers are our mistake, not Paystack's; only outages trip the breaker
+                    if provider_failed:
+                        self.breaker.record_failure()
+                    else:
+                        self.breaker.record_success()
+                    recorded = True
+            finally:
+                # An exception send() doesn't classify says nothing about Paystack, but
+                # a probe slot left taken would keep the circuit half-open for good
+                if self.breaker and not recorded:
+                    self.breaker.release()
+            self.metrics.record(operation, elapsed, bool(result.get("status")), attempts)
+            logger.debug(f"Paystack {operation} took {elapsed * 1000:.1f}ms ({attempts} retries)")
+            return result
+        finally:
+            if self.bulkhead:
+                self.bulkhead.release()
+
+    def send(self, method, endpoint, payload, idempotent):
+        """The call with its retries. Returns (result, retries, whether Paystack itself failed)."""
+        idempotent = method == "GET" if idempotent is None else idempotent
+        url = f"{self.base_url}{endpoint}"
+        attempt = 0
+        while True:
+            try:
+                response = self.session.request(method, url, json=payload, timeout=self.timeout)
+                if response.status_code in RETRY_STATUSES and idempotent and attempt < self.max_retries:
+                    raise RetryableResponse(response)
+                return self.parse(endpoint, response), attempt, response.status_code in RETRY_STATUSES
+            except (requests.RequestException, RetryableResponse) as e:
+                retryable = isinstance(e, RetryableResponse) or (
+                    isinstance(e, (requests.ConnectionError, requests.Timeout)) if idempotent
+                    else isinstance(e, requests.ConnectTimeout)
+                )
+                if retryable and attempt < self.max_retries:
+                    attempt += 1
+                    time.sleep(random.uniform(0, self.backoff * 2 ** (attempt - 1)))
+                    continue
+                logger.error(f"Paystack API request failed: {e}")
+                return {"status": False, "message": "Paystack API request failed", "error": str(e)}, attempt, True
+
+    def parse(self, endpoint, response):
+        try:
+            response_data = response.json()
+        except ValueError:
+            response_data = {"message": response.text[:200]}
 
         if response.status_code in [200, 201] and response_data.get("status"):
             return response_data
-        else:
-            logger.warning(f"Paystack API error - Endpoint: {endpoint}, Response: {response_data}")
-            return {"status": False, "message": response_data.get("message", "Request failed"), "details": response_data}
+        logger.warning(f"Paystack API error - Endpoint: {endpoint}, Response: {response_data}")
+        return {
+            "status": False,
+            "message": response_data.get("message", "Request failed"),
+            "details": response_data,
+            "status_code": response.status_code,
+        }
+
+    def close(self):
+        self.session.close()
+
 
-    except requests.RequestException as e:
-        logger.error(f"Paystack API request failed: {e}")
-        return {"status": False, "message": "Paystack API request failed", "error": str(e)}
+_client = None
+_client_lock = threading.Lock()
+
+
+def client_from_settings(base_url=None, pool_size=None, bulkhead=True):
+    """A client configured from settings. Batch jobs pass their own pool size and skip the bulkhead."""
+    breaker = None
+    if settings.PAYSTACK_BREAKER_FAILURES:
+        breaker = CircuitBreaker(settings.PAYSTACK_BREAKER_FAILURES, settings.PAYSTACK_BREAKER_RESET_TIMEOUT)
+    if bulkhead and settings.PAYSTACK_MAX_CONCURRENCY:
+        bulkhead = Bulkhead(settings.PAYSTACK_MAX_CONCURRENCY, settings.PAYSTACK_BULKHEAD_WAIT)
+    else:
+        bulkhead = None
+    return PaystackClient(
+        base_url or settings.PAYSTACK_BASE_URL,
+        settings.PAYSTACK_SECRET_KEY,
+        timeout=(settings.PAYSTACK_CONNECT_TIMEOUT, settings.PAYSTACK_READ_TIMEOUT),
+        max_retries=settings.PAYSTACK_MAX_RETRIES,
+        pool_size=pool_size or settings.PAYSTACK_POOL_SIZE,
+        breaker=breaker,
+        bulkhead=bulkhead,
+    )
+
+
+def get_client():
+    """The process-wide client, built from settings on first use."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = client_from_settings()
+        return _client
+
+
+def reset_client():
+    """Drop the shared client so the next call rebuilds it, e.g. after changing settings."""
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+        _client = None
+
+
+# General function to make API requests
+def make_request(method, endpoint, payload=None, operation=None):
+    """Helper function to make requests to Paystack API."""
+    if method not in ("GET", "POST"):
+        logger.error(f"Unsupported request method: {method}")
+        return {"status": False, "message": "Invalid request method"}
+    return get_client().request(method, endpoint, payload, operation=operation)
 
 
 def initialize_transaction(email, amount):
@@ -53,7 +254,7 @@ def initialize_transaction(email, amount):
     }
 
     logger.info(f"Initializing transaction for {email} with amount {amount}")
-    return make_request("POST", endpoint, payload)
+    return make_request("POST", endpoint, payload, operation="transaction.initialize")
 
 
 def verify_transaction(reference):
@@ -61,4 +262,4 @@ def verify_transaction(reference):
     endpoint = f"/transaction/verify/{reference}"
 
     logger.info(f"Verifying transaction reference: {reference}")
-    return make_request("GET", endpoint)
+    return make_request("GET", endpoint, operation="transaction.verify")
@@ -0,0 +1,125 @@
+"""
+Reconciliation of transactions still pending with Paystack.
+
+Pending transactions older than a minimum age are paged through oldest first
+by keyset on (created_at, id), so every page costs the same however far the
+sweep has got. Each page is verified against Paystack on a thread pool, and
+the outcomes are written with one UPDATE per status. The position after each
+completed page is saved in a ReconciliationCheckpoint, so a run that stops
+(Ctrl-C, a deploy, Paystack's circuit opening) resumes where it left off; a
+run that reaches the end clears it and the next one starts over.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import ReconciliationCheckpoint, Transaction, TransactionStatus
+from .paystack import PaystackUnavailable
+
+logger = logging.getLogger(__name__)
+
+# Paystack statuses that settle a transaction; anything else (abandoned, ongoing, ...) stays pending
+SETTLED = {
+    "success": TransactionStatus.SUCCESS,
+    "failed": TransactionStatus.FAILED,
+    "reversed": TransactionStatus.FAILED,
+}
+
+
+class Reconciler:
+
+    def __init__(self, client, batch_size=200, concurrency=8, min_age=None, checkpoint="default"):
+        self.client = client
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.min_age = min_age
+        self.checkpoint_name = checkpoint
+        self.stats = {"checked": 0, "success": 0, "failed": 0, "unchanged": 0, "errors": 0}
+
+    def pending_page(self, checkpoint, cutoff):
+        queryset = Transaction.objects.filter(status=TransactionStatus.PENDING, created_at__lte=cutoff)
+        if checkpoint.last_created_at is not None:
+            queryset = queryset.filter(
+                Q(created_at__gt=checkpoint.last_created_at)
+                | Q(created_at=checkpoint.last_created_at, id__gt=checkpoint.last_id)
+            )
+        return list(
+            queryset.order_by("created_at", "id").values_list("id", "reference", "created_at")[:self.batch_size]
+        )
+
+    def verify(self, reference):
+        try:
+            return self.client.request("GET", f"/transaction/verify/{reference}", operation="transaction.verify")
+        finally:
+            connection.close()
+
+    def run(self, restart=False, limit=None):
+        """Reconcile until the backlog is done, `limit` transactions were checked, or Paystack is unavailable."""
+        checkpoint, _ = ReconciliationCheckpoint.objects.get_or_create(name=self.checkpoint_name)
+        if restart:
+            checkpoint.last_created_at = checkpoint.last_id = None
+        # Fixed for the whole run, so rows created while it runs don't extend it
+        cutoff = timezone.now() - self.min_age if self.min_age else timezone.now()
+
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="reconcile") as pool:
+            while limit is None or self.stats["checked"] < limit:
+                page = self.pending_page(checkpoint, cutoff)
+                if limit is not None:
+                    page = page[:limit - self.stats["checked"]]
+                if not page:
+                    # Done: the next run starts from the oldest pending transaction again
+                    checkpoint.last_created_at = checkpoint.last_id = None
+                    checkpoint.save()
+                    return self.stats
+                try:
+                    results = list(pool.map(self.verify, [reference for _, reference, _ in page]))
+                except PaystackUnavailable as e:
+                    logger.warning(f"Reconciliation paused, Paystack unavailable: {e}")
+                    break
+
+                self.apply(page, results)
+                checkpoint.last_id, _, checkpoint.last_created_at = page[-1]
+                checkpoint.save()
+        return self.stats
+
+    def apply(self, page, results):
+        now = timezone.now()
+        failed_ids, paid = [], {}
+        for (transaction_id, reference, _), result in zip(page, results):
+            self.stats["checked"] += 1
+            if not result.get("status"):
+                self.stats["errors"] += 1
+                continue
+            data = result.get("data") or {}
+            settled = SETTLED.get(data.get("status"))
+            if settled == TransactionStatus.SUCCESS:
+                paid_at = data.get("paid_at") or data.get("paidAt")
+                paid[transaction_id] = (parse_datetime(paid_at) if paid_at else None) or now
+            elif settled == TransactionStatus.FAILED:
+                failed_ids.append(transaction_id)
+            else:
+                self.stats["unchanged"] += 1
+
+        with transaction.atomic():
+            # Only rows still pending: a webhook may have settled some while we were asking
+            if failed_ids:
+                self.stats["failed"] += Transaction.objects.filter(
+                    id__in=failed_ids, status=TransactionStatus.PENDING
+                ).update(status=TransactionStatus.FAILED, updated_at=now)
+            if paid:
+                rows = list(
+                    Transaction.objects.select_for_update()
+                    .filter(id__in=paid, status=TransactionStatus.PENDING)
+                    .only("id", "status", "paid_at", "has_made_payment", "updated_at")
+                )
+                for row in rows:
+                    row.status = TransactionStatus.SUCCESS
+                    row.paid_at = paid[row.id]
+                    row.has_made_payment = True
+                    row.updated_at = now
+                Transaction.objects.bulk_update(rows, ["status", "paid_at", "has_made_payment", "updated_at"])
+                self.stats["success"] += len(rows)
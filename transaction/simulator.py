@@ -0,0 +1,172 @@
+"""
+A local stand-in for the Paystack API, for benchmarks and fault-injection runs.
+
+    simulator = PaystackSimulator(latency=0.02)
+    base_url = simulator.start()      # http://127.0.0.1:<port>
+    PaystackClient(base_url, "sk_test")...
+    simulator.error_rate = 0.5        # degrade it while it runs
+    simulator.stop()
+
+Only the endpoints this project calls are implemented, with Paystack's
+response envelope. Latency, jitter and error rate can be changed at any time;
+request and connection counts show whether callers reuse connections.
+"""
+import json
+import random
+import re
+import socket
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class SimulatorHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real API
+
+    def setup(self):
+        super().setup()
+        # Headers and body go out as separate writes; don't let Nagle hold the body back
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.server.simulator.count("connections")
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.handle_call("GET")
+
+    def do_POST(self):
+        self.handle_call("POST")
+
+    def handle_call(self, method):
+        simulator = self.server.simulator
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length) or b"{}") if length else {}
+        simulator.count("requests")
+
+        status, payload = simulator.respond(method, self.path, body)
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class SimulatorServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128  # the default backlog of 5 drops connection bursts
+
+    def handle_error(self, request, client_address):
+        # Callers that time out hang up mid-response; that is expected here
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class PaystackSimulator:
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, host="127.0.0.1", port=0, default_outcome="success"):
+        self.latency = latency  # seconds added to every response
+        self.jitter = jitter  # up to this much more, uniformly
+        self.error_rate = error_rate  # share of calls answered with a 503
+        self.address = (host, port)
+        # reference -> Paystack transaction status served by verify (None: unknown reference);
+        # other references get `default_outcome`, or its result if it is a callable
+        self.outcomes = {}
+        self.default_outcome = default_outcome
+        # reference -> transfer, as created by /transfer and /transfer/bulk; `transfer_status` is
+        # what new transfers report. Resending a known reference counts as a duplicate.
+        self.transfers = {}
+        self.transfer_status = "success"
+        self.counters = {"connections": 0, "requests": 0, "errors": 0, "transfers": 0, "duplicates": 0}
+        self.lock = threading.Lock()
+        self.server = None
+
+    def start(self):
+        self.server = SimulatorServer(self.address, SimulatorHandler)
+        self.server.simulator = self
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+
+    def count(self, counter, n=1):
+        with self.lock:
+            self.counters[counter] += n
+
+    def reset_counters(self):
+        with self.lock:
+            self.counters = dict.fromkeys(self.counters, 0)
+
+    def respond(self, method, path, body):
+        delay = self.latency + random.uniform(0, self.jitter)
+        if delay:
+            time.sleep(delay)
+        if self.error_rate and random.random() < self.error_rate:
+            self.count("errors")
+            return 503, {"status": False, "message": "Service unavailable"}
+
+        if method == "POST" and path == "/transaction/initialize":
+            reference = uuid.uuid4().hex[:16]
+            return 200, {"status": True, "message": "Authorization URL created", "data": {
+                "authorization_url": f"https://checkout.paystack.com/{reference}",
+                "access_code": reference,
+                "reference": reference,
+            }}
+
+        match = re.fullmatch(r"/transaction/verify/([^/?]+)", path)
+        if method == "GET" and match:
+            reference = match.group(1)
+            if reference in self.outcomes:
+                outcome = self.outcomes[reference]
+            else:
+                outcome = self.default_outcome(reference) if callable(self.default_outcome) else self.default_outcome
+            if outcome is None:
+                return 404, {"status": False, "message": "Transaction reference not found"}
+            return 200, {"status": True, "message": "Verification successful", "data": {
+                "reference": reference,
+                "status": outcome,
+                "amount": 100000,
+                "currency": "NGN",
+                "paid_at": "2024-01-01T00:00:00.000Z" if outcome == "success" else None,
+            }}
+
+        if method == "POST" and path == "/transfer":
+            return 200, {"status": True, "message": "Transfer has been queued", "data": self.transfer(body)}
+
+        if method == "POST" and path == "/transfer/bulk":
+            transfers = body.get("transfers") or []
+            return 200, {"status": True, "message": f"{len(transfers)} transfers queued.",
+                         "data": [self.transfer(item) for item in transfers]}
+
+        match = re.fullmatch(r"/transfer/verify/([^/?]+)", path)
+        if method == "GET" and match:
+            with self.lock:
+                transfer = self.transfers.get(match.group(1))
+            if transfer is None:
+                return 404, {"status": False, "message": "Transfer not found"}
+            return 200, {"status": True, "message": "Transfer retrieved", "data": transfer}
+
+        return 404, {"status": False, "message": f"No route for {method} {path}"}
+
+    def transfer(self, item):
+        reference = item.get("reference") or uuid.uuid4().hex
+        with self.lock:
+            if reference in self.transfers:
+                self.counters["duplicates"] += 1
+                return self.transfers[reference]
+            self.counters["transfers"] += 1
+            transfer = self.transfers[reference] = {
+                "reference": reference,
+                "recipient": item.get("recipient"),
+                "amount": item.get("amount"),
+                "currency": "NGN",
+                "transfer_code": f"TRF_{uuid.uuid4().hex[:12]}",
+                "status": self.transfer_status,
+            }
+            return transfer
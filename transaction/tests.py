@@ -1,3 +1,267 @@
-from django.test import TestCase
+import hashlib
+import hmac
+import json
+from concurrent.futures import as_completed
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from cyriox.resilience import Bulkhead, CircuitBreaker
+from .inbox import process_pending_events
+from .models import (
+    Payout, PayoutStatus, PaystackWebhookEvent, ReconciliationCheckpoint, Transaction, TransactionStatus,
+    WebhookEventStatus,
+)
+from .paystack import PaystackClient, PaystackUnavailable
+from . import payouts
+from .payouts import process_pending_payouts
+from .reconcile import Reconciler
+from .simulator import PaystackSimulator
+
+
+class PaystackClientTests(SimpleTestCase):
+
+    def setUp(self):
+        self.simulator = PaystackSimulator()
+        self.client = PaystackClient(self.simulator.start(), "sk_test", timeout=(1, 0.3), backoff=0)
+        self.addCleanup(self.simulator.stop)
+        self.addCleanup(self.client.close)
+
+    def test_reuses_connections(self):
+        for i in range(5):
+            self.assertTrue(self.client.request("GET", f"/transaction/verify/ref{i}")["status"])
+        self.assertEqual(self.simulator.counters["connections"], 1)
+
+    def test_retries_idempotent_calls_only(self):
+        self.simulator.error_rate = 1
+        self.assertFalse(self.client.request("GET", "/transaction/verify/ref")["status"])
+        self.assertEqual(self.simulator.counters["requests"], 3)
+
+        self.simulator.reset_counters()
+        self.assertFalse(self.client.request("POST", "/transaction/initialize", {"amount": 100})["status"])
+        self.assertEqual(self.simulator.counters["requests"], 1)
+
+    def test_read_timeout_bounds_the_call(self):
+        self.simulator.latency = 2
+        self.client.max_retries = 0
+        result = self.client.request("GET", "/transaction/verify/ref", operation="verify")
+        self.assertEqual(result["message"], "Paystack API request failed")
+        self.assertLess(self.client.metrics.snapshot()["verify"]["p50_ms"], 1000)
+
+
+class CircuitBreakerTests(SimpleTestCase):
+
+    def setUp(self):
+        self.now = 0.0
+        self.breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10, clock=lambda: self.now)
+
+    def test_opens_after_consecutive_failures(self):
+        self.breaker.record_failure()
+        self.breaker.record_success()
+        self.breaker.record_failure()
+        self.assertTrue(self.breaker.allow())
+        self.breaker.record_failure()
+        self.assertFalse(self.breaker.allow())
+        self.assertEqual(self.breaker.retry_after(), 11)
+
+    def test_half_open_lets_one_probe_through(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.now = 10
+        self.assertTrue(self.breaker.allow())
+        self.assertFalse(self.breaker.allow())
+        self.breaker.record_failure()
+        self.assertFalse(self.breaker.allow())
+
+        self.now = 20
+        self.assertTrue(self.breaker.allow())
+        self.breaker.record_success()
+        self.assertTrue(self.breaker.allow())
+        self.assertTrue(self.breaker.allow())
+
+    def test_open_client_fails_fast(self):
+        simulator = PaystackSimulator(error_rate=1)
+        client = PaystackClient(simulator.start(), "sk_test", max_retries=0, breaker=self.breaker,
+                                bulkhead=Bulkhead(1))
+        self.addCleanup(simulator.stop)
+        self.addCleanup(client.close)
+        for _ in range(2):
+            client.request("POST", "/transaction/initialize")
+        with self.assertRaises(PaystackUnavailable):
+            client.request("POST", "/transaction/initialize")
+        self.assertEqual(simulator.counters["requests"], 2)
+        # The refused call gave its bulkhead slot back
+        self.assertTrue(client.bulkhead.acquire())
+
+    def test_unexpected_error_frees_the_probe_slot(self):
+        client = PaystackClient("http://paystack.invalid", "sk_test", breaker=self.breaker)
+        self.addCleanup(client.close)
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.now = 10
+        with mock.patch.object(client, "send", side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                client.request("GET", "/transaction/verify/ref")
+        self.assertEqual(self.breaker.state, CircuitBreaker.HALF_OPEN)
+        self.assertTrue(self.breaker.allow())
+
+
+@override_settings(PAYSTACK_SECRET_KEY="sk_test_webhook", PAYSTACK_WEBHOOK_INLINE_WORKER=False)
+class WebhookInboxTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        user = get_user_model().objects.create(email="payer@example.com", username="payer")
+        cls.transaction = Transaction.objects.create(user=user, reference="TRX-1", amount=100)
+
+    def deliver(self, event, event_id, signature=None):
+        body = json.dumps({"event": event, "data": {"id": event_id, "reference": "TRX-1"}}).encode()
+        signature = signature or hmac.new(b"sk_test_webhook", body, hashlib.sha512).hexdigest()
+        return self.client.post("/transaction/paystack-webhook/", body, content_type="application/json",
+                                headers={"X-Paystack-Signature": signature})
+
+    def test_ack_stores_each_event_once(self):
+        for _ in range(3):
+            with self.assertNumQueries(1):
+                self.assertEqual(self.deliver("charge.success", 1).status_code, 200)
+        self.assertEqual(PaystackWebhookEvent.objects.count(), 1)
+        self.transaction.refresh_from_db()
+        self.assertEqual(self.transaction.status, TransactionStatus.PENDING)
+
+    def test_rejects_bad_signature(self):
+        self.assertEqual(self.deliver("charge.success", 1, signature="0" * 128).status_code, 403)
+        self.assertFalse(PaystackWebhookEvent.objects.exists())
+
+    def test_processing_is_idempotent(self):
+        self.deliver("charge.success", 1)
+        self.deliver("charge.failed", 2)
+        self.deliver("charge.dispute.create", 3)
+        self.assertEqual(process_pending_events(), 3)
+        self.assertEqual(process_pending_events(), 0)
+
+        self.transaction.refresh_from_db()
+        self.assertEqual(self.transaction.status, TransactionStatus.SUCCESS)
+        self.assertTrue(self.transaction.has_made_payment)
+        self.assertEqual(
+            dict(PaystackWebhookEvent.objects.values_list("event", "status")),
+            {"charge.success": WebhookEventStatus.PROCESSED, "charge.failed": WebhookEventStatus.PROCESSED,
+             "charge.dispute.create": WebhookEventStatus.IGNORED},
+        )
+
+
+    def test_transfer_events_settle_payouts(self):
+        payout = Payout.objects.create(user=self.transaction.user, amount=100, recipient_code="RCP_1",
+                                       status=PayoutStatus.SUBMITTED)
+        for event_id, event in enumerate(["transfer.success", "transfer.failed"]):
+            body = json.dumps({"event": event, "data": {"id": event_id, "reference": payout.reference}}).encode()
+            signature = hmac.new(b"sk_test_webhook", body, hashlib.sha512).hexdigest()
+            self.client.post("/transaction/paystack-webhook/", body, content_type="application/json",
+                             headers={"X-Paystack-Signature": signature})
+        process_pending_events()
+        payout.refresh_from_db()
+        # A late failure doesn't undo a success
+        self.assertEqual(payout.status, PayoutStatus.SUCCESSFUL)
+
+class ReconcilerTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        user = get_user_model().objects.create(email="owed@example.com", username="owed")
+        old = timezone.now() - timedelta(hours=2)
+        for reference in ("PAID", "DECLINED", "ABANDONED", "SETTLED", "FRESH"):
+            Transaction.objects.create(user=user, reference=reference, amount=100)
+        Transaction.objects.exclude(reference="FRESH").update(created_at=old)
+        Transaction.objects.filter(reference="SETTLED").update(status=TransactionStatus.SUCCESS)
+
+    def setUp(self):
+        self.simulator = PaystackSimulator()
+        self.simulator.outcomes = {"PAID": "success", "DECLINED": "failed", "ABANDONED": "abandoned"}
+        self.client = PaystackClient(self.simulator.start(), "sk_test", backoff=0)
+        self.addCleanup(self.simulator.stop)
+        self.addCleanup(self.client.close)
+
+    def statuses(self):
+        return dict(Transaction.objects.values_list("reference", "status"))
+
+    def test_settles_old_pending_transactions(self):
+        stats = Reconciler(self.client, batch_size=2, concurrency=2, min_age=timedelta(hours=1)).run()
+        self.assertEqual(stats, {"checked": 3, "success": 1, "failed": 1, "unchanged": 1, "errors": 0})
+        self.assertEqual(self.statuses(), {
+            "PAID": TransactionStatus.SUCCESS, "DECLINED": TransactionStatus.FAILED,
+            "ABANDONED": TransactionStatus.PENDING, "SETTLED": TransactionStatus.SUCCESS,
+            "FRESH": TransactionStatus.PENDING,
+        })
+        # Only the three old pending ones were asked about, and the finished run cleared its checkpoint
+        self.assertEqual(self.simulator.counters["requests"], 3)
+        self.assertIsNone(ReconciliationCheckpoint.objects.get(name="default").last_id)
+
+    def test_resumes_from_checkpoint(self):
+        Reconciler(self.client, batch_size=1, concurrency=1, min_age=timedelta(hours=1)).run(limit=1)
+        self.simulator.reset_counters()
+        stats = Reconciler(self.client, batch_size=1, concurrency=1, min_age=timedelta(hours=1)).run()
+        self.assertEqual(stats["checked"], 2)
+        self.assertEqual(self.simulator.counters["requests"], 2)
+
+
+class PayoutEngineTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create(email="seller@example.com", username="seller")
+        for i in range(5):
+            Payout.objects.create(user=cls.user, amount=150, recipient_code=f"RCP_{i}")
+
+    def setUp(self):
+        self.simulator = PaystackSimulator()
+        self.client = PaystackClient(self.simulator.start(), "sk_test", backoff=0)
+        self.addCleanup(self.simulator.stop)
+        self.addCleanup(self.client.close)
+
+    def test_sends_bulk_transfers(self):
+        self.assertEqual(process_pending_payouts(self.client, batch_size=2, concurrency=2), 4)
+        self.assertEqual(process_pending_payouts(self.client, batch_size=2, concurrency=2), 1)
+        self.assertEqual(process_pending_payouts(self.client, batch_size=2, concurrency=2), 0)
+        self.assertEqual(self.simulator.counters["requests"], 3)
+        self.assertEqual(self.simulator.counters["transfers"], 5)
+        self.assertEqual(set(Payout.objects.values_list("status", flat=True)), {PayoutStatus.SUCCESSFUL})
+        self.assertEqual(self.simulator.transfers[Payout.objects.first().reference]["amount"], 15000)
+
+    def test_reclaimed_payout_is_looked_up_before_resending(self):
+        # A worker sent this one and died before saving the outcome
+        sent = Payout.objects.first()
+        self.simulator.transfer({"reference": sent.reference, "amount": 15000})
+        Payout.objects.filter(pk=sent.pk).update(
+            status=PayoutStatus.PROCESSING, attempts=1, claimed_at=timezone.now() - timedelta(hours=1)
+        )
+        self.simulator.reset_counters()
+        process_pending_payouts(self.client, batch_size=10, concurrency=1)
+        self.assertEqual(self.simulator.counters["transfers"], 4)
+        self.assertEqual(self.simulator.counters["duplicates"], 0)
+        self.assertEqual(Payout.objects.filter(status=PayoutStatus.SUCCESSFUL).count(), 5)
+
+    def test_failed_batch_waits_before_retrying(self):
+        self.simulator.error_rate = 1
+        self.assertEqual(process_pending_payouts(self.client, batch_size=10, concurrency=1), 5)
+        payout = Payout.objects.first()
+        self.assertEqual((payout.status, payout.attempts), (PayoutStatus.PENDING, 1))
+        self.assertTrue(payout.last_error)
+        self.assertEqual(process_pending_payouts(self.client, batch_size=10, concurrency=1), 0)
+
+    def test_webhook_during_submission_is_not_overwritten(self):
+        reversed_payout = Payout.objects.first()
+
+        def webhook_lands_first(futures):
+            for future in as_completed(futures):
+                # Paystack has answered; its webhook is applied before the worker writes the batch back
+                Payout.objects.filter(pk=reversed_payout.pk).update(
+                    status=PayoutStatus.FAILED, completed_at=timezone.now()
+                )
+                yield future
+
+        with mock.patch.object(payouts, "as_completed", webhook_lands_first):
+            self.assertEqual(process_pending_payouts(self.client, batch_size=10, concurrency=1), 5)
+        self.assertEqual(Payout.objects.get(pk=reversed_payout.pk).status, PayoutStatus.FAILED)
+        self.assertEqual(Payout.objects.filter(status=PayoutStatus.SUCCESSFUL).count(), 4)
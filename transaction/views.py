@@ -1,7 +1,7 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from rest_framework.decorators import api_view
+from rest_framework.decorators import api_view, authentication_classes, permission_classes
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
 from django.utils import timezone
@@ -9,10 +9,11 @@ from django.http import JsonResponse
 from django.contrib.auth import get_user_model
 from django.conf import settings
 from .models import Transaction
-from .paystack import initialize_transaction, verify_transaction
+from .inbox import store_event
+from .paystack import PaystackUnavailable, initialize_transaction, verify_transaction
 from .serializers import PaystackPaymentSerializer, TransactionSerializer
 from user.models import User
-import requests
+import json
 import logging
 import hmac
 import hashlib
@@ -20,7 +21,17 @@ import hashlib
 logger = logging.getLogger(__name__)
 User = get_user_model()
 
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import AllowAny, IsAuthenticated
+
+
+def provider_unavailable(exc):
+    """503 for a Paystack call refused by its circuit breaker or bulkhead, without waiting on Paystack."""
+    response = Response(
+        {"error": "Payment provider temporarily unavailable", "retry_after": exc.retry_after},
+        status=status.HTTP_503_SERVICE_UNAVAILABLE,
+    )
+    response["Retry-After"] = str(exc.retry_after)
+    return response
 
 
 class PaystackPaymentInitView(APIView):
@@ -57,6 +68,8 @@ class PaystackPaymentInitView(APIView):
                 "details": response
             }, status=status.HTTP_400_BAD_REQUEST)
 
+        except PaystackUnavailable as e:
+            return provider_unavailable(e)
         except Exception as e:
             logger.error(f"Error initializing Paystack transaction: {str(e)}")
             return Response({"error": "Internal server error"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -64,49 +77,34 @@ class PaystackPaymentInitView(APIView):
 
 @csrf_exempt
 @api_view(["POST"])
+@authentication_classes([])
+@permission_classes([AllowAny])
 def paystack_webhook(request):
-    """Securely handle Paystack Webhook Events"""
-    try:
-        # Verify webhook signature
-        signature = request.headers.get("X-Paystack-Signature")
-        secret = settings.PAYSTACK_SECRET_KEY.encode()
-        computed_hash = hmac.new(secret, request.body, hashlib.sha512).hexdigest()
-
-        if signature != computed_hash:
-            logger.warning("Invalid Paystack webhook signature.")
-            return Response({"error": "Invalid signature"}, status=status.HTTP_403_FORBIDDEN)
+    """
+    Securely receive Paystack Webhook Events.
+
+    The signature is the only authentication. A verified event is stored in
+    the inbox and acknowledged straight away; transaction.inbox applies it in
+    the background, and redeliveries of an event are dropped on insert.
+    """
+    # Verify webhook signature
+    signature = request.headers.get("X-Paystack-Signature", "")
+    secret = (settings.PAYSTACK_SECRET_KEY or "").encode()
+    computed_hash = hmac.new(secret, request.body, hashlib.sha512).hexdigest()
+
+    if not secret or not hmac.compare_digest(signature, computed_hash):
+        logger.warning("Invalid Paystack webhook signature.")
+        return Response({"error": "Invalid signature"}, status=status.HTTP_403_FORBIDDEN)
 
-        data = request.data
-        event = data.get("event")
-        reference = data["data"].get("reference")
-
-        transaction = Transaction.objects.filter(reference=reference).first()
-
-        if not transaction:
-            logger.warning(f"Webhook received for unknown reference: {reference}")
-            return Response({"status": "ignored"}, status=status.HTTP_200_OK)
-
-        if event == "charge.success":
-            transaction.status = "success"
-            transaction.paid_at = timezone.now()
-            transaction.save()
-
-            user = transaction.user
-            user.has_made_payment = True
-            user.save()
-
-            logger.info(f"Transaction {reference} marked as successful via webhook.")
-
-        elif event == "charge.failed":
-            transaction.status = "failed"
-            transaction.save()
-            logger.info(f"Transaction {reference} marked as failed.")
-
-        return Response({"status": "success"}, status=status.HTTP_200_OK)
+    try:
+        payload = json.loads(request.body)
+    except ValueError:
+        payload = None
+    if not isinstance(payload, dict):
+        return Response({"error": "Invalid payload"}, status=status.HTTP_400_BAD_REQUEST)
 
-    except Exception as e:
-        logger.error(f"Webhook error: {str(e)}")
-        return Response({"error": "Internal server error"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    store_event(payload, request.body)
+    return Response({"status": "success"}, status=status.HTTP_200_OK)
 
 
 class TransactionStatusView(APIView):
@@ -125,14 +123,10 @@ class VerifyPaystackPaymentView(APIView):
     """Verify Paystack Transaction via Reference"""
 
     def get(self, request, reference):
-        url = f"https://api.paystack.co/transaction/verify/{reference}"
-        headers = {
-            "Authorization": f"Bearer {settings.PAYSTACK_SECRET_KEY}",
-            "Content-Type": "application/json",
-        }
-
-        response = requests.get(url, headers=headers)
-        data = response.json()
+        try:
+            data = verify_transaction(reference)
+        except PaystackUnavailable as e:
+            return provider_unavailable(e)
 
         if data.get("status") and data["data"]["status"] == "success":
             transaction = Transaction.objects.filter(reference=reference).first()
@@ -0,0 +1,128 @@
+"""
+JWT authentication without a user query per request.
+
+Access tokens issued by user.tokens carry the user's role, active and staff
+flags as signed claims, and ClaimsJWTAuthentication builds request.user
+from them: a User whose other fields are deferred, so the row is only
+loaded if a view actually reads one of them. Filtering by or
+assigning request.user needs nothing but its pk.
+
+Claims go stale when a user's role or is_active changes. Saving such a
+change, or writing it with User.objects...update() (see UserQuerySet),
+records the time under a shared cache key, and tokens issued before it fall
+back to loading the user the way the stock JWTAuthentication does (so a
+deactivated user is refused). Raw SQL that changes those columns must call
+mark_claims_changed() itself. Each process keeps those timestamps in a
+small LRU for AUTH_CLAIMS_TTL seconds, so a hot user costs neither a query
+nor a cache round trip; another process notices a change within that TTL.
+That needs a cache every process shares (CACHE_IS_SHARED): with a
+per-process one a change would never reach the others, so every token is
+authenticated the stock way. So are tokens issued before claims existed.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import DEFERRED
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from .models import User
+
+# Shared by every process: when a user's role or is_active last changed
+CLAIMS_CHANGED_KEY = "auth:claims-changed:{}"
+
+
+class TTLCache:
+    """A thread-safe, size-bounded LRU whose entries expire after `ttl` seconds."""
+
+    def __init__(self, maxsize, ttl, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def get(self, key, default=None):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[0] <= self.clock():
+                self.misses += 1
+                return default
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = (self.clock() + self.ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.hits = self.misses = 0
+
+
+# user id -> time its claims last changed (0 if not since the cache key expired)
+claims_changed = TTLCache(settings.AUTH_CLAIMS_CACHE_SIZE, settings.AUTH_CLAIMS_TTL)
+
+
+def mark_claims_changed(user_id):
+    """Make tokens issued before now fall back to loading the user."""
+    # Kept for as long as a token issued before the change can live
+    cache.set(CLAIMS_CHANGED_KEY.format(user_id), int(time.time()),
+              timeout=int(api_settings.REFRESH_TOKEN_LIFETIME.total_seconds()))
+    claims_changed.delete(str(user_id))
+
+
+def claims_changed_at(user_id):
+    changed_at = claims_changed.get(user_id)
+    if changed_at is None:
+        changed_at = cache.get(CLAIMS_CHANGED_KEY.format(user_id)) or 0
+        claims_changed.set(user_id, changed_at)
+    return changed_at
+
+
+def claims_user(user_id, claims):
+    """A User built from token claims; any other field is loaded from the database on first access."""
+    values = {
+        "id": User._meta.pk.to_python(user_id),
+        "role": claims["role"],
+        "is_active": claims.get("is_active", True),
+        "is_staff": claims.get("is_staff", False),
+        "is_superuser": claims.get("is_superuser", False),
+    }
+    fields = User._meta.concrete_fields
+    return User.from_db(
+        User.objects.db, [f.attname for f in fields], [values.get(f.attname, DEFERRED) for f in fields]
+    )
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+
+    def get_user(self, validated_token):
+        try:
+            user_id = str(validated_token[api_settings.USER_ID_CLAIM])
+        except KeyError:
+            raise InvalidToken("Token contained no recognizable user identification")
+
+        if (not settings.CACHE_IS_SHARED or "role" not in validated_token
+                or validated_token.get("iat", 0) <= claims_changed_at(user_id)):
+            # No way to hear about changes, issued before claims existed, or
+            # issued before the user's role or is_active changed
+            return super().get_user(validated_token)
+        user = claims_user(user_id, validated_token)
+        if not user.is_active:
+            raise AuthenticationFailed("User is inactive", code="user_inactive")
+        return user
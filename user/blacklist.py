@@ -0,0 +1,183 @@
+"""
+Refresh-token blacklist.
+
+Every token refresh blacklists the token it rotates out, so the
+token_blacklist tables grow by a row in each on every refresh and are only ever
+read by jti. Two things keep that cheap:
+
+- A Bloom filter of blacklisted jtis in each process answers "not
+  blacklisted" (every legitimate refresh) without probing the table; a
+  possible hit is confirmed against it. The filter is built from the
+  unexpired tokens only. Whenever the shared version bumped by `note_blacklisted()` moves,
+  and at least every TOKEN_BLACKLIST_FILTER_MAX_AGE seconds regardless (for
+  rows written without it, through the admin say), it reads the rows added
+  since its last sync, which sit at the tail of the id index, so the cost
+  doesn't grow with the table the way a jti lookup in a table far bigger
+  than memory does. It is rebuilt once it holds more than
+  TOKEN_BLACKLIST_FILTER_CAPACITY jtis. Without a shared cache
+  (CACHE_IS_SHARED) no process would hear of another's blacklisting but by
+  that timer, so every check goes to the table instead.
+- `prune_expired_tokens()` (`manage.py prune_tokens`, run from cron) deletes
+  expired outstanding and blacklisted tokens in batches, on an index on
+  expires_at, instead of simplejwt's single unbounded delete.
+
+The version is bumped after the blacklisting commits, so another process can
+accept a just-rotated token for the moment in between: the same window two
+concurrent refreshes of one token already have. A token blacklisted without
+bumping it can be accepted for up to TOKEN_BLACKLIST_FILTER_MAX_AGE seconds.
+"""
+import hashlib
+import math
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+VERSION_KEY = "auth:blacklist-version"
+# Filters catch up by id; this often they also reread a window by time, for a row
+# whose id was allocated before one they have seen but that committed after it
+SWEEP_INTERVAL = timedelta(seconds=30)
+
+
+class BloomFilter:
+    """A fixed-size Bloom filter for string keys."""
+
+    def __init__(self, capacity, error_rate):
+        self.size = max(64, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def positions(self, key):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        a, b = int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+        return [(a + i * b) % self.size for i in range(self.hashes)]
+
+    def add(self, key):
+        for position in self.positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self.positions(key))
+
+
+class BlacklistFilter:
+    """The process's Bloom filter of blacklisted jtis, kept in step with the table."""
+
+    def __init__(self, capacity, error_rate, max_age, clock=time.monotonic):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.max_age = max_age
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.bloom = None
+        self.version = None
+        self.synced_at = None
+        self.last_id = 0
+        self.swept_at = None
+        self.hits = self.misses = self.syncs = 0
+
+    def current_version(self):
+        version = cache.get(VERSION_KEY)
+        if version is None:
+            # A fresh, never-used value, so an evicted version can't look unchanged
+            cache.add(VERSION_KEY, time.time_ns(), timeout=None)
+            version = cache.get(VERSION_KEY)
+        return version
+
+    def is_current(self, version):
+        return self.bloom is not None and version == self.version and self.clock() - self.synced_at < self.max_age
+
+    def sync(self):
+        version = self.current_version()
+        if self.is_current(version):
+            return
+        with self.lock:
+            if self.is_current(version):
+                return
+            now = timezone.now()
+            if self.bloom is None or self.bloom.count > self.capacity:
+                bloom, last_id, swept_at = BloomFilter(self.capacity, self.error_rate), 0, now
+                rows = BlacklistedToken.objects.filter(token__expires_at__gt=now)
+            else:
+                bloom, last_id, swept_at = self.bloom, self.last_id, self.swept_at
+                # Only the rows added since: the tail of the id index, however big the table is
+                catch_up = Q(id__gt=last_id)
+                if now - swept_at >= SWEEP_INTERVAL:
+                    catch_up |= Q(blacklisted_at__gte=swept_at - SWEEP_INTERVAL)
+                    swept_at = now
+                rows = BlacklistedToken.objects.filter(catch_up)
+            for row_id, jti in rows.values_list("id", "token__jti").iterator():
+                bloom.add(jti)
+                last_id = max(last_id, row_id)
+            self.bloom, self.version, self.last_id, self.swept_at = bloom, version, last_id, swept_at
+            self.synced_at = self.clock()
+            self.syncs += 1
+
+    def might_contain(self, jti):
+        self.sync()
+        found = jti in self.bloom
+        if found:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return found
+
+    def add(self, jti):
+        with self.lock:
+            if self.bloom is not None:
+                self.bloom.add(jti)
+
+    def reset(self):
+        with self.lock:
+            self.bloom = self.version = self.swept_at = self.synced_at = None
+            self.last_id = 0
+            self.hits = self.misses = self.syncs = 0
+
+
+blacklist_filter = BlacklistFilter(
+    settings.TOKEN_BLACKLIST_FILTER_CAPACITY, settings.TOKEN_BLACKLIST_FILTER_ERROR_RATE,
+    settings.TOKEN_BLACKLIST_FILTER_MAX_AGE,
+)
+
+
+def is_blacklisted(jti):
+    if settings.CACHE_IS_SHARED and not blacklist_filter.might_contain(jti):
+        return False
+    return BlacklistedToken.objects.filter(token__jti=jti).exists()
+
+
+def note_blacklisted(jti):
+    """Put a newly blacklisted jti in this process's filter now and in every other one after commit."""
+    blacklist_filter.add(jti)
+
+    def bump():
+        try:
+            cache.incr(VERSION_KEY)
+        except ValueError:
+            cache.set(VERSION_KEY, time.time_ns(), timeout=None)
+
+    transaction.on_commit(bump)
+
+
+def prune_expired_tokens(batch_size=1000, now=None):
+    """Delete expired outstanding tokens and their blacklist entries, a batch per transaction. Returns the count."""
+    now = now or timezone.now()
+    deleted = 0
+    while True:
+        ids = list(
+            OutstandingToken.objects.filter(expires_at__lte=now).order_by().values_list("id", flat=True)[:batch_size]
+        )
+        if not ids:
+            return deleted
+        with transaction.atomic():
+            BlacklistedToken.objects.filter(token_id__in=ids).delete()
+            OutstandingToken.objects.filter(id__in=ids).delete()
+        deleted += len(ids)
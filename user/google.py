@@ -1,10 +1,146 @@
+"""
+Google sign-in.
+
+ID tokens are verified here, against Google's published signing keys, rather
+than by a call to Google's tokeninfo endpoint per sign-in. The keys come from a
+key source: JWKSKeySource fetches GOOGLE_JWKS_URL, keeps the set for
+GOOGLE_JWKS_LIFESPAN seconds and refreshes it in the background after that,
+so no sign-in waits on Google unless it presents a key the process hasn't seen.
+A failed refresh keeps the keys it has, so sign-in stays up while Google is
+slow or unreachable. KeySetSource serves a fixed key set, for tests.
+"""
+import logging
+import re
+import threading
+import time
+
+import jwt
 import requests
-from .models import User
+from django.conf import settings
+from django.db.models import Count, IntegerField, Max, Q
+from django.db.models.functions import Cast, Substr
+from jwt import PyJWKSet
+from jwt.exceptions import PyJWKError, PyJWKSetError
+from rest_framework import status
 from rest_framework.response import Response
 from rest_framework.views import APIView
+
+from .models import User
 from .permissions import IsAdmin
-from rest_framework.permissions import AllowAny, IsAuthenticated
-from rest_framework_simplejwt.tokens import RefreshToken
+from .tokens import ClaimsRefreshToken
+
+logger = logging.getLogger(__name__)
+
+GOOGLE_ISSUERS = ["accounts.google.com", "https://accounts.google.com"]
+# An unknown kid refetches the keys at most this often (seconds), as does a failed fetch
+REFETCH_INTERVAL = 60
+
+
+class GoogleKeysUnavailable(Exception):
+    """Raised when no signing keys could be fetched from Google at all."""
+
+    retry_after = REFETCH_INTERVAL
+
+
+class KeySetSource:
+    """A fixed JWKS."""
+
+    def __init__(self, jwks):
+        self.keys = {key.key_id: key for key in PyJWKSet.from_dict(jwks).keys}
+
+    def get_signing_key(self, kid):
+        try:
+            return self.keys[kid]
+        except KeyError:
+            raise jwt.InvalidTokenError("Unknown signing key")
+
+
+class JWKSKeySource(KeySetSource):
+    """The JWKS at `url`, refreshed every `lifespan` seconds and kept while refreshing fails."""
+
+    def __init__(self, url, lifespan, timeout, clock=time.monotonic):
+        self.url = url
+        self.lifespan = lifespan
+        self.timeout = timeout
+        self.clock = clock
+        self.keys = {}
+        self.fetched_at = None
+        self.attempted_at = None
+        self.lock = threading.Lock()
+        self.fetches = self.failures = 0
+
+    def fetch(self):
+        response = requests.get(self.url, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def refresh(self):
+        """Refetch the keys unless another thread is already at it. Returns whether this call did."""
+        if not self.lock.acquire(blocking=False):
+            return False
+        try:
+            self.attempted_at = self.clock()
+            self.fetches += 1
+            try:
+                keys = {key.key_id: key for key in PyJWKSet.from_dict(self.fetch()).keys}
+            except (requests.RequestException, ValueError, PyJWKError, PyJWKSetError) as e:
+                self.failures += 1
+                logger.warning("Fetching Google signing keys from %s failed: %s", self.url, e)
+                return True
+            self.keys, self.fetched_at = keys, self.attempted_at
+            return True
+        finally:
+            self.lock.release()
+
+    def get_signing_key(self, kid):
+        now = self.clock()
+        may_refetch = self.attempted_at is None or now - self.attempted_at >= REFETCH_INTERVAL
+        if kid not in self.keys and may_refetch:
+            # Nothing to check the token with until this returns
+            if not self.refresh() and not self.keys:
+                with self.lock:
+                    pass  # another thread's first fetch; wait for it
+        elif self.keys and now - self.fetched_at >= self.lifespan and may_refetch:
+            threading.Thread(target=self.refresh, daemon=True).start()
+        if not self.keys:
+            raise GoogleKeysUnavailable()
+        return super().get_signing_key(kid)
+
+
+key_source = JWKSKeySource(settings.GOOGLE_JWKS_URL, settings.GOOGLE_JWKS_LIFESPAN, settings.GOOGLE_JWKS_TIMEOUT)
+
+
+def verify_id_token(token):
+    """
+    The claims of a Google ID token, once its signature, issuer, audience and expiry check out.
+
+    Without GOOGLE_CLIENT_IDS no audience is ours, so every token is refused:
+    otherwise a token Google issued to any other app would sign its holder in.
+    """
+    if not settings.GOOGLE_CLIENT_IDS:
+        raise jwt.InvalidAudienceError("GOOGLE_CLIENT_IDS is not configured")
+    key = key_source.get_signing_key(jwt.get_unverified_header(token).get("kid"))
+    return jwt.decode(
+        token,
+        key.key,
+        algorithms=["RS256"],
+        audience=settings.GOOGLE_CLIENT_IDS,
+        issuer=GOOGLE_ISSUERS,
+        options={"require": ["aud", "exp", "iat", "iss", "sub"]},
+        leeway=60,
+    )
+
+
+def free_username(base):
+    """`base` if it's free, else `base_<n>` for one more than the highest suffix taken, in one query."""
+    suffixed = rf"^{re.escape(base)}_[0-9]{{1,9}}$"
+    taken = User.objects.filter(Q(username=base) | Q(username__startswith=f"{base}_")).aggregate(
+        base=Count("id", filter=Q(username=base)),
+        last=Max(
+            Cast(Substr("username", len(base) + 2), IntegerField()), filter=Q(username__regex=suffixed), default=0
+        ),
+    )
+    return f"{base}_{taken['last'] + 1}" if taken["base"] else base
 
 
 class GoogleAuthView(APIView):
@@ -14,37 +150,37 @@ class GoogleAuthView(APIView):
         if not id_token:
             return Response({"error": "ID token is required"}, status=400)
 
-        # Google API to validate ID token
-        google_api_url = f"https://oauth2.googleapis.com/tokeninfo?id_token={id_token}"
-        response = requests.get(google_api_url)
-
-        if response.status_code != 200:
+        try:
+            user_data = verify_id_token(id_token)
+        except GoogleKeysUnavailable as exc:
+            response = Response({"error": "Google sign-in temporarily unavailable"},
+                                status=status.HTTP_503_SERVICE_UNAVAILABLE)
+            response["Retry-After"] = str(exc.retry_after)
+            return response
+        except jwt.InvalidTokenError:
             return Response({"error": "Invalid Google token"}, status=401)
 
-        user_data = response.json()
         email = user_data.get("email")
-        username = user_data.get("name")
+        username = user_data.get("name") or (email or "").split("@")[0]
 
         if not email:
             return Response({"error": "Email not provided by Google"}, status=400)
-
-        # Ensure unique username
-        base_username = username.replace(" ", "_").lower()
-        unique_username = base_username
-        count = 1
-        while User.objects.filter(username=unique_username).exists():
-            unique_username = f"{base_username}_{count}"
-            count += 1
+        if not user_data.get("email_verified"):
+            return Response({"error": "Google email is not verified"}, status=400)
 
         user, created = User.objects.get_or_create(
-            email=email, defaults={"username": unique_username}, role=User.ROLE.BASE_USER,
+            email=email,
+            defaults={"username": free_username(username.replace(" ", "_").lower()), "role": User.ROLE.BASE_USER},
         )
+        # Distributor and admin accounts sign in with their password only
+        if user.role != User.ROLE.BASE_USER:
+            return Response({"error": "This account cannot sign in with Google"}, status=status.HTTP_403_FORBIDDEN)
 
         if created:
             user.set_unusable_password()
             user.save()
 
-        refresh = RefreshToken.for_user(user)
+        refresh = ClaimsRefreshToken.for_user(user)
         return Response(
             {
                 "refresh": str(refresh),
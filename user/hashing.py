@@ -0,0 +1,72 @@
+"""
+Password hashing off the request path.
+
+PBKDF2 costs tens of milliseconds of CPU per call, and a login storm run on
+request threads takes every core it can get. The login, signup and
+change-password views hand hashing to one small per-process thread pool
+instead and wait for it (hashlib's PBKDF2 releases the GIL, so the threads
+really run in parallel, on at most PASSWORD_HASH_WORKERS cores), and
+admission control turns away hash operations beyond PASSWORD_HASH_MAX_PENDING
+with a 503 rather than letting the queue, and every caller's wait, grow
+without bound.
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, make_password
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from cyriox.resilience import Bulkhead
+
+
+class HashPoolBusy(APIException):
+    """Raised when a hash operation is refused because too many are already queued or running."""
+
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = "Too many sign-ins in progress, try again shortly."
+    default_code = "hash_pool_busy"
+    # DRF's exception handler sends this as Retry-After
+    wait = 1
+
+
+class HashPool:
+    """A bounded thread pool for password hashing, with admission control in front of it."""
+
+    def __init__(self, workers, max_pending):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+        self.admission = Bulkhead(max_pending)
+        self.rejected = 0
+
+    def run(self, func, *args):
+        if not self.admission.acquire():
+            self.rejected += 1
+            raise HashPoolBusy()
+        try:
+            return self.executor.submit(func, *args).result()
+        finally:
+            self.admission.release()
+
+    def make_password(self, raw_password):
+        return self.run(make_password, raw_password)
+
+    def check_password(self, raw_password, user):
+        """
+        Whether `raw_password` is `user`'s password; `user` None still costs a
+        hash, so unknown emails take as long as wrong passwords. A hash made
+        with outdated settings is upgraded in place and returned for saving.
+        """
+        if user is None:
+            self.make_password(raw_password)
+            return False, None
+        upgraded = []
+        valid = self.run(check_password, raw_password, user.password, upgraded.append)
+        if valid and upgraded:
+            return True, self.make_password(upgraded[0])
+        return valid, None
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False)
+
+
+pool = HashPool(settings.PASSWORD_HASH_WORKERS, settings.PASSWORD_HASH_MAX_PENDING)
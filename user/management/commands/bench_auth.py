@@ -0,0 +1,50 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.test import APIRequestFactory
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from distributor.fixtures import create_user, drop_users
+from user.authentication import ClaimsJWTAuthentication, claims_changed
+from user.models import User
+from user.tokens import ClaimsRefreshToken
+
+
+class Command(BaseCommand):
+    help = (
+        "Authenticate bearer-token requests for a pool of users and read request.user.role, as the "
+        "permission classes do, with the stock JWTAuthentication and with the claims-based one."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=50)
+        parser.add_argument("--requests", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        users = [create_user("auth", role=User.ROLE.DISTRIBUTOR) for _ in range(options["users"])]
+        factory = APIRequestFactory()
+        requests = [
+            factory.get("/", HTTP_AUTHORIZATION=f"Bearer {ClaimsRefreshToken.for_user(user).access_token}")
+            for user in users
+        ]
+        try:
+            self.stdout.write(f"{options['requests']} requests from {options['users']} users")
+            self.stdout.write(f"{'authentication':<22} {'us/request':>11} {'queries/request':>16}")
+            claims_changed.clear()
+            for name, authentication in (("JWTAuthentication", JWTAuthentication()),
+                                         ("ClaimsJWTAuthentication", ClaimsJWTAuthentication())):
+                # As deployed with Redis; claims aren't trusted without a shared cache
+                with CaptureQueriesContext(connection) as queries, override_settings(CACHE_IS_SHARED=True):
+                    started = time.perf_counter()
+                    for _ in range(options["requests"]):
+                        user, _ = authentication.authenticate(random.choice(requests))
+                        assert user.role == User.ROLE.DISTRIBUTOR
+                    elapsed = time.perf_counter() - started
+                self.stdout.write(f"{name:<22} {elapsed / options['requests'] * 1e6:>11.1f} "
+                                  f"{len(queries) / options['requests']:>16.3f}")
+            self.stdout.write(f"claims LRU: {claims_changed.hits} hits, {claims_changed.misses} misses")
+        finally:
+            drop_users(*users)
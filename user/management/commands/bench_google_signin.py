@@ -0,0 +1,136 @@
+import json
+import statistics
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+import jwt
+import requests
+from cryptography.hazmat.primitives.asymmetric import rsa
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.test import APIClient
+
+from distributor.fixtures import create_user, drop_users
+from transaction.management.commands.bench_brownout import percentile
+from user import google
+from user.models import User
+
+
+class GoogleHandler(BaseHTTPRequestHandler):
+    """/certs serves the JWKS and /tokeninfo echoes a token's claims, as Google's endpoints do, after a delay."""
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        time.sleep(self.server.latency)
+        if self.path.startswith("/certs"):
+            payload = self.server.jwks
+        else:
+            token = self.path.split("id_token=", 1)[1]
+            payload = jwt.decode(token, options={"verify_signature": False})
+        data = json.dumps(payload).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class Command(BaseCommand):
+    help = (
+        "Sign in with Google ID tokens through GoogleAuthView against a local stand-in for Google, "
+        "verifying them with a tokeninfo call per sign-in and locally with cached keys, while Google "
+        "is healthy and while it is slow; and count the queries username allocation makes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--signins", type=int, default=50)
+        parser.add_argument("--healthy-ms", type=float, default=50.0)
+        parser.add_argument("--slow-ms", type=float, default=2000.0)
+        parser.add_argument("--taken", type=int, default=50, help="Users already holding the name and its suffixes.")
+
+    def handle(self, *args, **options):
+        key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        jwk = dict(jwt.algorithms.RSAAlgorithm.to_jwk(key.public_key(), as_dict=True), kid="bench", alg="RS256")
+        server = ThreadingHTTPServer(("127.0.0.1", 0), GoogleHandler)
+        server.daemon_threads = True
+        server.jwks, server.latency = {"keys": [jwk]}, 0
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base_url = f"http://127.0.0.1:{server.server_address[1]}"
+
+        admin = create_user("google-admin", role=User.ROLE.ADMIN)
+        client = APIClient()
+        client.force_authenticate(admin)
+        run = uuid.uuid4().hex[:8]
+
+        def tokeninfo(token):
+            response = requests.get(f"{base_url}/tokeninfo?id_token={token}")
+            if response.status_code != 200:
+                raise jwt.InvalidTokenError()
+            return response.json()
+
+        def id_token(i):
+            now = int(time.time())
+            return jwt.encode({
+                "iss": "accounts.google.com", "sub": str(i), "aud": "bench", "iat": now, "exp": now + 3600,
+                "email": f"google-{run}-{i}@bench.local", "email_verified": True, "name": f"Bench {run}",
+            }, key, algorithm="RS256", headers={"kid": "bench"})
+
+        source = google.JWKSKeySource(f"{base_url}/certs", lifespan=3600, timeout=2)
+        scenarios = [
+            ("tokeninfo", options["healthy_ms"], False),
+            ("local keys", options["healthy_ms"], False),
+            ("tokeninfo", options["slow_ms"], False),
+            ("local keys, stale", options["slow_ms"], True),
+        ]
+        self.stdout.write(f"{options['signins']} sign-ins per scenario")
+        self.stdout.write(f"{'verification':<18} {'google ms':>9} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8}  statuses")
+        signed_in = 0
+        try:
+            with override_settings(GOOGLE_CLIENT_IDS=["bench"]), mock.patch.object(google, "key_source", source):
+                source.get_signing_key("bench")
+                for name, latency_ms, stale in scenarios:
+                    server.latency = latency_ms / 1000
+                    if stale:
+                        source.fetched_at -= source.lifespan
+                        source.attempted_at = source.fetched_at
+                    verify = tokeninfo if name == "tokeninfo" else google.verify_id_token
+                    latencies, statuses = [], {}
+                    with mock.patch.object(google, "verify_id_token", verify):
+                        for _ in range(options["signins"]):
+                            started = time.perf_counter()
+                            response = client.post("/google/", {"access_token": id_token(signed_in)})
+                            latencies.append((time.perf_counter() - started) * 1000)
+                            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+                            signed_in += 1
+                    self.stdout.write(
+                        f"{name:<18} {latency_ms:>9.0f} {statistics.median(latencies):>8.1f} "
+                        f"{percentile(latencies, 95):>8.1f} {max(latencies):>8.1f}  {statuses}"
+                    )
+            self.stdout.write(f"key fetches: {source.fetches} ({source.failures} failed)")
+            self.username_queries(run, options["taken"])
+        finally:
+            server.shutdown()
+            drop_users(admin, *User.objects.filter(email__startswith=f"google-{run}"))
+
+    def username_queries(self, run, taken):
+        base = f"taken_{run}"
+        User.objects.bulk_create(
+            User(email=f"google-{run}-taken{i}@bench.local", username=base if i == 0 else f"{base}_{i}")
+            for i in range(taken)
+        )
+        with CaptureQueriesContext(connection) as loop:
+            # What GoogleAuthView did before: probe each numbered candidate in turn
+            candidate, count = base, 1
+            while User.objects.filter(username=candidate).exists():
+                candidate, count = f"{base}_{count}", count + 1
+        with CaptureQueriesContext(connection) as single:
+            allocated = google.free_username(base)
+        assert allocated == candidate, (allocated, candidate)
+        self.stdout.write(f"username with {taken} taken: exists() loop {len(loop)} queries, "
+                          f"free_username {len(single)} query -> {allocated}")
@@ -0,0 +1,113 @@
+import asyncio
+import json
+import logging
+import time
+from collections import Counter
+from unittest import mock
+
+from django.core.management.base import BaseCommand
+from django.core.asgi import get_asgi_application
+from django.test.utils import override_settings
+
+from distributor.fixtures import create_tenant, create_user, drop_users
+from transaction.management.commands.bench_brownout import percentile
+from user import hashing
+from user.tokens import ClaimsRefreshToken
+
+PASSWORD = "storm-password"
+
+
+async def call(app, method, path, body=b"", headers=()):
+    """One request through the ASGI application, as a server would make it. Returns (status, headers)."""
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": method, "scheme": "http",
+        "path": path, "raw_path": path.encode(), "query_string": b"", "root_path": "",
+        "server": ("testserver", 80), "client": ("127.0.0.1", 0),
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode()), *headers],
+    }
+    messages = [{"type": "http.request", "body": body, "more_body": False}]
+    sent = []
+
+    async def receive():
+        if messages:
+            return messages.pop()
+        await asyncio.Event().wait()
+
+    async def send(message):
+        sent.append(message)
+
+    await app(scope, receive, send)
+    start = sent[0]
+    return start["status"], {name.lower(): value for name, value in start["headers"]}
+
+
+class Command(BaseCommand):
+    help = (
+        "Time a cheap authenticated endpoint through the ASGI application while concurrent clients hammer "
+        "/login/, with hashing on a pool as wide as the storm (a thread per login) and on the bounded hash pool."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--logins", type=int, default=32, help="Concurrent clients logging in.")
+        parser.add_argument("--duration", type=float, default=5.0, help="Seconds per scenario.")
+        parser.add_argument("--interval", type=float, default=0.02, help="Seconds between probe requests.")
+
+    def handle(self, *args, **options):
+        distributor, _ = create_tenant("storm")
+        users = [create_user("storm") for _ in range(options["logins"])]
+        for user in users:
+            user.set_password(PASSWORD)
+            user.save(update_fields=["password"])
+        token = str(ClaimsRefreshToken.for_user(distributor.user).access_token)
+
+        app = get_asgi_application()
+        unbounded = hashing.HashPool(options["logins"], options["logins"])
+        scenarios = [
+            ("no storm", None),
+            ("storm, thread per login", unbounded),
+            ("storm, bounded pool", hashing.pool),
+        ]
+        self.stdout.write(f"{options['logins']} clients logging in; hash pool {hashing.pool.executor._max_workers} "
+                          f"workers, {hashing.pool.admission.max_concurrent} pending")
+        self.stdout.write(f"{'scenario':<26} {'probes':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+                          f"{'logins/s':>9}  login statuses")
+        # Every refused login would otherwise log a 503
+        logging.getLogger("django.request").setLevel(logging.CRITICAL)
+        try:
+            with override_settings(ALLOWED_HOSTS=["*"]):
+                for name, pool in scenarios:
+                    with mock.patch.object(hashing, "pool", pool or hashing.pool):
+                        latencies, logins = asyncio.run(self.run(app, users, token, pool is not None, options))
+                    self.stdout.write(
+                        f"{name:<26} {len(latencies):>6} {percentile(latencies, 50):>8.1f} "
+                        f"{percentile(latencies, 95):>8.1f} {percentile(latencies, 99):>8.1f} "
+                        f"{logins[200] / options['duration']:>9.1f}  {dict(logins)}"
+                    )
+        finally:
+            unbounded.shutdown()
+            drop_users(distributor.user, *users)
+
+    async def run(self, app, users, token, storm, options):
+        """Probe /distributor/distributor-orders/ at a fixed interval, with or without the logins, for the duration."""
+        deadline = time.monotonic() + options["duration"]
+        latencies, logins = [], Counter()
+
+        async def probe():
+            headers = [(b"authorization", f"Bearer {token}".encode())]
+            while time.monotonic() < deadline:
+                started = time.perf_counter()
+                status, _ = await call(app, "GET", "/distributor/distributor-orders/", headers=headers)
+                assert status == 200, status
+                latencies.append((time.perf_counter() - started) * 1000)
+                await asyncio.sleep(options["interval"])
+
+        async def login(user):
+            body = json.dumps({"email": user.email, "password": PASSWORD}).encode()
+            while time.monotonic() < deadline:
+                status, headers = await call(app, "POST", "/login/", body)
+                logins[status] += 1
+                if status == 503:
+                    await asyncio.sleep(float(headers[b"retry-after"]))
+
+        await asyncio.gather(probe(), *(login(user) for user in users if storm))
+        return latencies, logins
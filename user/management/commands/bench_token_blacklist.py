@@ -0,0 +1,96 @@
+import time
+import uuid
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+from distributor.fixtures import create_user, drop_users
+from user.blacklist import blacklist_filter, is_blacklisted, prune_expired_tokens
+from user.tokens import ClaimsRefreshToken
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+class Command(BaseCommand):
+    help = (
+        "Grow the token blacklist tables step by step, the way rotating refreshes do, and at each "
+        "size time the refresh endpoint and the blacklist check with and without the filter; then "
+        "time pruning the expired half."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", type=int, nargs="+", default=[0, 20000, 100000],
+                            help="Outstanding tokens in the table at each step.")
+        parser.add_argument("--refreshes", type=int, default=200)
+        parser.add_argument("--batch-size", type=int, default=1000, help="Prune batch size.")
+
+    def handle(self, *args, **options):
+        user = create_user("blacklist")
+        padding = "x" * 300  # about the length of an encoded refresh token
+        seeded = []
+        self.stdout.write(f"{'tokens':>8} {'refresh p50':>12} {'p99':>8} {'queries':>8} "
+                          f"{'check, table':>13} {'check, filter':>14}")
+        try:
+            # As deployed with Redis; without a shared cache every check goes to the table
+            with override_settings(ALLOWED_HOSTS=["*"], CACHE_IS_SHARED=True):
+                for size in options["sizes"]:
+                    # Half already expired, like weeks of 21-day tokens nobody pruned; most are blacklisted
+                    now = timezone.now()
+                    missing = size - len(seeded)
+                    batch = [
+                        OutstandingToken(user=user, jti=uuid.uuid4().hex, token=padding, created_at=now,
+                                         expires_at=now + timedelta(days=-1 if i % 2 else 21))
+                        for i in range(max(missing, 0))
+                    ]
+                    OutstandingToken.objects.bulk_create(batch, batch_size=2000)
+                    seeded += [token.jti for token in batch]
+                    BlacklistedToken.objects.bulk_create(
+                        [BlacklistedToken(token=token) for token in OutstandingToken.objects.filter(
+                            jti__in=[t.jti for t in batch[: len(batch) * 9 // 10]])],
+                        batch_size=2000,
+                    )
+                    self.measure(user, size, options["refreshes"])
+
+                expired = OutstandingToken.objects.filter(expires_at__lte=timezone.now()).count()
+                started = time.perf_counter()
+                deleted = prune_expired_tokens(batch_size=options["batch_size"])
+                elapsed = time.perf_counter() - started
+                self.stdout.write(f"pruned {deleted} of {expired} expired tokens in {elapsed:.2f}s "
+                                  f"({deleted / max(elapsed, 1e-6):.0f}/s, batches of {options['batch_size']})")
+        finally:
+            OutstandingToken.objects.filter(user=user).delete()
+            drop_users(user)
+
+    def measure(self, user, size, refreshes):
+        client = Client()
+        refresh = str(ClaimsRefreshToken.for_user(user))
+        blacklist_filter.reset()
+        latencies = []
+        with CaptureQueriesContext(connection) as queries:
+            for _ in range(refreshes):
+                started = time.perf_counter()
+                response = client.post("/api/token/refresh/", {"refresh": refresh})
+                latencies.append((time.perf_counter() - started) * 1000)
+                assert response.status_code == 200, response.content
+                refresh = response.json()["refresh"]
+
+        jtis = [uuid.uuid4().hex for _ in range(refreshes)]
+        started = time.perf_counter()
+        for jti in jtis:
+            BlacklistedToken.objects.filter(token__jti=jti).exists()
+        table = (time.perf_counter() - started) / refreshes * 1e6
+        started = time.perf_counter()
+        for jti in jtis:
+            is_blacklisted(jti)
+        filtered = (time.perf_counter() - started) / refreshes * 1e6
+
+        self.stdout.write(f"{size:>8} {percentile(latencies, 50):>10.2f}ms {percentile(latencies, 99):>6.2f}ms "
+                          f"{len(queries) / refreshes:>8.1f} {table:>11.0f}us {filtered:>12.0f}us")
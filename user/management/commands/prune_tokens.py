@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from user.blacklist import prune_expired_tokens
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete expired outstanding and blacklisted refresh tokens in batches. Run it from cron, "
+        "e.g. hourly; it replaces simplejwt's flushexpiredtokens."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000, help="Tokens deleted per transaction.")
+
+    def handle(self, *args, **options):
+        deleted = prune_expired_tokens(batch_size=options["batch_size"])
+        self.stdout.write(f"Deleted {deleted} expired tokens")
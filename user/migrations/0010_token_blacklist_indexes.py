@@ -0,0 +1,27 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    """
+    Indexes on simplejwt's token_blacklist tables, which that app doesn't
+    declare: expires_at for prune_tokens, blacklisted_at for the blacklist
+    filter's periodic catch-up sweep (see user.blacklist).
+    """
+
+    dependencies = [
+        ('user', '0009_user_search_indexes'),
+        ('token_blacklist', '0012_alter_outstandingtoken_user'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            'CREATE INDEX IF NOT EXISTS token_outstanding_expires_idx '
+            'ON token_blacklist_outstandingtoken (expires_at)',
+            'DROP INDEX IF EXISTS token_outstanding_expires_idx',
+        ),
+        migrations.RunSQL(
+            'CREATE INDEX IF NOT EXISTS token_blacklisted_at_idx '
+            'ON token_blacklist_blacklistedtoken (blacklisted_at)',
+            'DROP INDEX IF EXISTS token_blacklisted_at_idx',
+        ),
+    ]
@@ -1,16 +1,33 @@
 import uuid
-from django.db import models
+from django.db import models, transaction
+from django.db.models.functions import Upper
 from django.contrib.auth.base_user import BaseUserManager
 from django.contrib.auth.models import AbstractBaseUser, PermissionsMixin
 from django.apps import apps
 from django.core.exceptions import ValidationError
 
 
-class AppUserManager(BaseUserManager):
-    def create_user(self, email, phone_number, username, role, password=None, distributor_name=None, is_staff=False, is_superuser=False):
+class UserQuerySet(models.QuerySet):
+
+    def update(self, **kwargs):
+        # No post_save here, so expire_stale_claims never sees the change:
+        # mark the users whose claim fields this rewrites ourselves. Raw SQL
+        # still bypasses it.
+        if not set(kwargs).intersection(self.model.CLAIM_FIELDS):
+            return super().update(**kwargs)
+        from .authentication import mark_claims_changed
+        with transaction.atomic(using=self.db):
+            user_ids = list(self.values_list("pk", flat=True))
+            rows = super().update(**kwargs)
+            transaction.on_commit(lambda: [mark_claims_changed(user_id) for user_id in user_ids], using=self.db)
+        return rows
+
+
+class AppUserManager(BaseUserManager.from_queryset(UserQuerySet)):
+    def create_user(self, email, phone_number, username, role, password=None, distributor_name=None, is_staff=False, is_superuser=False, password_hash=None):
         if not email:
             raise ValueError("Email is required")
-        if not password:
+        if not password and not password_hash:
             raise ValueError("Password is required")
 
         user = self.model(
@@ -22,7 +39,11 @@ class AppUserManager(BaseUserManager):
             is_staff=is_staff,  # Set is_staff value
             is_superuser=is_superuser  # Set is_superuser value
         )
-        user.set_password(password)
+        if password_hash:
+            # Hashed already, off the request thread (see user.hashing)
+            user.password = password_hash
+        else:
+            user.set_password(password)
 
         # If distributor_name is provided, link to a distributor
         if distributor_name:
@@ -65,13 +86,34 @@ class User(AbstractBaseUser, PermissionsMixin):
 
     class Meta:
         ordering = ['created_at']
+        indexes = [
+            # Case-insensitive prefix search in the distributor customer directory
+            models.Index(Upper("email"), name="user_email_upper_idx"),
+            models.Index(Upper("username"), name="user_username_upper_idx"),
+        ]
+
+    # Fields baked into access tokens as claims; see user.authentication
+    CLAIM_FIELDS = ("role", "is_active", "is_staff", "is_superuser")
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored claim fields so a save can tell when tokens went stale
+        instance._loaded_claims = {field: instance.__dict__.get(field) for field in cls.CLAIM_FIELDS}
+        return instance
+
+    def claims_changed(self):
+        loaded = getattr(self, "_loaded_claims", None)
+        return loaded is not None and any(
+            field in self.__dict__ and self.__dict__[field] != loaded[field] for field in self.CLAIM_FIELDS
+        )
 
     def __str__(self):
         return f"{self.username} ({self.role})"
 
     def get_full_name(self):
-        """Fetch the full name of the user."""
-        return f"{self.first_name} {self.last_name}"  # Ensure these fields exist
+        """Users have no separate name fields; the username is the display name."""
+        return self.username
 
     def get_distributor(self):
         """Fetch distributor associated with this user using DistributorCustomer."""
@@ -1,6 +1,6 @@
 from .models import User
+from . import hashing
 from rest_framework import serializers
-from django.contrib.auth import authenticate
 from distributor.models import Distributor, Branch
 
 ### Admin Signup ###
@@ -64,7 +64,8 @@ class UserSignupSerializer(serializers.ModelSerializer):
             username=username,
             phone_number=phone_number,
             role=role,
-            password=password
+            password=password,
+            password_hash=self.context.get("password_hash"),
         )
 
         # Optional distributor linking for customers
@@ -112,7 +113,8 @@ class DistributorSignupSerializer(serializers.ModelSerializer):
             username=username,
             phone_number=phone_number,
             role=role,
-            password=password
+            password=password,
+            password_hash=self.context.get("password_hash"),
         )
 
         # Create Distributor and Branch
@@ -124,41 +126,24 @@ class DistributorSignupSerializer(serializers.ModelSerializer):
         return user
 
 
-### Login ###
-class UserLoginSerializer(serializers.Serializer):
-    email = serializers.EmailField(required=True)
-    password = serializers.CharField(write_only=True)
-
-    def validate(self, data):
-        email = data.get('email')
-        password = data.get('password')
-
-        if not email or not password:
-            raise serializers.ValidationError("Email and password are required")
-
-        user = authenticate(email=email, password=password)
-
-        if user is None:
-            raise serializers.ValidationError("Invalid credentials")
-
-        data["user"] = user
-        return data
-
 ### Change Password ###
 class ChangePasswordSerializer(serializers.Serializer):
     old_password = serializers.CharField(write_only=True)
     new_password = serializers.CharField(write_only=True)
 
     def validate(self, data):
-        user = self.context['request'].user
-        if not user.check_password(data['old_password']):
+        # request.user is built from token claims; check against the stored row
+        user = User.objects.get(pk=self.context['request'].user.pk)
+        valid, _ = hashing.pool.check_password(data['old_password'], user)
+        if not valid:
             raise serializers.ValidationError("Old password is incorrect")
+        data["user"] = user
         return data
 
     def save(self, **kwargs):
-        user = self.context['request'].user
-        user.set_password(self.validated_data['new_password'])
-        user.save()
+        user = self.validated_data["user"]
+        user.password = hashing.pool.make_password(self.validated_data['new_password'])
+        user.save(update_fields=["password"])
         return user
 
 ### User Verification (e.g. OTP) ###
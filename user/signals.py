@@ -1,5 +1,7 @@
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
+from user.authentication import mark_claims_changed
 from user.models import User
 from distributor.models import DistributorCustomer
 
@@ -15,3 +17,18 @@ def assign_customer_to_distributor(sender, instance, created, **kwargs):
 
 
 # distributor/signals.py
+
+
+@receiver(post_save, sender=User)
+def expire_stale_claims(sender, instance, created, **kwargs):
+    # Tokens issued before a role or is_active change must not be trusted for their claims
+    if not created and instance.claims_changed():
+        user_id = instance.pk
+        transaction.on_commit(lambda: mark_claims_changed(user_id))
+    instance._loaded_claims = {field: instance.__dict__.get(field) for field in User.CLAIM_FIELDS}
+
+
+@receiver(post_delete, sender=User)
+def expire_deleted_user_claims(sender, instance, **kwargs):
+    user_id = instance.pk
+    transaction.on_commit(lambda: mark_claims_changed(user_id))
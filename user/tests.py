@@ -1,3 +1,393 @@
-from django.test import TestCase
+import time
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+import jwt
+from django.conf import settings
+from cryptography.hazmat.primitives.asymmetric import rsa
+from django.core.cache import cache
+from django.db import transaction
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.throttling import AnonRateThrottle
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .authentication import ClaimsJWTAuthentication, TTLCache, claims_changed
+from distributor.fixtures import create_tenant
+from distributor.models import DistributorCustomer
+
+from . import google, hashing
+from .blacklist import VERSION_KEY, blacklist_filter, is_blacklisted, prune_expired_tokens
+from .models import User
+from .tokens import ClaimsRefreshToken
+from .views import LoginView, UpdateUserView
+
+
+@override_settings(CACHE_IS_SHARED=True)
+class ClaimsAuthenticationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(email="seller@example.com", username="seller", role=User.ROLE.DISTRIBUTOR)
+
+    def setUp(self):
+        cache.clear()
+        claims_changed.clear()
+
+    def authenticate(self, token):
+        request = APIRequestFactory().get("/", HTTP_AUTHORIZATION=f"Bearer {token}")
+        return ClaimsJWTAuthentication().authenticate(request)[0]
+
+    def test_builds_user_from_claims(self):
+        token = ClaimsRefreshToken.for_user(self.user).access_token
+        self.assertNotIn("distributor_id", token)
+        with self.assertNumQueries(0):
+            user = self.authenticate(token)
+            self.assertEqual((user.pk, user.role, user.is_staff), (self.user.pk, User.ROLE.DISTRIBUTOR, False))
+            self.assertTrue(user.is_distributor())
+        # Anything else is loaded when first read
+        with self.assertNumQueries(1):
+            self.assertEqual(user.email, "seller@example.com")
+
+    def test_role_change_invalidates_claims(self):
+        token = ClaimsRefreshToken.for_user(self.user).access_token
+        self.authenticate(token)
+        user = User.objects.get(pk=self.user.pk)
+        user.role = User.ROLE.STAFF
+        with self.captureOnCommitCallbacks(execute=True):
+            user.save()
+        with self.assertNumQueries(1):
+            self.assertEqual(self.authenticate(token).role, User.ROLE.STAFF)
+
+    def test_deactivated_user_is_refused(self):
+        token = ClaimsRefreshToken.for_user(self.user).access_token
+        with self.captureOnCommitCallbacks(execute=True):
+            user = User.objects.get(pk=self.user.pk)
+            user.is_active = False
+            user.save()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(token)
+
+    def test_queryset_update_invalidates_claims(self):
+        token = ClaimsRefreshToken.for_user(self.user).access_token
+        self.authenticate(token)
+        with self.captureOnCommitCallbacks(execute=True):
+            User.objects.filter(pk=self.user.pk).update(role=User.ROLE.STAFF)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.authenticate(token).role, User.ROLE.STAFF)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            User.objects.filter(pk=self.user.pk).update(is_active=False)
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(token)
+
+    @override_settings(CACHE_IS_SHARED=False)
+    def test_loads_user_without_a_shared_cache(self):
+        token = ClaimsRefreshToken.for_user(self.user).access_token
+        # Deactivated by another process: nothing reaches this one's cache
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(token)
+
+    def test_update_user_saves_the_loaded_row(self):
+        token = ClaimsRefreshToken.for_user(self.user).access_token
+        User.objects.filter(pk=self.user.pk).update(phone_number="0800")
+        request = APIRequestFactory().patch("/", {}, format="json", HTTP_AUTHORIZATION=f"Bearer {token}")
+        self.assertEqual(UpdateUserView.as_view()(request).status_code, 200)
+        self.assertEqual(User.objects.get(pk=self.user.pk).phone_number, "0800")
+
+    def test_refresh_issues_current_claims(self):
+        refresh = ClaimsRefreshToken.for_user(self.user)
+        User.objects.filter(pk=self.user.pk).update(role=User.ROLE.MANAGER)
+        response = self.client.post("/api/token/refresh/", {"refresh": str(refresh)})
+        self.assertEqual(AccessToken(response.json()["access"])["role"], User.ROLE.MANAGER)
+
+
+class TTLCacheTests(SimpleTestCase):
+
+    def test_evicts_least_recently_used_and_expired(self):
+        now = [0]
+        lru = TTLCache(maxsize=2, ttl=10, clock=lambda: now[0])
+        lru.set("a", 1)
+        lru.set("b", 2)
+        lru.get("a")
+        lru.set("c", 3)
+        self.assertEqual((lru.get("a"), lru.get("b"), lru.get("c")), (1, None, 3))
+        now[0] = 10
+        self.assertIsNone(lru.get("a"))
+
+
+@override_settings(CACHE_IS_SHARED=True)
+class TokenBlacklistTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(email="buyer@example.com", username="buyer")
+
+    def setUp(self):
+        cache.clear()
+        blacklist_filter.reset()
+
+    def refresh(self, token):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post("/api/token/refresh/", {"refresh": str(token)})
+
+    def test_rotated_token_is_refused(self):
+        refresh = ClaimsRefreshToken.for_user(self.user)
+        response = self.refresh(refresh)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.refresh(response.json()["refresh"]).status_code, 200)
+        self.assertEqual(self.refresh(refresh).status_code, 401)
+
+    def test_filter_screens_unknown_tokens_without_a_query(self):
+        blacklisted = ClaimsRefreshToken.for_user(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            blacklisted.blacklist()
+        self.assertTrue(is_blacklisted(blacklisted["jti"]))
+        with self.assertNumQueries(0):
+            self.assertFalse(is_blacklisted(ClaimsRefreshToken()["jti"]))
+
+    def test_sees_tokens_blacklisted_by_another_process(self):
+        self.assertFalse(is_blacklisted("elsewhere"))
+        token = OutstandingToken.objects.create(jti="elsewhere", token="", expires_at=timezone.now() + timedelta(days=1))
+        with self.captureOnCommitCallbacks(execute=True):
+            BlacklistedToken.objects.create(token=token)
+            transaction.on_commit(lambda: cache.incr(VERSION_KEY))
+        self.assertTrue(is_blacklisted("elsewhere"))
+
+    def test_resyncs_without_a_version_bump(self):
+        now = [0]
+        with mock.patch.object(blacklist_filter, "clock", lambda: now[0]):
+            self.assertFalse(is_blacklisted("admin"))
+            # Blacklisted through the admin: nothing bumps the version
+            token = OutstandingToken.objects.create(jti="admin", token="", expires_at=timezone.now() + timedelta(days=1))
+            BlacklistedToken.objects.create(token=token)
+            self.assertFalse(is_blacklisted("admin"))
+            now[0] = settings.TOKEN_BLACKLIST_FILTER_MAX_AGE
+            self.assertTrue(is_blacklisted("admin"))
+
+    @override_settings(CACHE_IS_SHARED=False)
+    def test_checks_the_table_without_a_shared_cache(self):
+        token = OutstandingToken.objects.create(jti="worker2", token="", expires_at=timezone.now() + timedelta(days=1))
+        BlacklistedToken.objects.create(token=token)
+        with self.assertNumQueries(1):
+            self.assertTrue(is_blacklisted("worker2"))
+
+    def test_prunes_expired_tokens_only(self):
+        now = timezone.now()
+        for i, expires_at in enumerate([now - timedelta(days=1)] * 3 + [now + timedelta(days=1)]):
+            token = OutstandingToken.objects.create(jti=f"jti{i}", token="", expires_at=expires_at)
+            BlacklistedToken.objects.create(token=token)
+        self.assertEqual(prune_expired_tokens(batch_size=2), 3)
+        self.assertEqual(list(OutstandingToken.objects.values_list("jti", flat=True)), ["jti3"])
+        self.assertEqual(BlacklistedToken.objects.count(), 1)
+
+
+class PasswordViewTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email="login@example.com", phone_number=None, username="login", role=User.ROLE.BASE_USER, password="secret123"
+        )
+
+    def login(self, password):
+        return self.client.post("/login/", {"email": "login@example.com", "password": password},
+                                content_type="application/json")
+
+    def test_login(self):
+        response = self.login("secret123")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(AccessToken(response.json()["access_token"])["user_id"], str(self.user.pk))
+        self.assertEqual(self.login("wrong").status_code, 400)
+        self.assertEqual(self.client.post("/login/", {"email": "nobody@example.com", "password": "x"}).status_code, 400)
+
+    def test_signup_stores_pool_hash(self):
+        token = ClaimsRefreshToken.for_user(self.user).access_token
+        response = self.client.post("/user/signup/", {
+            "email": "new@example.com", "username": "new", "phone_number": "0800", "password": "secret123",
+        }, content_type="application/json", HTTP_AUTHORIZATION=f"Bearer {token}")
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(User.objects.get(email="new@example.com").check_password("secret123"))
+
+    def test_change_password(self):
+        token = ClaimsRefreshToken.for_user(self.user).access_token
+        response = self.client.post("/change-password/", {"old_password": "secret123", "new_password": "changed456"},
+                                    content_type="application/json", HTTP_AUTHORIZATION=f"Bearer {token}")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.login("changed456").status_code, 200)
+        self.assertEqual(self.client.post("/change-password/", {}).status_code, 401)
+
+    def test_refuses_hashing_beyond_admission_limit(self):
+        full = hashing.HashPool(workers=1, max_pending=0)
+        self.addCleanup(full.shutdown)
+        with mock.patch.object(hashing, "pool", full):
+            response = self.login("secret123")
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response["Retry-After"], "1")
+        self.assertEqual(response.json(), {"detail": "Too many sign-ins in progress, try again shortly."})
+        self.assertEqual(full.rejected, 1)
+
+    def test_login_is_throttled_like_any_api_view(self):
+        cache.clear()
+
+        class TwoPerMinute(AnonRateThrottle):
+            rate = "2/min"
+
+        with mock.patch.object(LoginView, "throttle_classes", [TwoPerMinute]):
+            self.assertEqual([self.login("secret123").status_code for _ in range(3)], [200, 200, 429])
+
+
+def signing_key(kid):
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    return key, dict(jwt.algorithms.RSAAlgorithm.to_jwk(key.public_key(), as_dict=True), kid=kid, alg="RS256")
+
+
+@override_settings(GOOGLE_CLIENT_IDS=["client"])
+class GoogleAuthTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.key, cls.jwk = signing_key("google-1")
+        cls.admin = User.objects.create(email="admin@example.com", username="admin", role=User.ROLE.ADMIN)
+
+    def setUp(self):
+        patcher = mock.patch.object(google, "key_source", google.KeySetSource({"keys": [self.jwk]}))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def id_token(self, key=None, **claims):
+        now = int(time.time())
+        payload = {"iss": "https://accounts.google.com", "sub": "1", "aud": "client", "iat": now, "exp": now + 3600,
+                   "email": "jane@example.com", "email_verified": True, "name": "Jane Doe", **claims}
+        return jwt.encode(payload, key or self.key, algorithm="RS256", headers={"kid": "google-1"})
+
+    def sign_in(self, token):
+        access = ClaimsRefreshToken.for_user(self.admin).access_token
+        return self.client.post("/google/", {"access_token": token}, HTTP_AUTHORIZATION=f"Bearer {access}")
+
+    def test_signs_in_with_locally_verified_token(self):
+        User.objects.create(email="other@example.com", username="jane_doe")
+        with mock.patch("requests.get") as get:
+            response = self.sign_in(self.id_token())
+        get.assert_not_called()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["user"]["username"], "jane_doe_1")
+
+    def test_signs_in_an_existing_customer_and_refuses_other_roles(self):
+        customer = User.objects.create(email="jane@example.com", username="jane")
+        response = self.sign_in(self.id_token())
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["user"]["id"], str(customer.id))
+
+        for role in (User.ROLE.DISTRIBUTOR, User.ROLE.ADMIN):
+            User.objects.filter(pk=customer.pk).update(role=role)
+            with self.subTest(role=role):
+                response = self.sign_in(self.id_token())
+                self.assertEqual(response.status_code, 403)
+                self.assertNotIn("access", response.json())
+        self.assertEqual(User.objects.filter(email="jane@example.com").count(), 1)
+
+    def test_refuses_forged_expired_and_misaddressed_tokens(self):
+        forged, _ = signing_key("google-1")
+        self.assertEqual(self.sign_in(self.id_token(key=forged)).status_code, 401)
+        self.assertEqual(self.sign_in(self.id_token(exp=int(time.time()) - 3600)).status_code, 401)
+        with self.settings(GOOGLE_CLIENT_IDS=["ours"]):
+            self.assertEqual(self.sign_in(self.id_token(aud="theirs")).status_code, 401)
+            self.assertEqual(self.sign_in(self.id_token(aud="ours")).status_code, 200)
+
+    def test_refuses_every_token_without_client_ids(self):
+        with self.settings(GOOGLE_CLIENT_IDS=[]):
+            self.assertEqual(self.sign_in(self.id_token()).status_code, 401)
+        self.assertEqual(self.sign_in(self.id_token(aud=None)).status_code, 401)
+
+    def test_finds_next_username_in_one_query(self):
+        for username in ["jane", "jane_2", "jane_10", "jane_x", "janet"]:
+            User.objects.create(email=f"{username}@example.com", username=username)
+        with self.assertNumQueries(1):
+            self.assertEqual(google.free_username("jane"), "jane_11")
+        self.assertEqual(google.free_username("janet_1"), "janet_1")
+        # Suffixes alone don't take the bare name
+        User.objects.filter(username="jane").delete()
+        self.assertEqual(google.free_username("jane"), "jane")
+
+
+class JWKSKeySourceTests(SimpleTestCase):
+
+    def test_keeps_keys_while_refetching_fails(self):
+        _, jwk = signing_key("google-1")
+        now = [0]
+        source = google.JWKSKeySource("https://keys.invalid", lifespan=100, timeout=1, clock=lambda: now[0])
+        with mock.patch.object(source, "fetch", return_value={"keys": [jwk]}):
+            self.assertEqual(source.get_signing_key("google-1").key_id, "google-1")
+        now[0] = 200
+        with mock.patch.object(source, "fetch", side_effect=ValueError("unreachable")), \
+                self.assertLogs("user.google", "WARNING"):
+            source.refresh()
+            self.assertEqual(source.get_signing_key("google-1").key_id, "google-1")
+            with self.assertRaises(jwt.InvalidTokenError):
+                source.get_signing_key("google-2")
+        self.assertEqual((source.fetches, source.failures), (2, 1))
+
+
+class CustomerDirectoryTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.distributor, _ = create_tenant("acme")
+        rival, _ = create_tenant("rival")
+        cls.customers = [
+            User.objects.create(email=f"c{i}@example.com", username=f"customer{i}", phone_number=f"+23480000000{i}")
+            for i in range(7)
+        ]
+        for customer in cls.customers:
+            DistributorCustomer.objects.create(distributor=cls.distributor, customer=customer)
+        for email, username, phone in (
+            ("Alice@Example.com", "wonderland", "+447700900001"),
+            ("bob@example.com", "Bob_Smith", "+447700900002"),
+            ("carol@example.com", "carol", "+15550100003"),
+        ):
+            customer = User.objects.create(email=email, username=username, phone_number=phone)
+            DistributorCustomer.objects.create(distributor=cls.distributor, customer=customer)
+        stranger = User.objects.create(email="alicia@example.com", username="alicia", phone_number="+447700900009")
+        DistributorCustomer.objects.create(distributor=rival, customer=stranger)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.distributor.user)
+
+    def emails(self, search):
+        response = self.client.get("/distributor/customers/", {"search": search})
+        self.assertEqual(response.status_code, 200)
+        return sorted(customer["email"] for customer in response.data["results"])
+
+    def test_each_page_is_one_query(self):
+        url, seen = "/distributor/customers/?page_size=3", []
+        while url:
+            with self.assertNumQueries(1):
+                response = self.client.get(url)
+            self.assertLessEqual(len(response.data["results"]), 3)
+            seen += [customer["email"] for customer in response.data["results"]]
+            url = response.data["next"]
+        # Newest link first, every customer once, none of another distributor's
+        expected = DistributorCustomer.objects.filter(distributor=self.distributor).order_by("-created_at", "-id")
+        self.assertEqual(seen, [link.customer.email for link in expected])
+
+    def test_search_matches_email_prefix_case_insensitively(self):
+        self.assertEqual(self.emails("ALI"), ["Alice@Example.com"])
+        self.assertEqual(self.emails("c"), [f"c{i}@example.com" for i in range(7)] + ["carol@example.com"])
+
+    def test_search_matches_username_prefix(self):
+        self.assertEqual(self.emails("bob_s"), ["bob@example.com"])
+        self.assertEqual(self.emails("wonder"), ["Alice@Example.com"])
+
+    def test_search_matches_phone_prefix(self):
+        self.assertEqual(self.emails("+4477009"), ["Alice@Example.com", "bob@example.com"])
+        self.assertEqual(self.emails("+1555"), ["carol@example.com"])
+
+    def test_search_is_a_prefix_not_a_substring_match(self):
+        self.assertEqual(self.emails("lice"), [])
+        self.assertEqual(self.emails("900001"), [])
@@ -0,0 +1,76 @@
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+from rest_framework_simplejwt.utils import datetime_from_epoch
+
+from .blacklist import is_blacklisted, note_blacklisted
+from .models import User
+
+
+def token_claims(user):
+    """What ClaimsJWTAuthentication needs to build request.user without loading the row."""
+    return {
+        "role": user.role,
+        "is_active": user.is_active,
+        "is_staff": user.is_staff,
+        "is_superuser": user.is_superuser,
+    }
+
+
+class ClaimsRefreshToken(RefreshToken):
+    """
+    A refresh token, and the access tokens made from it, carrying token_claims().
+    Blacklist checks go through user.blacklist's filter, and rotation skips
+    the user lookups simplejwt makes just to fill in OutstandingToken.user.
+    """
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        for claim, value in token_claims(user).items():
+            token[claim] = value
+        return token
+
+    def check_blacklist(self):
+        if is_blacklisted(self.payload[api_settings.JTI_CLAIM]):
+            raise TokenError("Token is blacklisted")
+
+    def outstand(self):
+        return OutstandingToken.objects.get_or_create(
+            jti=self.payload[api_settings.JTI_CLAIM],
+            defaults={
+                "user_id": self.payload.get(api_settings.USER_ID_CLAIM),
+                "created_at": self.current_time,
+                "token": str(self),
+                "expires_at": datetime_from_epoch(self.payload["exp"]),
+            },
+        )
+
+    def blacklist(self):
+        token, _ = self.outstand()
+        result = BlacklistedToken.objects.get_or_create(token=token)
+        note_blacklisted(token.jti)
+        return result
+
+
+class ClaimsTokenObtainPairSerializer(TokenObtainPairSerializer):
+    token_class = ClaimsRefreshToken
+
+
+class ClaimsTokenRefreshSerializer(TokenRefreshSerializer):
+    """Refresh with claims read from the user now, not the ones copied from a refresh token that may be weeks old."""
+    token_class = ClaimsRefreshToken
+
+    def validate(self, attrs):
+        data = super().validate(attrs)
+        access = AccessToken(data["access"])
+        user = User.objects.filter(pk=access[api_settings.USER_ID_CLAIM]).first()
+        if user is not None:
+            for claim, value in token_claims(user).items():
+                access[claim] = value
+            # Copied from the refresh token too; the claims are only as old as this
+            access.set_iat()
+            data["access"] = str(access)
+        return data
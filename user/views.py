@@ -1,5 +1,5 @@
 from .serializers import (
-    UserDetailSerializer, UserLoginSerializer, UserSignupSerializer, 
+    UserDetailSerializer, UserSignupSerializer,
     VerifySerializer, DistributorSignupSerializer, ChangePasswordSerializer , AdminSignupSerializer
 )
 from rest_framework.views import APIView
@@ -7,14 +7,14 @@ from rest_framework import status, generics
 from .models import User
 from datetime import datetime
 from rest_framework.response import Response
-from django.contrib.auth import authenticate, login
-from rest_framework_simplejwt.tokens import RefreshToken
+from .tokens import ClaimsRefreshToken
 from django.core.mail import send_mail
 from .verify import send_otp_email
 from django.views.decorators.csrf import csrf_exempt
 from django.http import JsonResponse
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import AllowAny, IsAuthenticated
 from django.apps import apps
+from . import hashing
 
 from django.utils.decorators import method_decorator
 from django.views.decorators.csrf import csrf_exempt
@@ -30,15 +30,22 @@ class AdminSignupView(APIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+def save_signup(serializer):
+    """Save a validated signup with its password hashed on the hash pool (see user.hashing)."""
+    serializer.context["password_hash"] = hashing.pool.make_password(serializer.validated_data["password"])
+    return serializer.save()
+
+
 class UserSignupView(generics.CreateAPIView):
     serializer_class = UserSignupSerializer
-    
+
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        user = serializer.save()
+        user = save_signup(serializer)
 
-        refresh = RefreshToken.for_user(user)
+        refresh = ClaimsRefreshToken.for_user(user)
+        distributor = getattr(user, "distributor", None)
 
         response_data = {
             "message": "Registration successful",
@@ -49,7 +56,7 @@ class UserSignupView(generics.CreateAPIView):
                 "role": user.role,
                 "email": user.email,
                 "username": user.username,
-                "distributor_name": user.distributor.name  
+                "distributor_name": distributor.name if distributor else None
             },
         }
 
@@ -58,12 +65,12 @@ class UserSignupView(generics.CreateAPIView):
 
 class DistributorSignupView(generics.CreateAPIView):
     serializer_class = DistributorSignupSerializer
-    
+
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        distributor = serializer.save()
-        refresh = RefreshToken.for_user(distributor)
+        distributor = save_signup(serializer)
+        refresh = ClaimsRefreshToken.for_user(distributor)
         response_data = {
             "message": "Distributor registration successful",
             "refresh": str(refresh),
@@ -105,30 +112,31 @@ class VerifyUserAccount(generics.GenericAPIView):
             return Response({"error": "User does not exist"}, status=status.HTTP_404_NOT_FOUND)
 
 
-from rest_framework.views import APIView
-from rest_framework.response import Response
-from rest_framework import status
-from django.contrib.auth import authenticate
-from rest_framework_simplejwt.tokens import RefreshToken
-from rest_framework.permissions import AllowAny  # Add this import
-
 class LoginView(APIView):
+    """
+    Checks the password on the hash pool (see user.hashing), so a login storm
+    hashes on the pool's few cores rather than on every request thread.
+    """
     authentication_classes = []  # Disable authentication for this view
     permission_classes = [AllowAny]  # Allow any user to access this view without authentication
 
     def post(self, request):
         email = request.data.get("email")
         password = request.data.get("password")
+        if not email or not password:
+            return Response({"message": "Invalid credentials"}, status=status.HTTP_400_BAD_REQUEST)
 
-        # Attempt to authenticate the user with provided email and password
-        user = authenticate(email=email, password=password)
-        
-        if user is None:
+        user = User.objects.filter(email=email).first()
+        valid, upgraded = hashing.pool.check_password(password, user)
+        if not valid or not user.is_active:
             return Response({"message": "Invalid credentials"}, status=status.HTTP_400_BAD_REQUEST)
-        
+        if upgraded:
+            user.password = upgraded
+            user.save(update_fields=["password"])
+
         # Create refresh token for the user
-        refresh = RefreshToken.for_user(user)
-        
+        refresh = ClaimsRefreshToken.for_user(user)
+
         # Return the response with tokens and user data
         return Response({
             "success": True,
@@ -159,13 +167,14 @@ class UserProfileView(APIView):
 
 class UpdateUserView(APIView):
     def patch(self, request):
-        user = request.user
+        # request.user is built from token claims with its other fields deferred; save the real row
+        user = User.objects.get(pk=request.user.pk)
         distributor_id = request.data.get("distributor")
         branch_id = request.data.get("branch_id")
         branch_name = request.data.get("branch_name")
 
         Distributor = apps.get_model("distributor", "Distributor")
-        Branch = apps.get_model("branch", "Branch")
+        Branch = apps.get_model("distributor", "Branch")
 
         if distributor_id:
             try:
@@ -194,6 +203,8 @@ class UpdateUserView(APIView):
 
 
 
+from django.db.models import Q
+from django.db.models.functions import Upper
 from rest_framework.views import APIView
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
@@ -201,26 +212,54 @@ from rest_framework import status
 from .serializers import UserDetailSerializer
 from .models import User
 from distributor.models import DistributorCustomer
+from distributor.pagination import KeysetPagination
+
+
+def prefix_range(lookup, term):
+    """
+    `lookup` starts with `term`, written as a range (>= term, < next prefix)
+    so a plain B-tree or expression index can serve it on any backend.
+    """
+    upper_bound = term[:-1] + chr(ord(term[-1]) + 1)
+    return Q(**{f"{lookup}__gte": term, f"{lookup}__lt": upper_bound})
+
+
 class DistributorCustomerListView(APIView):
+    """
+    Customer directory for the logged-in distributor, newest link first.
+
+    Each page is one query: DistributorCustomer rows joined to their customer,
+    paged by KeysetPagination. `?search=` is a case-insensitive prefix match
+    on email, username or phone number.
+    """
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
 
     def get(self, request):
         # Check if the logged-in user is a distributor
-        if request.user.role != 'Distributor':
+        if not request.user.is_distributor():
             return Response({"detail": "You are not authorized to view these users."}, status=status.HTTP_403_FORBIDDEN)
 
-        # Ensure that the distributor field is properly set on the user
-        distributor = request.user.distributor
-        if not distributor:
-            return Response({"detail": "No distributor found for this user."}, status=status.HTTP_400_BAD_REQUEST)
-
-        # Fetch all users (customers) linked to this distributor via DistributorCustomer model
-        customers = DistributorCustomer.objects.filter(distributor=distributor)
-
-        # Log the customers for debugging
-        print(f"Distributor: {distributor}, Customers: {customers}")
-
-        # Return the customer list
-        serializer = UserDetailSerializer([customer.customer for customer in customers], many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
-
+        links = (
+            DistributorCustomer.objects.filter(distributor__user=request.user)
+            .select_related("customer")
+            .only("id", "created_at", "customer__id", "customer__email", "customer__phone_number",
+                  "customer__username", "customer__role")
+        )
+
+        term = request.query_params.get("search", "").strip()
+        if term:
+            # Matched against the Upper() expression indexes on User
+            links = links.alias(
+                customer_email_upper=Upper("customer__email"),
+                customer_username_upper=Upper("customer__username"),
+            ).filter(
+                prefix_range("customer_email_upper", term.upper())
+                | prefix_range("customer_username_upper", term.upper())
+                | prefix_range("customer__phone_number", term)
+            )
+
+        paginator = self.pagination_class()
+        page = paginator.paginate_queryset(links, request, view=self)
+        serializer = UserDetailSerializer([link.customer for link in page], many=True)
+        return paginator.get_paginated_response(serializer.data)